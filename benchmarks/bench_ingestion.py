@@ -0,0 +1,285 @@
+"""
+end-to-end offline ingestion benchmark
+
+runs `CustomIngestionPipeline.run_pipeline` (target `qdrant`) and
+`PGVectorAccess.save_documents_in_batches` (target `pgvector`) over synthetic
+corpora, with every service replaced by the stand-ins of `offline.py`.
+Each scenario runs in its own process so its peak RSS is measured separately.
+The results are written as JSON, to be compared with `compare.py`.
+
+    python benchmarks/bench_ingestion.py
+    python benchmarks/bench_ingestion.py --targets qdrant --corpora discord \\
+        --sizes 100 1000 --latency 0.05 --rate-limit-every 20
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import platform
+import resource
+import subprocess
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timezone
+from functools import wraps
+from pathlib import Path
+from unittest.mock import patch
+
+from corpora import CORPORA
+from offline import (
+    FakeCohereClient,
+    fake_cohere,
+    offline_services,
+    offline_spacy_model,
+)
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+class StageTimer:
+    """
+    accumulates the wall time and call count of patched functions per stage
+
+    Note: the stage times are inclusive, i.e. `embed` contains `clean` and
+    `embed_api`, and `split` contains the embedding of sentence groups
+    """
+
+    def __init__(self) -> None:
+        self.seconds: dict[str, float] = defaultdict(float)
+        self.calls: dict[str, int] = defaultdict(int)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def patched(self, stages: dict[str, list[tuple[type, str]]]):
+        with ExitStack() as stack:
+            for stage, targets in stages.items():
+                for owner, name in targets:
+                    stack.enter_context(
+                        patch.object(
+                            owner, name, self._wrap(stage, getattr(owner, name))
+                        )
+                    )
+            yield self
+
+    def report(self) -> dict[str, dict[str, float]]:
+        return {
+            stage: {
+                "seconds": round(self.seconds[stage], 4),
+                "calls": self.calls[stage],
+            }
+            for stage in sorted(self.seconds)
+        }
+
+    def _wrap(self, stage: str, func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            active = getattr(self._local, "active", set())
+            # a stage calling itself, i.e. through super(), is timed once
+            if stage in active:
+                return func(*args, **kwargs)
+
+            self._local.active = active | {stage}
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                self._local.active = active
+                with self._lock:
+                    self.seconds[stage] += elapsed
+                    self.calls[stage] += 1
+
+        return wrapper
+
+
+def _stages() -> dict[str, list[tuple[type, str]]]:
+    from llama_index.core.ingestion import IngestionCache
+    from llama_index.core.node_parser import NodeParser
+    from llama_index.core.storage.docstore.keyval_docstore import KVDocumentStore
+    from llama_index.core.vector_stores import SimpleVectorStore
+    from llama_index.vector_stores.qdrant import QdrantVectorStore
+    from tc_hivemind_backend.db.utils.preprocess_text import BasePreprocessor
+    from tc_hivemind_backend.embeddings.cohere import CohereEmbedding
+
+    return {
+        "clean": [(BasePreprocessor, "extract_main_content")],
+        "embed": [(CohereEmbedding, "get_text_embedding")],
+        "embed_api": [(FakeCohereClient, "embed")],
+        "split": [(NodeParser, "get_nodes_from_documents")],
+        "vector_store": [(QdrantVectorStore, "add"), (SimpleVectorStore, "add")],
+        "docstore": [
+            (KVDocumentStore, "get_document_hash"),
+            (KVDocumentStore, "set_document_hashes"),
+            (KVDocumentStore, "add_documents"),
+            (KVDocumentStore, "delete_ref_doc"),
+        ],
+        "cache": [(IngestionCache, "get"), (IngestionCache, "put")],
+    }
+
+
+def _ingest(target: str, documents: list, batch_size: int) -> int:
+    """
+    ingest the documents and return the number of produced nodes
+    """
+    if target == "qdrant":
+        from tc_hivemind_backend.ingest_qdrant import CustomIngestionPipeline
+
+        nodes = 0
+        with CustomIngestionPipeline(
+            community_id="1234", collection_name="bench"
+        ) as pipeline:
+            for start in range(0, len(documents), batch_size):
+                nodes += len(
+                    pipeline.run_pipeline(documents[start : start + batch_size])
+                )
+        return nodes
+
+    elif target == "pgvector":
+        from llama_index.core.vector_stores import SimpleVectorStore
+        from tc_hivemind_backend.embeddings.cohere import CohereEmbedding
+        from tc_hivemind_backend.pg_vector_access import PGVectorAccess
+
+        vector_store = SimpleVectorStore()
+        with patch.object(
+            PGVectorAccess, "setup_pgvector_index", return_value=vector_store
+        ):
+            pg_vector = PGVectorAccess(
+                table_name="bench",
+                dbname="community_1234",
+                embed_model=CohereEmbedding(),
+            )
+            pg_vector.save_documents_in_batches(
+                community_id="1234", documents=documents, batch_size=batch_size
+            )
+        return len(vector_store.data.embedding_dict)
+
+    raise ValueError(f"Unknown target: {target}")
+
+
+def run_scenario(scenario: dict) -> dict:
+    """
+    run one scenario, meant to be called in a fresh process
+    """
+    logging.disable(logging.INFO)
+    documents = CORPORA[scenario["corpus"]](scenario["size"], seed=scenario["seed"])
+    result = dict(scenario, docs=len(documents), error=None)
+
+    timer = StageTimer()
+    with (
+        offline_services(),
+        offline_spacy_model(),
+        fake_cohere(
+            latency=scenario["latency"],
+            per_text_latency=scenario["per_text_latency"],
+            rate_limit_every=scenario["rate_limit_every"],
+        ) as cohere_client,
+        timer.patched(_stages()),
+    ):
+        start = time.perf_counter()
+        try:
+            result["nodes"] = _ingest(
+                scenario["target"], documents, scenario["batch_size"]
+            )
+        except Exception as exp:
+            result["error"] = f"{type(exp).__name__}: {exp}"
+        seconds = time.perf_counter() - start
+
+    result.update(cohere_client.stats())
+    result["seconds"] = round(seconds, 4)
+    result["docs_per_second"] = round(len(documents) / seconds, 2)
+    # ru_maxrss is in kilobytes on linux
+    result["peak_rss_mb"] = round(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+    )
+    result["stages"] = timer.report()
+    return result
+
+
+def _git_commit() -> dict[str, str | bool]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        dirty = bool(
+            subprocess.run(
+                ["git", "status", "--porcelain", "--untracked-files=no"],
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        commit, dirty = "unknown", False
+    return {"commit": commit, "dirty": dirty}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--targets", nargs="+", default=["qdrant", "pgvector"])
+    parser.add_argument("--corpora", nargs="+", default=list(CORPORA))
+    parser.add_argument("--sizes", nargs="+", type=int, default=[100, 500, 2000])
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--per-text-latency", type=float, default=0.0)
+    parser.add_argument("--rate-limit-every", type=int, default=0)
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    scenarios = [
+        {
+            "name": f"{target}/{corpus}/{size}",
+            "target": target,
+            "corpus": corpus,
+            "size": size,
+            "seed": args.seed,
+            "batch_size": args.batch_size,
+            "latency": args.latency,
+            "per_text_latency": args.per_text_latency,
+            "rate_limit_every": args.rate_limit_every,
+        }
+        for target in args.targets
+        for corpus in args.corpora
+        for size in args.sizes
+    ]
+
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for scenario in scenarios:
+        with context.Pool(1) as pool:
+            result = pool.apply(run_scenario, (scenario,))
+        results.append(result)
+        status = result["error"] or "ok"
+        print(
+            f"{result['name']:<24} {result['docs_per_second']:>9.1f} docs/s | "
+            f"{result['embed_calls']:>6} embed calls | "
+            f"{result['peak_rss_mb']:>7.1f} MB peak RSS | {status}"
+        )
+
+    git_info = _git_commit()
+    report = {
+        **git_info,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scenarios": results,
+    }
+    output = args.output or RESULTS_DIR / (
+        f"{datetime.now():%Y%m%d-%H%M%S}_{git_info['commit']}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+connection and query overhead of the two pgvector layouts
+
+- `per-database`: one database per community, a new `PGVectorStore` (and so a
+  new engine and connection) each time a community is accessed
+- `partitioned`: one database with a table partitioned by community id, whose
+  stores share one connection pool (`PartitionedPGVectorStore`)
+
+each community gets `--rows` random vectors, then `--queries` top-k queries
+are sent round-robin over the communities, each through a freshly set up
+store as `PGVectorAccess` does. Needs a live postgres with pgvector, the
+credentials are read from the `POSTGRES_*` env variables.
+
+    python benchmarks/bench_pg_layout.py --communities 50 --rows 200 --queries 500
+"""
+
+import argparse
+import statistics
+import time
+
+import numpy as np
+import psycopg2
+from llama_index.core.schema import TextNode
+from llama_index.core.vector_stores.types import VectorStoreQuery
+from tc_hivemind_backend.db.credentials import load_postgres_credentials
+from tc_hivemind_backend.db.pg_partitioned_store import dispose_engines
+from tc_hivemind_backend.pg_vector_access import PGVectorAccess
+
+TABLE = "bench_layout"
+SHARED_DB = "bench_layout_shared"
+
+
+def community_ids(count: int) -> list[str]:
+    return [f"{idx:024x}" for idx in range(count)]
+
+
+def make_access(layout: str, community_id: str) -> PGVectorAccess:
+    if layout == "partitioned":
+        return PGVectorAccess(
+            table_name=TABLE, dbname=SHARED_DB, testing=True, community_id=community_id
+        )
+    return PGVectorAccess(
+        table_name=TABLE, dbname=f"bench_layout_{community_id}", testing=True
+    )
+
+
+def database_names(layout: str, communities: list[str]) -> list[str]:
+    if layout == "partitioned":
+        return [SHARED_DB]
+    return [f"bench_layout_{community_id}" for community_id in communities]
+
+
+def recreate_databases(dbnames: list[str], create: bool = True) -> None:
+    creds = load_postgres_credentials()
+    connection = psycopg2.connect(
+        dbname=creds["db_name"],
+        user=creds["user"],
+        password=creds["password"],
+        host=creds["host"],
+        port=creds["port"],
+    )
+    connection.autocommit = True
+    with connection.cursor() as cursor:
+        for dbname in dbnames:
+            cursor.execute(f"DROP DATABASE IF EXISTS {dbname} WITH (FORCE);")
+            if create:
+                cursor.execute(f"CREATE DATABASE {dbname};")
+    connection.close()
+
+
+def run_layout(
+    layout: str, communities: list[str], rows: int, queries: int, dim: int
+) -> dict[str, float]:
+    rng = np.random.default_rng(0)
+    timings: dict[str, float] = {}
+    dbnames = database_names(layout, communities)
+    recreate_databases(dbnames)
+
+    start = time.perf_counter()
+    for community_id in communities:
+        vector_store = make_access(layout, community_id).setup_pgvector_index(dim)
+        embeddings = rng.standard_normal((rows, dim)).astype(np.float32)
+        vector_store.add(
+            [
+                TextNode(text=f"text {idx}", embedding=embedding.tolist())
+                for idx, embedding in enumerate(embeddings)
+            ]
+        )
+    timings["ingest_s"] = time.perf_counter() - start
+
+    latencies = []
+    for idx in range(queries):
+        community_id = communities[idx % len(communities)]
+        query = VectorStoreQuery(
+            query_embedding=rng.standard_normal(dim).tolist(), similarity_top_k=5
+        )
+        started = time.perf_counter()
+        vector_store = make_access(layout, community_id).setup_pgvector_index(dim)
+        result = vector_store.query(query)
+        latencies.append(time.perf_counter() - started)
+        assert len(result.nodes) == min(5, rows)
+
+    timings["query_p50_ms"] = statistics.median(latencies) * 1000
+    timings["query_p95_ms"] = np.percentile(latencies, 95) * 1000
+    timings["queries_per_s"] = len(latencies) / sum(latencies)
+
+    dispose_engines()
+    recreate_databases(dbnames, create=False)
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--communities", type=int, default=50)
+    parser.add_argument("--rows", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--layouts", nargs="+", default=["per-database", "partitioned"])
+    args = parser.parse_args()
+
+    communities = community_ids(args.communities)
+    for layout in args.layouts:
+        timings = run_layout(layout, communities, args.rows, args.queries, args.dim)
+        print(
+            f"{layout:>12}: "
+            + " | ".join(f"{name} {value:.2f}" for name, value in timings.items())
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+per-batch overhead of `CustomIngestionPipeline.run_pipeline` for many small batches
+
+compares creating the vector store, docstore and cache on every batch
+(the previous behaviour, reproduced by calling `close()` before each batch)
+with reusing them across batches.
+
+    python benchmarks/bench_pipeline_setup.py --batches 100 --batch-size 5
+"""
+
+import argparse
+import logging
+import statistics
+import time
+
+from llama_index.core import Document
+from offline import offline_services
+
+
+def run(batches: int, batch_size: int, reuse: bool) -> tuple[list[float], list[float]]:
+    from tc_hivemind_backend.ingest_qdrant import CustomIngestionPipeline
+
+    label = "reuse" if reuse else "rebuild"
+    setups: list[float] = []
+    durations: list[float] = []
+    with offline_services():
+        with CustomIngestionPipeline(
+            community_id="1234", collection_name=f"bench_{label}", testing=True
+        ) as pipeline:
+            for batch_idx in range(batches):
+                docs = [
+                    Document(
+                        id_=f"{label}-{batch_idx}-{idx}",
+                        text=f"message {idx} of batch {batch_idx} in the bench",
+                    )
+                    for idx in range(batch_size)
+                ]
+                if not reuse:
+                    pipeline.close()
+
+                start = time.perf_counter()
+                pipeline._get_pipeline()
+                setups.append(time.perf_counter() - start)
+                pipeline.run_pipeline(docs)
+                durations.append(time.perf_counter() - start)
+
+    return setups, durations
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batches", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=5)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    for reuse in (False, True):
+        setups, durations = run(args.batches, args.batch_size, reuse)
+        label = "reuse" if reuse else "rebuild"
+        print(
+            f"{label:>8}: total {sum(durations):.3f}s | "
+            f"per batch setup {statistics.mean(setups) * 1000:.2f}ms "
+            f"total {statistics.mean(durations) * 1000:.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+throughput of the `spacy` and `fast` cleaning modes of `BasePreprocessor`
+
+the texts of the synthetic corpora are cleaned with the memo disabled, so
+each text is really cleaned. If the `en_core_web_sm` spaCy model is not
+installed, a blank english pipeline is used instead (see `offline.py`)
+
+    python benchmarks/bench_preprocess.py --size 2000
+"""
+
+import argparse
+import time
+
+from corpora import CORPORA
+from offline import offline_spacy_model
+from tc_hivemind_backend.db.utils.preprocess_text import (
+    CLEANING_MODES,
+    BasePreprocessor,
+    CleaningMemo,
+    load_spacy_model,
+)
+
+
+def measure(mode: str, texts: list[str]) -> float:
+    preprocessor = BasePreprocessor(memo=CleaningMemo(max_size=0), mode=mode)
+    # loading the spacy model is not part of the throughput
+    preprocessor.extract_main_content("warm up")
+
+    start = time.perf_counter()
+    for text in texts:
+        preprocessor.extract_main_content(text)
+    return len(texts) / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--corpora", nargs="+", default=list(CORPORA))
+    parser.add_argument("--size", type=int, default=2000)
+    parser.add_argument("--modes", nargs="+", default=list(CLEANING_MODES))
+    args = parser.parse_args()
+
+    with offline_spacy_model():
+        load_spacy_model.cache_clear()
+        for corpus in args.corpora:
+            texts = [doc.text for doc in CORPORA[corpus](args.size)]
+            throughputs = {mode: measure(mode, texts) for mode in args.modes}
+            print(
+                f"{corpus:>8}: "
+                + " | ".join(
+                    f"{mode} {value:,.0f} texts/s"
+                    for mode, value in throughputs.items()
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+bulk operations of `CustomRedisKVStore` over a big collection
+
+compares the previous per-entry implementation (HSET/HDEL per key,
+HSCAN with the default COUNT and `json.loads`) with the bulk path.
+
+    python benchmarks/bench_redis_kv_store.py --entries 100000
+    python benchmarks/bench_redis_kv_store.py --redis-url redis://localhost:6379
+"""
+
+import argparse
+import json
+import random
+import time
+
+import fakeredis
+import redis
+from tc_hivemind_backend.db.redis_kv_store import CustomRedisKVStore
+
+COLLECTION = "bench_kv_store"
+
+
+def make_entries(count: int) -> list[tuple[str, dict]]:
+    rng = random.Random(0)
+    return [
+        (
+            f"doc-{idx}",
+            {
+                "doc_hash": f"{rng.getrandbits(128):032x}",
+                "ref_doc_id": f"ref-{idx // 4}",
+                "metadata": {"channel": f"channel-{idx % 50}", "thread": None},
+            },
+        )
+        for idx in range(count)
+    ]
+
+
+def per_entry(client, entries: list[tuple[str, dict]]) -> dict[str, float]:
+    timings = {}
+
+    start = time.perf_counter()
+    for key, val in entries:
+        client.hset(name=COLLECTION, key=key, value=json.dumps(val))
+    timings["put"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    loaded = {}
+    for key, val_str in client.hscan_iter(name=COLLECTION):
+        loaded[key] = dict(json.loads(val_str))
+    timings["get_all"] = time.perf_counter() - start
+    assert len(loaded) == len(entries)
+
+    start = time.perf_counter()
+    for key in loaded:
+        client.hdel(COLLECTION, key)
+    timings["delete"] = time.perf_counter() - start
+    return timings
+
+
+def bulk(client, entries: list[tuple[str, dict]]) -> dict[str, float]:
+    store = CustomRedisKVStore.from_redis_client(client)
+    timings = {}
+
+    start = time.perf_counter()
+    store.put_all(entries, collection=COLLECTION, batch_size=1000)
+    timings["put"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    loaded = store.get_all(collection=COLLECTION)
+    timings["get_all"] = time.perf_counter() - start
+    assert len(loaded) == len(entries)
+
+    start = time.perf_counter()
+    store.delete_all(list(loaded), collection=COLLECTION)
+    timings["delete"] = time.perf_counter() - start
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--redis-url", default=None, help="default is fakeredis")
+    args = parser.parse_args()
+
+    if args.redis_url:
+        client = redis.Redis.from_url(args.redis_url, decode_responses=True)
+    else:
+        client = fakeredis.FakeRedis(decode_responses=True)
+    client.delete(COLLECTION)
+
+    entries = make_entries(args.entries)
+    for label, bench in (("per-entry", per_entry), ("bulk", bulk)):
+        timings = bench(client, entries)
+        print(
+            f"{label:>10}: "
+            + " | ".join(f"{name} {seconds:.2f}s" for name, seconds in timings.items())
+        )
+
+
+if __name__ == "__main__":
+    main()
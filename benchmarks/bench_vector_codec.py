@@ -0,0 +1,65 @@
+"""
+size and speed of ingestion cache entries stored as JSON vs packed vectors
+
+    python benchmarks/bench_vector_codec.py --nodes 1000 --dim 1024
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+from tc_hivemind_backend.db.utils.vector_codec import decode_value, encode_value
+
+
+def make_entry(nodes: int, dim: int) -> dict:
+    rng = np.random.default_rng(0)
+    return {
+        "nodes": [
+            {
+                "__data__": {
+                    "id_": f"node-{idx}",
+                    "text": "a short discord message " * 4,
+                    "embedding": rng.standard_normal(dim).astype(np.float32).tolist(),
+                    "metadata": {"channel": "general", "thread": None},
+                },
+                "__type__": "1",
+            }
+            for idx in range(nodes)
+        ]
+    }
+
+
+def measure(label: str, encode, decode, entry: dict) -> None:
+    start = time.perf_counter()
+    data = encode(entry)
+    encode_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    decode(data)
+    decode_time = time.perf_counter() - start
+    print(
+        f"{label:>8}: {len(data) / 1024 / 1024:8.2f} MiB | "
+        f"encode {encode_time:.3f}s | decode {decode_time:.3f}s"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nodes", type=int, default=1000)
+    parser.add_argument("--dim", type=int, default=1024)
+    args = parser.parse_args()
+
+    entry = make_entry(args.nodes, args.dim)
+    measure("json", lambda value: json.dumps(value).encode(), json.loads, entry)
+    for dtype in ("float32", "float16"):
+        measure(
+            dtype,
+            lambda value: encode_value(value, dtype=dtype),
+            decode_value,
+            entry,
+        )
+
+
+if __name__ == "__main__":
+    main()
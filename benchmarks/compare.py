@@ -0,0 +1,84 @@
+"""
+compare two `bench_ingestion.py` result files and flag the regressions
+
+    python benchmarks/compare.py results/base.json results/head.json --threshold 0.1
+
+exits with status 1 if any shared scenario regressed by more than `threshold`
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# metric name -> True if higher is better
+METRICS = {
+    "docs_per_second": True,
+    "embed_calls": False,
+    "embedded_texts": False,
+    "peak_rss_mb": False,
+}
+
+
+def _load(path: Path) -> dict[str, dict]:
+    report = json.loads(path.read_text())
+    return {scenario["name"]: scenario for scenario in report["scenarios"]}
+
+
+def compare(
+    base: dict[str, dict], head: dict[str, dict], threshold: float
+) -> list[str]:
+    """
+    print the metric changes of the shared scenarios
+
+    Returns
+    ---------
+    regressions : list[str]
+        a description of every metric that got worse by more than `threshold`
+    """
+    regressions = []
+    for name in sorted(base.keys() & head.keys()):
+        if head[name].get("error"):
+            print(f"{name:<24} failed: {head[name]['error']}")
+            if not base[name].get("error"):
+                regressions.append(f"{name}: failed with {head[name]['error']}")
+            continue
+
+        for metric, higher_is_better in METRICS.items():
+            before, after = base[name].get(metric), head[name].get(metric)
+            if not before or after is None:
+                continue
+
+            change = (after - before) / before
+            worse = -change if higher_is_better else change
+            flag = "REGRESSION" if worse > threshold else ""
+            print(
+                f"{name:<24} {metric:<16} {before:>10} -> {after:>10} "
+                f"({change:+.1%}) {flag}"
+            )
+            if flag:
+                regressions.append(f"{name}: {metric} {before} -> {after}")
+
+    for name in sorted(base.keys() ^ head.keys()):
+        print(f"{name:<24} only in {'base' if name in base else 'head'}")
+
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("base", type=Path)
+    parser.add_argument("head", type=Path)
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args()
+
+    regressions = compare(_load(args.base), _load(args.head), args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s):")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+synthetic community corpora for the benchmarks
+
+the generators are seeded, so the same arguments produce the same documents
+"""
+
+import random
+
+from llama_index.core import Document
+
+WORDS = (
+    "the community proposal vote token bridge wallet release deploy issue fix "
+    "support question answer meeting governance reward channel thread update "
+    "docs roadmap contributor grant testnet mainnet node validator discord "
+    "github merge branch review error log config network fee swap pool"
+).split()
+SHORT_REPLIES = ["thanks!", "gm", "+1", "lgtm", "thank you so much", "agreed"]
+BOT_MESSAGES = [
+    "Welcome to the server! Please read the rules in #rules before posting.",
+    "Reminder: the community call starts in 1 hour at https://meet.example.com",
+]
+
+
+def _sentence(rng: random.Random, min_words: int = 5, max_words: int = 20) -> str:
+    words = rng.choices(WORDS, k=rng.randint(min_words, max_words))
+    return " ".join(words).capitalize() + rng.choice([".", "?", "!"])
+
+
+def discord_corpus(size: int, seed: int = 0) -> list[Document]:
+    """
+    short chat messages, with repeated replies and bot announcements
+    """
+    rng = random.Random(seed)
+    documents = []
+    for idx in range(size):
+        kind = rng.random()
+        if kind < 0.15:
+            text = rng.choice(SHORT_REPLIES)
+        elif kind < 0.25:
+            text = rng.choice(BOT_MESSAGES)
+        else:
+            text = " ".join(_sentence(rng) for _ in range(rng.randint(1, 3)))
+
+        documents.append(
+            Document(
+                id_=f"discord-{seed}-{idx}",
+                text=text,
+                metadata={
+                    "channel": f"channel-{rng.randint(0, 20)}",
+                    "author_id": str(rng.randint(0, 500)),
+                    "date": 1700000000.0 + idx * 60,
+                },
+                excluded_embed_metadata_keys=["author_id", "date"],
+                excluded_llm_metadata_keys=["author_id", "date"],
+            )
+        )
+    return documents
+
+
+def github_corpus(size: int, seed: int = 0) -> list[Document]:
+    """
+    issues, comments and long READMEs with code blocks
+    """
+    rng = random.Random(seed)
+    documents = []
+    for idx in range(size):
+        kind = rng.random()
+        if kind < 0.1:
+            sections = [
+                f"## {_sentence(rng, 2, 4)}\n"
+                + "\n".join(_sentence(rng) for _ in range(rng.randint(5, 15)))
+                for _ in range(rng.randint(5, 20))
+            ]
+            text = "\n\n".join(sections)
+        elif kind < 0.4:
+            text = (
+                "\n".join(_sentence(rng) for _ in range(rng.randint(3, 10)))
+                + "\n```\nerror: "
+                + " ".join(rng.choices(WORDS, k=8))
+                + "\n```"
+            )
+        else:
+            text = " ".join(_sentence(rng) for _ in range(rng.randint(1, 4)))
+
+        documents.append(
+            Document(
+                id_=f"github-{seed}-{idx}",
+                text=text,
+                metadata={
+                    "repository": f"org/repo-{rng.randint(0, 5)}",
+                    "type": "readme" if kind < 0.1 else "issue",
+                    "date": 1700000000.0 + idx * 3600,
+                },
+                excluded_embed_metadata_keys=["date"],
+                excluded_llm_metadata_keys=["date"],
+            )
+        )
+    return documents
+
+
+CORPORA = {"discord": discord_corpus, "github": github_corpus}
@@ -0,0 +1,217 @@
+"""
+offline stand-ins for the services used by the ingestion code
+
+Qdrant runs in local in-memory mode, Mongo is replaced with `mongomock`,
+Redis with `fakeredis` and the Cohere API with `FakeCohereClient`, so
+benchmarks can run without any live service.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import fakeredis
+import mongomock
+import numpy as np
+import spacy
+from cohere.error import CohereAPIError
+from cohere.responses.embeddings import Embeddings
+from pymongo import DeleteOne, InsertOne, ReplaceOne, UpdateOne
+from qdrant_client import QdrantClient
+
+DEFAULT_ENVS = {
+    "CHUNK_SIZE": "512",
+    "EMBEDDING_DIM": "1024",
+    "POSTGRES_HOST": "localhost",
+    "POSTGRES_USER": "root",
+    "POSTGRES_PASS": "pass",
+    "POSTGRES_PORT": "5432",
+}
+
+
+def _singleton(client) -> SimpleNamespace:
+    return SimpleNamespace(client=client, get_client=lambda: client)
+
+
+def _bulk_write(collection, requests, ordered=True, **kwargs):
+    """
+    a sequential `bulk_write` for mongomock, whose own implementation
+    doesn't accept the operations built by recent pymongo versions
+    """
+    for request in requests:
+        if isinstance(request, UpdateOne):
+            collection.update_one(
+                request._filter, request._doc, upsert=bool(request._upsert)
+            )
+        elif isinstance(request, ReplaceOne):
+            collection.replace_one(
+                request._filter, request._doc, upsert=bool(request._upsert)
+            )
+        elif isinstance(request, InsertOne):
+            collection.insert_one(request._doc)
+        elif isinstance(request, DeleteOne):
+            collection.delete_one(request._filter)
+        else:
+            raise NotImplementedError(f"Unsupported bulk operation: {request}")
+
+
+@contextmanager
+def offline_services():
+    """
+    patch the Qdrant, Mongo and Redis singletons with offline clients
+
+    Yields
+    --------
+    clients : SimpleNamespace
+        the `qdrant`, `mongo`, `redis` and `redis_binary` clients in use
+    """
+    for name, value in DEFAULT_ENVS.items():
+        os.environ.setdefault(name, value)
+
+    redis_server = fakeredis.FakeServer()
+    clients = SimpleNamespace(
+        qdrant=QdrantClient(":memory:"),
+        mongo=mongomock.MongoClient(),
+        redis=fakeredis.FakeRedis(server=redis_server, decode_responses=True),
+        redis_binary=fakeredis.FakeRedis(server=redis_server),
+    )
+    redis_singleton = _singleton(clients.redis)
+    redis_singleton.get_binary_client = lambda: clients.redis_binary
+
+    with ExitStack() as stack:
+        stack.enter_context(
+            patch.object(mongomock.collection.Collection, "bulk_write", _bulk_write)
+        )
+        stack.enter_context(
+            patch(
+                "tc_hivemind_backend.db.qdrant.QdrantSingleton.get_instance",
+                return_value=_singleton(clients.qdrant),
+            )
+        )
+        stack.enter_context(
+            patch(
+                "tc_hivemind_backend.db.mongo.MongoSingleton.get_instance",
+                return_value=_singleton(clients.mongo),
+            )
+        )
+        stack.enter_context(
+            patch(
+                "tc_hivemind_backend.db.redis.RedisSingleton.get_instance",
+                return_value=redis_singleton,
+            )
+        )
+        yield clients
+
+
+class FakeCohereClient:
+    def __init__(
+        self,
+        dim: int = 1024,
+        latency: float = 0.0,
+        per_text_latency: float = 0.0,
+        rate_limit_every: int = 0,
+    ) -> None:
+        """
+        a stand-in for `cohere.Client` returning deterministic embeddings
+
+        Parameters
+        ------------
+        dim : int
+            the embedding dimension
+        latency : float
+            the seconds every `embed` call takes
+        per_text_latency : float
+            the extra seconds every embedded text adds to a call
+        rate_limit_every : int
+            if non-zero, every n-th call fails with a 429 `CohereAPIError`
+        """
+        self.dim = dim
+        self.latency = latency
+        self.per_text_latency = per_text_latency
+        self.rate_limit_every = rate_limit_every
+        self.calls = 0
+        self.texts = 0
+        self.rate_limited = 0
+        self._lock = threading.Lock()
+
+    def embed(
+        self,
+        texts: list[str],
+        model: str | None = None,
+        truncate: str | None = None,
+        input_type: str | None = None,
+        embedding_types: list[str] | None = None,
+    ) -> Embeddings:
+        with self._lock:
+            self.calls += 1
+            calls = self.calls
+            if self.rate_limit_every and calls % self.rate_limit_every == 0:
+                self.rate_limited += 1
+                raise CohereAPIError("too many requests", http_status=429)
+            self.texts += len(texts)
+
+        time.sleep(self.latency + self.per_text_latency * len(texts))
+        embeddings = [self._embed(text) for text in texts]
+        return Embeddings(
+            embeddings=embeddings,
+            response_type="embeddings_floats",
+            meta={"billed_units": {"input_tokens": sum(len(t.split()) for t in texts)}},
+        )
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "embed_calls": self.calls,
+            "embedded_texts": self.texts,
+            "rate_limited": self.rate_limited,
+        }
+
+    def _embed(self, text: str) -> list[float]:
+        seed = int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest())
+        vector = np.random.default_rng(seed).standard_normal(self.dim)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+
+@contextmanager
+def fake_cohere(**kwargs):
+    """
+    make `CohereEmbedding` use a `FakeCohereClient`
+
+    Yields
+    --------
+    client : FakeCohereClient
+        the fake client, holding the call statistics
+    """
+    client = FakeCohereClient(**kwargs)
+    with patch(
+        "tc_hivemind_backend.embeddings.cohere.CohereEmbedding.prepare_cohere",
+        return_value=client,
+    ):
+        yield client
+
+
+@contextmanager
+def offline_spacy_model(model_name: str = "en_core_web_sm"):
+    """
+    if the spaCy model is not installed, load a blank english pipeline with a
+    lookup lemmatizer instead (needs the `spacy-lookups-data` package)
+    """
+    if spacy.util.is_package(model_name):
+        yield
+        return
+
+    original_load = spacy.load
+
+    def load(name, *args, **kwargs):
+        if name != model_name:
+            return original_load(name, *args, **kwargs)
+        nlp = spacy.blank("en")
+        nlp.add_pipe("lemmatizer", config={"mode": "lookup"})
+        nlp.initialize()
+        return nlp
+
+    with patch("spacy.load", side_effect=load):
+        yield
@@ -14,4 +14,9 @@ setup(
     description="This repository is a shared library for together hivemind etl and bot codes.",
     long_description=open("README.md").read(),
     install_requires=requirements,
+    entry_points={
+        "console_scripts": [
+            "hivemind-worker=tc_hivemind_backend.jobs.worker:main",
+        ],
+    },
 )
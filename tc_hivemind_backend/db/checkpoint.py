@@ -0,0 +1,157 @@
+import logging
+from typing import Sequence
+
+import redis
+from llama_index.core.schema import BaseNode
+from tc_hivemind_backend.db.redis import RedisSingleton
+
+# the seconds a checkpoint is kept after its last update
+CHECKPOINT_TTL = 7 * 24 * 60 * 60
+
+
+class IngestionCheckpoint:
+    def __init__(
+        self,
+        community_id: str,
+        platform: str,
+        backend: str,
+        redis_client: redis.Redis | None = None,
+        ttl: int = CHECKPOINT_TTL,
+        key_prefix: str = "hivemind_checkpoint",
+    ) -> None:
+        """
+        the progress of an ingestion of a community's platform, kept in redis
+
+        the documents of a batch are marked as pending before ingesting the
+        batch, and as done once it is saved. So after a crash, the next run can
+        skip the done documents and clean up the pending ones, which may be
+        partially saved. The finished stages (i.e. a deletion ran before the
+        batches) are recorded too. The checkpoint should be cleared once the
+        whole ingestion is committed, an abandoned one expires after `ttl`
+        seconds without updates.
+
+        Parameters
+        ------------
+        community_id : str
+            the community id
+        platform : str
+            the platform (or table) name being ingested
+        backend : str
+            the vector store ingested into, i.e. `qdrant` or `pgvector`, so the
+            ingestions of the same platform into both don't share a checkpoint
+        redis_client : redis.Redis | None
+            the client to keep the checkpoint with, returning decoded strings
+            default is the `RedisSingleton` client
+        ttl : int
+            the seconds to keep the checkpoint after its last update
+        key_prefix : str
+            the prefix of the redis keys
+        """
+        self.community_id = community_id
+        self.platform = platform
+        self.backend = backend
+        self.redis_client = redis_client or RedisSingleton.get_instance().get_client()
+        self.ttl = ttl
+        key = f"{key_prefix}:{backend}:{community_id}:{platform}"
+        self._done_key = f"{key}:done"
+        self._pending_key = f"{key}:pending"
+        self._stages_key = f"{key}:stages"
+
+    def completed(self, documents: Sequence[BaseNode]) -> set[str]:
+        """
+        the ids of the documents already ingested, with the same content hash
+
+        Parameters
+        ------------
+        documents : Sequence[BaseNode]
+            the documents to check
+
+        Returns
+        ---------
+        doc_ids : set[str]
+            the ids of the given documents that are done
+        """
+        if not documents:
+            return set()
+        hashes = self.redis_client.hmget(
+            self._done_key, [doc.doc_id for doc in documents]
+        )
+        return {
+            doc.doc_id
+            for doc, doc_hash in zip(documents, hashes)
+            if doc_hash is not None and _decode(doc_hash) == doc.hash
+        }
+
+    def interrupted(self) -> list[str]:
+        """
+        the ids of the documents whose batch was started but not finished
+        """
+        return [
+            _decode(doc_id) for doc_id in self.redis_client.hkeys(self._pending_key)
+        ]
+
+    def start_batch(self, documents: Sequence[BaseNode]) -> None:
+        """
+        mark the documents of a batch as pending, before ingesting them
+        """
+        if not documents:
+            return
+        with self.redis_client.pipeline() as pipe:
+            pipe.hset(
+                self._pending_key, mapping={doc.doc_id: doc.hash for doc in documents}
+            )
+            self._expire(pipe)
+            pipe.execute()
+
+    def finish_batch(self, documents: Sequence[BaseNode]) -> None:
+        """
+        mark the documents of a batch as done, once they are saved
+        """
+        if not documents:
+            return
+        with self.redis_client.pipeline() as pipe:
+            pipe.hset(
+                self._done_key, mapping={doc.doc_id: doc.hash for doc in documents}
+            )
+            pipe.hdel(self._pending_key, *[doc.doc_id for doc in documents])
+            self._expire(pipe)
+            pipe.execute()
+
+    def clear_interrupted(self) -> None:
+        """
+        forget the pending documents, once they are cleaned up
+        """
+        self.redis_client.delete(self._pending_key)
+
+    def stage_done(self, stage: str) -> bool:
+        """
+        whether a stage (i.e. `deletion`) of the ingestion was finished
+        """
+        return bool(self.redis_client.hexists(self._stages_key, stage))
+
+    def mark_stage(self, stage: str) -> None:
+        """
+        record a stage of the ingestion as finished
+        """
+        with self.redis_client.pipeline() as pipe:
+            pipe.hset(self._stages_key, stage, 1)
+            self._expire(pipe)
+            pipe.execute()
+
+    def clear(self) -> None:
+        """
+        remove the checkpoint, once the whole ingestion is committed
+        """
+        self.redis_client.delete(self._done_key, self._pending_key, self._stages_key)
+        logging.info(
+            f"COMMUNITYID: {self.community_id} "
+            f"Checkpoint of {self.platform} ingestion was cleared!"
+        )
+
+    def _expire(self, pipe: redis.client.Pipeline) -> None:
+        for key in (self._done_key, self._pending_key, self._stages_key):
+            pipe.expire(key, self.ttl)
+
+
+def _decode(value: str | bytes) -> str:
+    return value.decode() if isinstance(value, bytes) else value
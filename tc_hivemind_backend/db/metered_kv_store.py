@@ -0,0 +1,116 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+from llama_index.core.storage.kvstore.types import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_COLLECTION,
+    BaseKVStore,
+)
+from tc_hivemind_backend import metrics
+
+OPERATION_METRIC = "hivemind_kvstore_operation"
+KEYS_METRIC = "hivemind_kvstore_keys_total"
+
+
+class MeteredKVStore(BaseKVStore):
+    """
+    wraps a llama-index KV store to record the latency of each operation and
+    the number of keys it touched, labeled by `backend` and `operation`
+
+    any other attribute (i.e. `delete_collection`) is forwarded as is
+    """
+
+    def __init__(self, kvstore: BaseKVStore, backend: str) -> None:
+        self._kvstore = kvstore
+        self._backend = backend
+
+    @property
+    def kvstore(self) -> BaseKVStore:
+        return self._kvstore
+
+    def __getattr__(self, name: str) -> Any:
+        # `_kvstore` isn't set yet, i.e. while unpickling or copying
+        if name == "_kvstore":
+            raise AttributeError(name)
+        return getattr(self._kvstore, name)
+
+    def put(self, key: str, val: dict, collection: str = DEFAULT_COLLECTION) -> None:
+        with self._timer("put"):
+            self._kvstore.put(key, val, collection=collection)
+        self._count("put", 1)
+
+    async def aput(
+        self, key: str, val: dict, collection: str = DEFAULT_COLLECTION
+    ) -> None:
+        with self._timer("put"):
+            await self._kvstore.aput(key, val, collection=collection)
+        self._count("put", 1)
+
+    def put_all(
+        self,
+        kv_pairs: List[Tuple[str, dict]],
+        collection: str = DEFAULT_COLLECTION,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ) -> None:
+        with self._timer("put_all"):
+            self._kvstore.put_all(
+                kv_pairs, collection=collection, batch_size=batch_size
+            )
+        self._count("put_all", len(kv_pairs))
+
+    async def aput_all(
+        self,
+        kv_pairs: List[Tuple[str, dict]],
+        collection: str = DEFAULT_COLLECTION,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ) -> None:
+        with self._timer("put_all"):
+            await self._kvstore.aput_all(
+                kv_pairs, collection=collection, batch_size=batch_size
+            )
+        self._count("put_all", len(kv_pairs))
+
+    def get(self, key: str, collection: str = DEFAULT_COLLECTION) -> Optional[dict]:
+        with self._timer("get"):
+            value = self._kvstore.get(key, collection=collection)
+        self._count("get", int(value is not None))
+        return value
+
+    async def aget(
+        self, key: str, collection: str = DEFAULT_COLLECTION
+    ) -> Optional[dict]:
+        with self._timer("get"):
+            value = await self._kvstore.aget(key, collection=collection)
+        self._count("get", int(value is not None))
+        return value
+
+    def get_all(self, collection: str = DEFAULT_COLLECTION) -> Dict[str, dict]:
+        with self._timer("get_all"):
+            values = self._kvstore.get_all(collection=collection)
+        self._count("get_all", len(values))
+        return values
+
+    async def aget_all(self, collection: str = DEFAULT_COLLECTION) -> Dict[str, dict]:
+        with self._timer("get_all"):
+            values = await self._kvstore.aget_all(collection=collection)
+        self._count("get_all", len(values))
+        return values
+
+    def delete(self, key: str, collection: str = DEFAULT_COLLECTION) -> bool:
+        with self._timer("delete"):
+            deleted = self._kvstore.delete(key, collection=collection)
+        self._count("delete", int(bool(deleted)))
+        return deleted
+
+    async def adelete(self, key: str, collection: str = DEFAULT_COLLECTION) -> bool:
+        with self._timer("delete"):
+            deleted = await self._kvstore.adelete(key, collection=collection)
+        self._count("delete", int(bool(deleted)))
+        return deleted
+
+    def _timer(self, operation: str):
+        return metrics.timer(
+            OPERATION_METRIC, backend=self._backend, operation=operation
+        )
+
+    def _count(self, operation: str, keys: int) -> None:
+        metrics.increment(KEYS_METRIC, keys, backend=self._backend, operation=operation)
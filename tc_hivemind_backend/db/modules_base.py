@@ -1,9 +1,20 @@
+import copy
+import json
+import logging
+import os
+import threading
+
 from bson import ObjectId
+from dotenv import load_dotenv
+from pymongo import ReadPreference
 
 from .mongo import MongoSingleton
+from .utils.ttl_cache import TTLCache
 
 
 class ModulesBase:
+    _cache: TTLCache | None = None
+
     def __init__(self) -> None:
         pass
 
@@ -11,6 +22,9 @@ class ModulesBase:
         """
         query the modules database for to get platforms' metadata
 
+        the results are cached for `MODULES_CACHE_TTL` seconds (default 60)
+        and shared between all `ModulesBase` instances
+
         Parameters
         -----------
         platform : str
@@ -19,16 +33,30 @@ class ModulesBase:
         **kwargs : dict
             projection : dict[str, int]
                 feature projection on query
+            use_cache : bool
+                if False, always query the database. default is True
 
         Returns
         ---------
         modules_docs : list[dict]
             all the module documents that have the `platform` within them
         """
-        client = MongoSingleton.get_instance().get_client()
         projection = kwargs.get("projection", {})
+        use_cache = kwargs.get("use_cache", True)
+
+        cache = self._get_cache()
+        # a nested projection (i.e. `{"options": {"$slice": 1}}`) is unhashable
+        cache_key = (platform, json.dumps(projection, sort_keys=True, default=str))
+        if use_cache:
+            cached_docs = cache.get(cache_key)
+            if cached_docs is not None:
+                return copy.deepcopy(cached_docs)
 
-        cursor = client["Core"]["modules"].find(
+        client = MongoSingleton.get_instance().get_client()
+        modules_collection = client["Core"].get_collection(
+            "modules", read_preference=ReadPreference.SECONDARY_PREFERRED
+        )
+        cursor = modules_collection.find(
             {
                 "options.platforms.name": platform,
                 "name": "hivemind",
@@ -37,8 +65,46 @@ class ModulesBase:
             projection,
         )
         modules_docs = list(cursor)
+
+        cache.set(cache_key, copy.deepcopy(modules_docs))
         return modules_docs
 
+    @classmethod
+    def invalidate_cache(cls, platform: str | None = None) -> None:
+        """
+        drop the cached module queries
+
+        Parameters
+        ------------
+        platform : str | None
+            the platform to drop its cached queries
+            if `None`, all cached queries are dropped
+        """
+        cache = cls._get_cache()
+        if platform is None:
+            removed = cache.invalidate()
+        else:
+            removed = cache.invalidate(lambda key: key[0] == platform)
+
+        logging.info(
+            f"Invalidated {removed} cached module queries! cache stats: {cache.stats()}"
+        )
+
+    @classmethod
+    def cache_stats(cls) -> dict[str, float]:
+        """
+        get the hits, misses, hit rate and size of the module queries cache
+        """
+        return cls._get_cache().stats()
+
+    @classmethod
+    def _get_cache(cls) -> TTLCache:
+        if cls._cache is None:
+            load_dotenv()
+            ttl = float(os.getenv("MODULES_CACHE_TTL", 60))
+            cls._cache = TTLCache(ttl=ttl)
+        return cls._cache
+
     def get_platform_community_ids(self, platform_name: str) -> list[str]:
         """
         get all community ids that a platform has
@@ -80,6 +146,7 @@ class ModulesBase:
 
         user_id = self.get_platform_metadata(platform_id, "userId")
         user_id = ObjectId(user_id)
+        # tokens are rotated, so they're always read from the primary
         token_doc = client["Core"]["tokens"].find_one(
             {
                 "user": user_id,
@@ -117,8 +184,11 @@ class ModulesBase:
             the values that the metadata belongs to
         """
         client = MongoSingleton.get_instance().get_client()
+        platforms_collection = client["Core"].get_collection(
+            "platforms", read_preference=ReadPreference.SECONDARY_PREFERRED
+        )
 
-        platform = client["Core"]["platforms"].find_one(
+        platform = platforms_collection.find_one(
             {
                 "_id": platform_id,
                 "disconnectedAt": None,
@@ -132,3 +202,64 @@ class ModulesBase:
 
         metadata_field = platform["metadata"][metadata_name]
         return metadata_field
+
+
+class ModulesChangeListener:
+    def __init__(self, max_await_time_ms: int = 1000, retry_interval: float = 5):
+        """
+        listen to the `Core.modules` change stream and invalidate the
+        `ModulesBase` query cache whenever a module is updated
+
+        Note: change streams are only available on replica sets and sharded clusters
+
+        Parameters
+        ------------
+        max_await_time_ms : int
+            the maximum time to wait for a change before checking for a stop request
+        retry_interval : float
+            the seconds to wait before reopening the change stream after an error
+        """
+        self.max_await_time_ms = max_await_time_ms
+        self.retry_interval = retry_interval
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        """
+        start listening in a background daemon thread
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._listen, name="modules-change-listener", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float | None = None) -> None:
+        """
+        stop listening and wait for the background thread to finish
+        """
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _listen(self) -> None:
+        client = MongoSingleton.get_instance().get_client()
+        while not self._stop_event.is_set():
+            try:
+                with client["Core"]["modules"].watch(
+                    max_await_time_ms=self.max_await_time_ms
+                ) as stream:
+                    # anything changed while the stream was closed is unknown
+                    ModulesBase.invalidate_cache()
+                    while not self._stop_event.is_set() and stream.alive:
+                        change = stream.try_next()
+                        if change is not None:
+                            ModulesBase.invalidate_cache()
+            except Exception as exp:
+                logging.error(f"Modules change stream error: {exp}")
+                ModulesBase.invalidate_cache()
+                self._stop_event.wait(self.retry_interval)
@@ -1,6 +1,9 @@
+import importlib.util
 import logging
-from typing import Optional
+import os
+from typing import Any, Optional
 
+from dotenv import load_dotenv
 from pymongo import MongoClient
 
 from .credentials import Credentials
@@ -14,7 +17,7 @@ class MongoSingleton:
             raise Exception("This class is a singleton!")
         else:
             connection_uri = get_mongo_uri()
-            self.client = MongoClient(connection_uri)
+            self.client = MongoClient(connection_uri, **get_mongo_client_options())
             MongoSingleton.__instance = self
 
     @staticmethod
@@ -43,3 +46,56 @@ def get_mongo_uri() -> str:
     connection = f"mongodb://{user}:{password}@{host}:{port}"
 
     return connection
+
+
+def get_mongo_client_options() -> dict[str, Any]:
+    """
+    load the `MongoClient` tuning options from .env
+
+    the supported envs are `MONGODB_MAX_POOL_SIZE`, `MONGODB_MIN_POOL_SIZE`,
+    `MONGODB_COMPRESSORS` (comma separated i.e. `zstd,snappy`),
+    `MONGODB_SERVER_SELECTION_TIMEOUT_MS`, `MONGODB_CONNECT_TIMEOUT_MS`,
+    `MONGODB_SOCKET_TIMEOUT_MS` and `MONGODB_MAX_IDLE_TIME_MS`
+
+    Returns
+    ---------
+    options : dict[str, Any]
+        the keyword arguments to pass to `MongoClient`
+        if `MONGODB_COMPRESSORS` is not set, the installed ones
+        of `zstd` and `snappy` are used
+    """
+    load_dotenv()
+
+    options: dict[str, Any] = {
+        "maxPoolSize": int(os.getenv("MONGODB_MAX_POOL_SIZE", 100)),
+        "minPoolSize": int(os.getenv("MONGODB_MIN_POOL_SIZE", 0)),
+        "serverSelectionTimeoutMS": int(
+            os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", 10000)
+        ),
+        "connectTimeoutMS": int(os.getenv("MONGODB_CONNECT_TIMEOUT_MS", 10000)),
+    }
+
+    socket_timeout = os.getenv("MONGODB_SOCKET_TIMEOUT_MS")
+    if socket_timeout:
+        options["socketTimeoutMS"] = int(socket_timeout)
+
+    max_idle_time = os.getenv("MONGODB_MAX_IDLE_TIME_MS")
+    if max_idle_time:
+        options["maxIdleTimeMS"] = int(max_idle_time)
+
+    compressors = os.getenv("MONGODB_COMPRESSORS")
+    if compressors is None:
+        compressors = ",".join(_available_compressors())
+    if compressors:
+        options["compressors"] = compressors
+
+    return options
+
+
+def _available_compressors() -> list[str]:
+    packages = {"zstd": "zstandard", "snappy": "snappy"}
+    return [
+        name
+        for name, package in packages.items()
+        if importlib.util.find_spec(package) is not None
+    ]
@@ -6,7 +6,10 @@ from tc_hivemind_backend.db.postgresql import PostgresSingleton
 
 
 def setup_db(
-    community_id: str, dbname: str, latest_date_query: str | None = None
+    community_id: str,
+    dbname: str,
+    latest_date_query: str | None = None,
+    latest_date_params: tuple | dict | None = None,
 ) -> datetime | None:
     """
     setup the database.
@@ -24,6 +27,9 @@ def setup_db(
         the query to get latest date of a message
         if `None`, then no need to check for latest_message date
         the return would be also `None` if this field was `None`
+    latest_date_params : tuple | dict | None
+        the parameters of `latest_date_query`, i.e. `(community_id,)` to
+        get the community's latest date from a table shared by communities
 
     Returns
     ---------
@@ -40,7 +46,9 @@ def setup_db(
             postgres.close_connection()
             if latest_date_query is not None:
                 logging.info(f"{msg}Checking the latest saved message!")
-                from_date = get_latest_msg(community_id, dbname, latest_date_query)
+                from_date = get_latest_msg(
+                    community_id, dbname, latest_date_query, latest_date_params
+                )
         else:
             logging.warning(
                 f"{msg}Database {dbname} is Not available! Creating one instead!"
@@ -61,7 +69,12 @@ def setup_db(
     return from_date
 
 
-def get_latest_msg(community_id: str, dbname: str, latest_date_query: str):
+def get_latest_msg(
+    community_id: str,
+    dbname: str,
+    latest_date_query: str,
+    params: tuple | dict | None = None,
+):
     from_date: datetime | None = None
     msg = f"COMMUNITYID: {community_id} "
 
@@ -73,7 +86,7 @@ def get_latest_msg(community_id: str, dbname: str, latest_date_query: str):
             # If we had some data previously saved
             # fetch the latest date we wanted to work on it
             logging.info(f"{msg}Loading the latest date from previous data")
-            cursor.execute(latest_date_query)
+            cursor.execute(latest_date_query, params)
             data = cursor.fetchone()
             if data is not None:
                 from_date = data[0]
@@ -92,6 +105,9 @@ def convert_tuple_str(data: list[str]) -> str:
     convert a list of inputs to a string tuple that
     can be queried within database
 
+    Note: the items are not escaped and a big list makes a huge query, prefer
+    `delete_data.delete_pg_documents` (or `= ANY(%s)` parameters) instead
+
     Parameters
     ------------
     data : list[str]
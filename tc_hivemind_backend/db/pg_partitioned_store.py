@@ -0,0 +1,365 @@
+import logging
+import re
+import threading
+from typing import Any, List, Optional
+
+from llama_index.core.schema import BaseNode
+from llama_index.legacy.bridge.pydantic import PrivateAttr
+from llama_index.legacy.vector_stores import PGVectorStore
+
+# the vector column types, `halfvec` stores the embeddings as float16 (2x smaller)
+VECTOR_TYPES = ("vector", "halfvec")
+_IDENTIFIER_PATTERN = re.compile(r"^[A-Za-z0-9_]+$")
+
+# connection string -> (engine, session maker, async engine, async session maker)
+# shared by the stores of all communities, so they use the same connection pools
+_ENGINES: dict[str, tuple[Any, Any, Any, Any]] = {}
+# the (connection string, schema, table, community) partitions already set up
+_INITIALIZED: set[tuple[str, str, str, str]] = set()
+_LOCK = threading.Lock()
+
+
+def partition_name(table_name: str, community_id: str) -> str:
+    """
+    the name of a community's partition of the `data_{table_name}` table
+    """
+    for identifier in (table_name, community_id):
+        if not _IDENTIFIER_PATTERN.match(identifier):
+            raise ValueError(
+                f"Invalid identifier: {identifier}! "
+                "only letters, digits and underscores are allowed"
+            )
+    return f"data_{table_name}_{community_id}".lower()
+
+
+def get_partitioned_data_model(
+    base: type,
+    table_name: str,
+    schema_name: str,
+    embed_dim: int,
+    vector_type: str,
+    hybrid_search: bool = False,
+    text_search_config: str = "english",
+) -> Any:
+    """
+    create the sqlalchemy model of the `data_{table_name}` table shared by the
+    communities, the `get_data_model` of llama-index with a `community_id` column
+    """
+    from pgvector.sqlalchemy import HALFVEC, Vector
+    from sqlalchemy import Column, Computed
+    from sqlalchemy.dialects.postgresql import BIGINT, JSON, TSVECTOR, VARCHAR
+
+    class AbstractData(base):  # type: ignore
+        __abstract__ = True
+        id = Column(BIGINT, primary_key=True, autoincrement=True)
+        community_id = Column(VARCHAR, primary_key=True, autoincrement=False)
+        text = Column(VARCHAR, nullable=False)
+        metadata_ = Column(JSON)
+        node_id = Column(VARCHAR)
+        embedding = Column(
+            HALFVEC(embed_dim) if vector_type == "halfvec" else Vector(embed_dim)
+        )
+
+    class HybridAbstractData(AbstractData):
+        __abstract__ = True
+        text_search_tsv = Column(
+            TSVECTOR,
+            Computed(f"to_tsvector('{text_search_config}', text)", persisted=True),
+        )
+
+    return type(
+        f"PartitionedData{table_name}",
+        (HybridAbstractData if hybrid_search else AbstractData,),
+        {
+            "__tablename__": f"data_{table_name}",
+            "__table_args__": {"schema": schema_name},
+        },
+    )
+
+
+class DocIndexedPGVectorStore(PGVectorStore):
+    """
+    the `PGVectorStore` of a community's own database, with an index on the
+    `doc_id` metadata of its `data_{table_name}` table
+
+    the documents' nodes are deleted by their `doc_id` (see
+    `delete_pg_documents`), the index is also added to the tables created
+    before it
+    """
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "DocIndexedPGVectorStore"
+
+    def _create_tables_if_not_exists(self) -> None:
+        from sqlalchemy import text
+
+        super()._create_tables_if_not_exists()
+        table = f"data_{self.table_name}"
+        with self._session() as session, session.begin():
+            session.execute(
+                text(
+                    f'CREATE INDEX IF NOT EXISTS "{table}_doc_id_idx" '
+                    f'ON "{self.schema_name}"."{table}" ((metadata_->>\'doc_id\'));'
+                )
+            )
+
+
+class PartitionedPGVectorStore(PGVectorStore):
+    """
+    a `PGVectorStore` keeping the data of all communities in one database
+
+    the `data_{table_name}` table is list-partitioned by `community_id`, each
+    community has its own partition with its own HNSW vector index. All queries,
+    dense and sparse (with `hybrid_search`), and deletions are scoped to the
+    store's community, so postgres only touches that partition. The stores of
+    a database share their connection pools.
+    """
+
+    _community_id: str = PrivateAttr()
+    _vector_type: str = PrivateAttr()
+
+    def __init__(
+        self, community_id: str, vector_type: str = "vector", **kwargs: Any
+    ) -> None:
+        if vector_type not in VECTOR_TYPES:
+            raise ValueError(
+                f"Unsupported vector type: {vector_type}! "
+                f"supported ones are {list(VECTOR_TYPES)}"
+            )
+        super().__init__(**kwargs)
+        partition_name(self.table_name, community_id)
+        if self.hybrid_search and not _IDENTIFIER_PATTERN.match(
+            self.text_search_config
+        ):
+            raise ValueError(f"Invalid text search config: {self.text_search_config}!")
+
+        from sqlalchemy.orm import declarative_base
+
+        self._community_id = community_id
+        self._vector_type = vector_type
+        self._base = declarative_base()
+        self._table_class = get_partitioned_data_model(
+            self._base,
+            self.table_name,
+            self.schema_name,
+            self.embed_dim,
+            vector_type,
+            self.hybrid_search,
+            self.text_search_config,
+        )
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "PartitionedPGVectorStore"
+
+    @classmethod
+    def from_params(  # type: ignore
+        cls,
+        community_id: str,
+        host: Optional[str] = None,
+        port: Optional[str] = None,
+        database: Optional[str] = None,
+        user: Optional[str] = None,
+        password: Optional[str] = None,
+        table_name: str = "llamaindex",
+        schema_name: str = "public",
+        embed_dim: int = 1024,
+        vector_type: str = "vector",
+        **kwargs: Any,
+    ) -> "PartitionedPGVectorStore":
+        """
+        create the store of a community from the database parameters
+
+        Parameters
+        ------------
+        community_id : str
+            the community to read and write the partition of
+        database : str
+            the database shared by all communities
+        table_name : str
+            the table name, the data is saved in `data_{table_name}`
+        embed_dim : int
+            the embedding dimension
+        vector_type : str
+            the vector column type, `vector` (float32) or `halfvec` (float16)
+            it only applies to a table created by the store
+        """
+        return cls(
+            community_id=community_id,
+            vector_type=vector_type,
+            connection_string=(
+                f"postgresql+psycopg2://{user}:{password}@{host}:{port}/{database}"
+            ),
+            async_connection_string=(
+                f"postgresql+asyncpg://{user}:{password}@{host}:{port}/{database}"
+            ),
+            table_name=table_name,
+            schema_name=schema_name,
+            embed_dim=embed_dim,
+            **kwargs,
+        )
+
+    @property
+    def community_id(self) -> str:
+        return self._community_id
+
+    def _connect(self) -> None:
+        with _LOCK:
+            if self.connection_string not in _ENGINES:
+                from sqlalchemy import create_engine
+                from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+                from sqlalchemy.orm import sessionmaker
+
+                engine = create_engine(
+                    self.connection_string, echo=self.debug, pool_pre_ping=True
+                )
+                async_engine = create_async_engine(self.async_connection_string)
+                _ENGINES[self.connection_string] = (
+                    engine,
+                    sessionmaker(engine),
+                    async_engine,
+                    sessionmaker(async_engine, class_=AsyncSession),  # type: ignore
+                )
+
+        (
+            self._engine,
+            self._session,
+            self._async_engine,
+            self._async_session,
+        ) = _ENGINES[self.connection_string]
+
+    def _initialize(self) -> None:
+        if self._is_initialized:
+            return
+
+        self._connect()
+        key = (
+            self.connection_string,
+            self.schema_name,
+            self.table_name,
+            self._community_id,
+        )
+        if self.perform_setup and key not in _INITIALIZED:
+            self._create_extension()
+            self._create_schema_if_not_exists()
+            self._create_tables_if_not_exists()
+            _INITIALIZED.add(key)
+        self._is_initialized = True
+
+    def _create_tables_if_not_exists(self) -> None:
+        from sqlalchemy import text
+
+        table = f"{self.schema_name}.data_{self.table_name}"
+        partition = partition_name(self.table_name, self._community_id)
+        with self._session() as session, session.begin():
+            session.execute(
+                text(
+                    f"""
+                    CREATE TABLE IF NOT EXISTS {table} (
+                        id BIGSERIAL,
+                        community_id VARCHAR NOT NULL,
+                        text VARCHAR NOT NULL,
+                        metadata_ JSON,
+                        node_id VARCHAR,
+                        embedding {self._vector_type}({self.embed_dim}),
+                        PRIMARY KEY (community_id, id)
+                    ) PARTITION BY LIST (community_id);
+                    """
+                )
+            )
+            if self.hybrid_search:
+                # added to the partitions too, i.e. of a table created without it
+                session.execute(
+                    text(
+                        f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS "
+                        "text_search_tsv tsvector GENERATED ALWAYS AS "
+                        f"(to_tsvector('{self.text_search_config}', text)) STORED;"
+                    )
+                )
+            session.execute(
+                text(
+                    f"CREATE TABLE IF NOT EXISTS {self.schema_name}.{partition} "
+                    f"PARTITION OF {table} FOR VALUES IN ('{self._community_id}');"
+                )
+            )
+            session.execute(
+                text(
+                    f"CREATE INDEX IF NOT EXISTS {partition}_embedding_idx "
+                    f"ON {self.schema_name}.{partition} "
+                    f"USING hnsw (embedding {self._vector_type}_cosine_ops);"
+                )
+            )
+            session.execute(
+                text(
+                    f"CREATE INDEX IF NOT EXISTS {partition}_doc_id_idx "
+                    f"ON {self.schema_name}.{partition} ((metadata_->>'doc_id'));"
+                )
+            )
+            if self.hybrid_search:
+                session.execute(
+                    text(
+                        f"CREATE INDEX IF NOT EXISTS {partition}_text_search_idx "
+                        f"ON {self.schema_name}.{partition} "
+                        "USING gin (text_search_tsv);"
+                    )
+                )
+        logging.info(f"Partition {partition} of {table} is set up!")
+
+    def _node_to_table_row(self, node: BaseNode) -> Any:
+        row = super()._node_to_table_row(node)
+        row.community_id = self._community_id
+        return row
+
+    def _build_query(
+        self,
+        embedding: Optional[List[float]],
+        limit: int = 10,
+        metadata_filters: Any = None,
+    ) -> Any:
+        stmt = super()._build_query(embedding, limit, metadata_filters)
+        # filtering on the partition key so only the community's partition is read
+        return stmt.where(self._table_class.community_id == self._community_id)
+
+    def _build_sparse_query(
+        self,
+        query_str: Optional[str],
+        limit: int,
+        metadata_filters: Any = None,
+    ) -> Any:
+        if not self.hybrid_search:
+            raise ValueError(
+                "Sparse and hybrid queries need a store created with hybrid_search!"
+            )
+        stmt = super()._build_sparse_query(query_str, limit, metadata_filters)
+        return stmt.where(self._table_class.community_id == self._community_id)
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        from sqlalchemy import text
+
+        self._initialize()
+        with self._session() as session, session.begin():
+            session.execute(
+                text(
+                    f"DELETE FROM {self.schema_name}.data_{self.table_name} "
+                    "WHERE community_id = :community_id "
+                    "AND (metadata_->>'doc_id')::text = :doc_id"
+                ),
+                {"community_id": self._community_id, "doc_id": ref_doc_id},
+            )
+
+    async def close(self) -> None:
+        # the engines are shared with the other communities' stores
+        # see `dispose_engines` to close them
+        return None
+
+
+def dispose_engines() -> None:
+    """
+    close the connection pools shared by the partitioned stores
+    """
+    with _LOCK:
+        for engine, _, _, _ in _ENGINES.values():
+            engine.dispose()
+        _ENGINES.clear()
+        _INITIALIZED.clear()
@@ -0,0 +1,101 @@
+import logging
+
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+from tc_hivemind_backend.db.qdrant import QdrantSingleton
+from tc_hivemind_backend.qdrant_vector_access import TENANT_FIELD, create_collection
+
+
+def migrate_to_shared_collection(
+    community_id: str,
+    platform: str,
+    batch_size: int = 256,
+    delete_source: bool = False,
+    client: QdrantClient | None = None,
+) -> int:
+    """
+    move a community's `{community_id}_{platform}` collection into the
+    `{platform}` collection shared by all communities
+
+    the points keep their ids, vectors and payload, and get the community id
+    under their `community_id` payload field. The shared collection is created
+    with the source collection's vectors and quantization config if not
+    available. Running it again re-upserts the same points, so an interrupted
+    migration can be resumed by running it once more.
+
+    Parameters
+    ------------
+    community_id : str
+        the community to migrate the collection of
+    platform : str
+        the platform name, which is the shared collection name
+    batch_size : int
+        the number of points to move at a time
+    delete_source : bool
+        if True, the source collection is deleted after the migration
+    client : qdrant_client.QdrantClient | None
+        the qdrant client to use, default is the `QdrantSingleton` one
+
+    Returns
+    ---------
+    migrated : int
+        the number of points moved into the shared collection
+    """
+    client = client or QdrantSingleton.get_instance().client
+    source = f"{community_id}_{platform}"
+    msg = f"COMMUNITYID: {community_id} "
+
+    if not client.collection_exists(source):
+        logging.info(f"{msg}No collection {source} to migrate!")
+        return 0
+
+    if not client.collection_exists(platform):
+        source_config = client.get_collection(source).config
+        vectors_config = source_config.params.vectors
+        if not isinstance(vectors_config, models.VectorParams):
+            raise ValueError(
+                f"Collection {source} has named vectors, which are not supported "
+                "in shared collections!"
+            )
+        create_collection(
+            client,
+            collection_name=platform,
+            vectors_config=vectors_config,
+            quantization_config=source_config.quantization_config,
+            multi_tenant=True,
+        )
+        logging.info(f"{msg}Shared collection {platform} was created!")
+
+    migrated = 0
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=source,
+            limit=batch_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True,
+        )
+        if points:
+            client.upsert(
+                collection_name=platform,
+                points=[
+                    models.PointStruct(
+                        id=point.id,
+                        vector=point.vector,
+                        payload={**(point.payload or {}), TENANT_FIELD: community_id},
+                    )
+                    for point in points
+                ],
+            )
+            migrated += len(points)
+            logging.info(f"{msg}{migrated} points moved from {source} to {platform}")
+
+        if offset is None:
+            break
+
+    if delete_source:
+        client.delete_collection(collection_name=source)
+        logging.info(f"{msg}Collection {source} was deleted after the migration!")
+
+    return migrated
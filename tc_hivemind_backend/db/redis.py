@@ -12,8 +12,9 @@ class RedisSingleton:
         if RedisSingleton.__instance is not None:
             raise Exception("This class is a singleton!")
         else:
-            creds = Credentials().load_redis()
-            self.client = self.create_redis_client(creds)
+            self._creds = Credentials().load_redis()
+            self.client = self.create_redis_client(self._creds)
+            self.binary_client: redis.Redis | None = None
             RedisSingleton.__instance = self
 
     @staticmethod
@@ -31,10 +32,23 @@ class RedisSingleton:
     def get_client(self):
         return self.client
 
-    def create_redis_client(self, redis_creds: dict[str, str]):
+    def get_binary_client(self):
+        """
+        get a client that returns raw bytes, for values that are not text
+        such as packed embedding vectors
+        """
+        if self.binary_client is None:
+            self.binary_client = self.create_redis_client(
+                self._creds, decode_responses=False
+            )
+        return self.binary_client
+
+    def create_redis_client(
+        self, redis_creds: dict[str, str], decode_responses: bool = True
+    ):
         return redis.Redis(
             host=redis_creds["host"],
             port=int(redis_creds["port"]),
             password=redis_creds["password"],
-            decode_responses=True,
+            decode_responses=decode_responses,
         )
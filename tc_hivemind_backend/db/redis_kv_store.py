@@ -1,8 +1,39 @@
 import json
-from typing import Any, Dict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
-from llama_index.core.storage.kvstore.types import DEFAULT_COLLECTION
+import orjson
+from llama_index.core.storage.kvstore.types import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_COLLECTION,
+)
 from llama_index.storage.kvstore.redis import RedisKVStore
+from tc_hivemind_backend import metrics
+from tc_hivemind_backend.db.utils.vector_codec import decode_value, encode_value
+
+# collections up to this size are loaded with a single HGETALL
+BULK_GET_THRESHOLD = 10_000
+# the HSCAN COUNT hint used to load bigger collections in large chunks, and the
+# number of keys read, written or deleted per round trip
+SCAN_CHUNK_SIZE = 10_000
+BYTES_METRIC = "hivemind_kvstore_bytes_total"
+
+
+def dumps(value: Any) -> str | bytes:
+    """
+    serialize a value into JSON with orjson, falling back to `json` for the
+    values orjson doesn't support (i.e. non-string keys)
+    """
+    try:
+        return orjson.dumps(value)
+    except TypeError:
+        return json.dumps(value)
+
+
+def loads(value: str | bytes) -> Any:
+    """
+    deserialize a JSON value, written by either `json` or orjson
+    """
+    return orjson.loads(value)
 
 
 class CustomRedisKVStore(RedisKVStore):
@@ -10,41 +41,200 @@ class CustomRedisKVStore(RedisKVStore):
     A Redis KV store that is compatible with redis-py clients configured with
     decode_responses=True. Overrides get_all/aget_all to avoid calling decode()
     on str keys/values.
+
+    Values are stored as JSON (serialized by orjson), so the
+    entries written by the upstream `RedisKVStore` stay readable. Bulk reads,
+    writes and deletes are done in large pipelined chunks.
     """
 
+    def put(self, key: str, val: dict, collection: str = DEFAULT_COLLECTION) -> None:
+        value = self._serialize(val)
+        self._redis_client.hset(name=collection, key=key, value=value)
+        self._record_bytes("write", len(value))
+
+    async def aput(
+        self, key: str, val: dict, collection: str = DEFAULT_COLLECTION
+    ) -> None:
+        value = self._serialize(val)
+        await self._async_redis_client.hset(name=collection, key=key, value=value)
+        self._record_bytes("write", len(value))
+
+    def put_all(
+        self,
+        kv_pairs: List[Tuple[str, dict]],
+        collection: str = DEFAULT_COLLECTION,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ) -> None:
+        """
+        put the key-value pairs with one HSET per `batch_size` pairs, the
+        pipeline is sent every `SCAN_CHUNK_SIZE` pairs so a big put isn't
+        buffered whole
+        """
+        batch_size = max(batch_size, 1)
+        written = 0
+        pending = 0
+        with self._redis_client.pipeline(transaction=False) as pipe:
+            for start in range(0, len(kv_pairs), batch_size):
+                mapping = {
+                    key: self._serialize(val)
+                    for key, val in kv_pairs[start : start + batch_size]
+                }
+                written += sum(len(value) for value in mapping.values())
+                pipe.hset(name=collection, mapping=mapping)
+                pending += len(mapping)
+                if pending >= SCAN_CHUNK_SIZE:
+                    pipe.execute()
+                    pending = 0
+            if pending:
+                pipe.execute()
+        self._record_bytes("write", written)
+
+    def get(self, key: str, collection: str = DEFAULT_COLLECTION) -> Optional[dict]:
+        val_str = self._redis_client.hget(name=collection, key=key)
+        if val_str is None:
+            return None
+        self._record_bytes("read", len(val_str))
+        return self._deserialize(val_str)
+
+    async def aget(
+        self, key: str, collection: str = DEFAULT_COLLECTION
+    ) -> Optional[dict]:
+        val_str = await self._async_redis_client.hget(name=collection, key=key)
+        if val_str is None:
+            return None
+        self._record_bytes("read", len(val_str))
+        return self._deserialize(val_str)
+
     def get_all(self, collection: str = DEFAULT_COLLECTION) -> Dict[str, dict]:
+        """
+        get all values of a collection
+
+        small collections are loaded with a single HGETALL and bigger ones
+        with HSCAN in chunks of `SCAN_CHUNK_SIZE`, so Redis is not blocked
+        """
+        if self._redis_client.hlen(collection) <= BULK_GET_THRESHOLD:
+            items = self._redis_client.hgetall(collection).items()
+        else:
+            items = self._redis_client.hscan_iter(
+                name=collection, count=SCAN_CHUNK_SIZE
+            )
+        return self._decode_items(items)
+
+    async def aget_all(self, collection: str = DEFAULT_COLLECTION) -> Dict[str, dict]:
         collection_kv_dict: Dict[str, dict] = {}
-        for key, val_str in self._redis_client.hscan_iter(name=collection):
-            # Handle both bytes and str for key and value
-            if isinstance(key, bytes):
-                key = key.decode()
-            if isinstance(val_str, bytes):
-                val_str = val_str.decode()
-
-            value_obj = json.loads(val_str) if val_str is not None else None
-            if value_obj is not None:
-                # Ensure dict type
-                value_dict = value_obj if isinstance(value_obj, dict) else dict(value_obj)
-                collection_kv_dict[key] = value_dict
+        async for key, val_str in self._async_redis_client.hscan_iter(
+            name=collection, count=SCAN_CHUNK_SIZE
+        ):
+            collection_kv_dict.update(self._decode_items([(key, val_str)]))
         return collection_kv_dict
 
-    async def aget_all(self, collection: str = DEFAULT_COLLECTION) -> Dict[str, dict]:
+    def get_many(
+        self,
+        keys: List[str],
+        collection: str = DEFAULT_COLLECTION,
+        batch_size: int = SCAN_CHUNK_SIZE,
+    ) -> Dict[str, dict]:
+        """
+        get the values of many keys with pipelined HMGETs of `batch_size` keys
+
+        Returns
+        ---------
+        kv_dict : Dict[str, dict]
+            the found keys and their values, missing keys are left out
+        """
+        batch_size = max(batch_size, 1)
+        with self._redis_client.pipeline(transaction=False) as pipe:
+            for start in range(0, len(keys), batch_size):
+                pipe.hmget(collection, keys[start : start + batch_size])
+            results = pipe.execute()
+
+        values = [value for chunk in results for value in chunk]
+        return self._decode_items(zip(keys, values))
+
+    def delete_all(
+        self,
+        keys: List[str],
+        collection: str = DEFAULT_COLLECTION,
+        batch_size: int = SCAN_CHUNK_SIZE,
+    ) -> int:
+        """
+        delete many keys with pipelined HDELs of `batch_size` keys
+
+        Returns
+        ---------
+        deleted_num : int
+            the number of deleted keys
+        """
+        batch_size = max(batch_size, 1)
+        with self._redis_client.pipeline(transaction=False) as pipe:
+            for start in range(0, len(keys), batch_size):
+                pipe.hdel(collection, *keys[start : start + batch_size])
+            results = pipe.execute()
+        return sum(results)
+
+    def delete_collection(self, collection: str = DEFAULT_COLLECTION) -> bool:
+        """
+        delete a whole collection in one call, the memory is freed in the background
+        """
+        return bool(self._redis_client.unlink(collection))
+
+    @classmethod
+    def from_redis_client(cls, redis_client: Any) -> "CustomRedisKVStore":
+        # Keep parity with upstream API for convenience
+        return cls(redis_client=redis_client)
+
+    def _serialize(self, value: dict) -> str | bytes:
+        return dumps(value)
+
+    def _deserialize(self, value: str | bytes) -> Any:
+        return loads(value)
+
+    def _decode_items(
+        self, items: Iterable[Tuple[str | bytes, str | bytes | None]]
+    ) -> Dict[str, dict]:
         collection_kv_dict: Dict[str, dict] = {}
-        async for key, val_str in self._async_redis_client.hscan_iter(name=collection):
+        read = 0
+        for key, val_str in items:
+            if val_str is None:
+                continue
+            read += len(val_str)
+            # Handle both bytes and str for key
             if isinstance(key, bytes):
                 key = key.decode()
-            if isinstance(val_str, bytes):
-                val_str = val_str.decode()
 
-            value_obj = json.loads(val_str) if val_str is not None else None
-            if value_obj is not None:
-                value_dict = value_obj if isinstance(value_obj, dict) else dict(value_obj)
-                collection_kv_dict[key] = value_dict
+            value_obj = self._deserialize(val_str)
+            # Ensure dict type
+            value_dict = value_obj if isinstance(value_obj, dict) else dict(value_obj)
+            collection_kv_dict[key] = value_dict
+        self._record_bytes("read", read)
         return collection_kv_dict
 
+    def _record_bytes(self, direction: str, size: int) -> None:
+        metrics.increment(BYTES_METRIC, size, backend="redis", direction=direction)
+
+
+class PackedEmbeddingRedisKVStore(CustomRedisKVStore):
+    """
+    A Redis KV store that keeps the `embedding` lists of its values as packed
+    float32/float16 bytes instead of JSON text, i.e. for the ingestion cache.
+
+    It needs a redis-py client configured with decode_responses=False
+    (see `RedisSingleton.get_binary_client`). Plain JSON values written before
+    are still readable.
+    """
+
+    def __init__(self, *args: Any, dtype: str = "float32", **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.dtype = dtype
+
     @classmethod
-    def from_redis_client(cls, redis_client: Any) -> "CustomRedisKVStore":
-        # Keep parity with upstream API for convenience
-        return cls(redis_client=redis_client)
+    def from_redis_client(
+        cls, redis_client: Any, dtype: str = "float32"
+    ) -> "PackedEmbeddingRedisKVStore":
+        return cls(redis_client=redis_client, dtype=dtype)
 
+    def _serialize(self, value: dict) -> bytes:
+        return encode_value(value, dtype=self.dtype)
 
+    def _deserialize(self, value: str | bytes) -> Any:
+        return decode_value(value)
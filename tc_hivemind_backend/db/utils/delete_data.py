@@ -1,18 +1,38 @@
+import json
 import logging
+from typing import Any, Callable, Iterator
 
+from psycopg2 import sql
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+from tc_hivemind_backend import metrics
 from tc_hivemind_backend.db.postgresql import PostgresSingleton
 
+DELETION_BATCH_SIZE = 1000
 
-def delete_data(deletion_query: str, dbname: str) -> None:
+# called after each batch with the number of processed items and their total
+# (ids to delete, or `None` when deleting by metadata filters only)
+DeletionProgress = Callable[[int, int | None], None]
+
+
+def delete_data(
+    deletion_query: str, dbname: str, params: tuple | dict | None = None
+) -> None:
     """
     a wrapper function to add the deletion feature
 
+    Note: for deleting documents by their ids or metadata, prefer
+    `delete_pg_documents` which deletes in bounded batches
+
     Parameters
     -----------
     deletion_query : str
         the query to delete or modify the database
     dbname : str
         the database name to use
+    params : tuple | dict | None
+        the parameters of the query, i.e. `(community_id,)` for a
+        `WHERE community_id = %s` condition on a table shared by communities
     """
     postgres: PostgresSingleton
     try:
@@ -22,7 +42,7 @@ def delete_data(deletion_query: str, dbname: str) -> None:
         connection.autocommit = True
         with connection.cursor() as cursor:
             logging.info("Deleting data from postgresql!")
-            cursor.execute(deletion_query)
+            cursor.execute(deletion_query, params)
     except Exception as exp:
         logging.error(f"Database deletion error: {exp}")
     finally:
@@ -30,3 +50,264 @@ def delete_data(deletion_query: str, dbname: str) -> None:
             postgres.close_connection()
         else:
             logging.error(f"No database with name {dbname}!")
+
+
+def delete_pg_documents(
+    dbname: str,
+    table_name: str,
+    doc_ids: list[str] | None = None,
+    metadata_filters: dict[str, Any] | None = None,
+    community_id: str | None = None,
+    batch_size: int = DELETION_BATCH_SIZE,
+    progress: DeletionProgress | None = None,
+) -> int:
+    """
+    delete the nodes of documents from a pgvector table in bounded batches
+
+    each batch is its own statement and transaction, so the locks are held
+    briefly and a failure only rolls back the batch it happened in. The ids
+    and values are sent as array parameters (`= ANY(%s)`), never as literals.
+
+    Parameters
+    -----------
+    dbname : str
+        the database name to use
+    table_name : str
+        the table name, the data is saved in `data_{table_name}`
+    doc_ids : list[str] | None
+        the ids of the documents (the `doc_id` metadata) to delete the nodes of
+    metadata_filters : dict[str, Any] | None
+        the metadata the nodes to delete should have, a list value matches any
+        of its items. i.e. `{"channel": ["general", "dev"]}`
+        if given with `doc_ids`, the nodes should match both
+    community_id : str | None
+        the community to scope the deletion to, for a table shared by
+        communities (see `PartitionedPGVectorStore`)
+    batch_size : int
+        the number of ids, or of rows when deleting by `metadata_filters`
+        only, to delete per statement
+    progress : Callable[[int, int | None], None] | None
+        called after each batch with the processed ids (or deleted rows) and
+        the total ids to delete (`None` when deleting by metadata filters only)
+
+    Returns
+    ---------
+    deleted : int
+        the number of deleted rows
+    """
+    if not doc_ids and not metadata_filters:
+        raise ValueError("Either `doc_ids` or `metadata_filters` should be given!")
+
+    table = sql.Identifier(f"data_{table_name}")
+    conditions: list[sql.Composable] = []
+    params: list[Any] = []
+    if community_id is not None:
+        conditions.append(sql.SQL("community_id = %s"))
+        params.append(community_id)
+    for key, value in (metadata_filters or {}).items():
+        conditions.append(sql.SQL("(metadata_->>%s) = ANY(%s)"))
+        params.extend([key, _filter_values(value)])
+
+    msg = f"COMMUNITYID: {community_id} " if community_id else ""
+    deleted = 0
+    postgres = PostgresSingleton(dbname=dbname)
+    try:
+        connection = postgres.get_connection()
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            if doc_ids:
+                query = sql.SQL("DELETE FROM {} WHERE {}").format(
+                    table,
+                    sql.SQL(" AND ").join(
+                        conditions + [sql.SQL("(metadata_->>'doc_id') = ANY(%s)")]
+                    ),
+                )
+                processed = 0
+                for batch in _batches(doc_ids, batch_size):
+                    with metrics.timer(
+                        "hivemind_vector_store_operation",
+                        backend="pgvector",
+                        operation="delete",
+                    ):
+                        cursor.execute(query, params + [batch])
+                    deleted += cursor.rowcount
+                    processed += len(batch)
+                    _report(msg, progress, processed, len(doc_ids), deleted)
+            else:
+                # deleting a bounded number of matching rows at a time
+                where = sql.SQL(" AND ").join(conditions)
+                query = sql.SQL(
+                    "DELETE FROM {table} WHERE id IN "
+                    "(SELECT id FROM {table} WHERE {where} LIMIT %s)"
+                ).format(table=table, where=where)
+                if community_id is not None:
+                    query = sql.SQL("{} AND community_id = %s").format(query)
+
+                while True:
+                    with metrics.timer(
+                        "hivemind_vector_store_operation",
+                        backend="pgvector",
+                        operation="delete",
+                    ):
+                        batch_params = params + [batch_size]
+                        if community_id is not None:
+                            batch_params.append(community_id)
+                        cursor.execute(query, batch_params)
+                    deleted += cursor.rowcount
+                    _report(msg, progress, deleted, None, deleted)
+                    if cursor.rowcount < batch_size:
+                        break
+    finally:
+        postgres.close_connection()
+
+    metrics.increment(
+        "hivemind_vector_store_points_total",
+        deleted,
+        backend="pgvector",
+        operation="delete",
+    )
+    return deleted
+
+
+def delete_qdrant_documents(
+    client: QdrantClient,
+    collection_name: str,
+    doc_ids: list[str] | None = None,
+    metadata_filters: dict[str, Any] | None = None,
+    community_id: str | None = None,
+    batch_size: int = DELETION_BATCH_SIZE,
+    progress: DeletionProgress | None = None,
+    id_field: str = "doc_id",
+) -> int:
+    """
+    delete the points of documents from a qdrant collection in bounded batches
+
+    the parameters are the same as `delete_pg_documents`, with the
+    `community_id` scoping a collection shared by communities (see
+    `qdrant_vector_access.create_collection`), and `id_field` being the
+    payload field holding the document id (`doc_id` and `ref_doc_id` are
+    both set by llama-index). A keyword payload index is created on
+    `id_field` when deleting by `doc_ids`, if it doesn't exist yet
+
+    Returns
+    ---------
+    processed : int
+        the number of processed document ids, or of deleted points when
+        deleting by `metadata_filters` only
+    """
+    if not doc_ids and not metadata_filters:
+        raise ValueError("Either `doc_ids` or `metadata_filters` should be given!")
+
+    conditions: list[models.Condition] = []
+    if community_id is not None:
+        conditions.append(
+            models.FieldCondition(
+                key="community_id", match=models.MatchValue(value=community_id)
+            )
+        )
+    for key, value in (metadata_filters or {}).items():
+        values = value if isinstance(value, (list, tuple, set)) else [value]
+        conditions.append(
+            models.FieldCondition(key=key, match=models.MatchAny(any=list(values)))
+        )
+
+    msg = f"COMMUNITYID: {community_id} " if community_id else ""
+    processed = 0
+    if doc_ids:
+        # the `MatchAny` filter of each batch is an index lookup
+        client.create_payload_index(
+            collection_name=collection_name,
+            field_name=id_field,
+            field_schema=models.PayloadSchemaType.KEYWORD,
+        )
+        for batch in _batches(doc_ids, batch_size):
+            batch_filter = models.Filter(
+                must=conditions
+                + [
+                    models.FieldCondition(
+                        key=id_field, match=models.MatchAny(any=batch)
+                    )
+                ]
+            )
+            with metrics.timer(
+                "hivemind_vector_store_operation", backend="qdrant", operation="delete"
+            ):
+                # a filter deletion doesn't give the number of deleted points
+                points = client.count(
+                    collection_name=collection_name,
+                    count_filter=batch_filter,
+                    exact=True,
+                ).count
+                client.delete(
+                    collection_name=collection_name,
+                    points_selector=models.FilterSelector(filter=batch_filter),
+                )
+            metrics.increment(
+                "hivemind_vector_store_points_total",
+                points,
+                backend="qdrant",
+                operation="delete",
+            )
+            processed += len(batch)
+            _report(msg, progress, processed, len(doc_ids))
+        return processed
+
+    # deleting the matching points a page at a time
+    while True:
+        points, _ = client.scroll(
+            collection_name=collection_name,
+            scroll_filter=models.Filter(must=conditions),
+            limit=batch_size,
+            with_payload=False,
+            with_vectors=False,
+        )
+        if not points:
+            break
+        with metrics.timer(
+            "hivemind_vector_store_operation", backend="qdrant", operation="delete"
+        ):
+            client.delete(
+                collection_name=collection_name,
+                points_selector=models.PointIdsList(
+                    points=[point.id for point in points]
+                ),
+            )
+        processed += len(points)
+        metrics.increment(
+            "hivemind_vector_store_points_total",
+            len(points),
+            backend="qdrant",
+            operation="delete",
+        )
+        _report(msg, progress, processed, None)
+        if len(points) < batch_size:
+            break
+    return processed
+
+
+def _batches(items: list[str], batch_size: int) -> Iterator[list[str]]:
+    if batch_size < 1:
+        raise ValueError("batch_size should be a positive number!")
+    for start in range(0, len(items), batch_size):
+        yield list(items[start : start + batch_size])
+
+
+def _filter_values(value: Any) -> list[str]:
+    values = value if isinstance(value, (list, tuple, set)) else [value]
+    # `->>` gives the values as their JSON text, i.e. `true` for `True`
+    return [item if isinstance(item, str) else json.dumps(item) for item in values]
+
+
+def _report(
+    msg: str,
+    progress: DeletionProgress | None,
+    processed: int,
+    total: int | None,
+    deleted: int | None = None,
+) -> None:
+    status = f"{processed}/{total} ids" if total is not None else f"{processed}"
+    if deleted is not None:
+        status += f", {deleted} rows deleted"
+    logging.info(f"{msg}Deletion progress: {status}")
+    if progress is not None:
+        progress(processed, total)
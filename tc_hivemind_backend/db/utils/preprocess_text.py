@@ -1,9 +1,294 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any
+
+import redis
 import spacy
+from dotenv import load_dotenv
+from spacy.lang.en.stop_words import STOP_WORDS
+from tc_hivemind_backend import metrics
+
+SPACY_MODEL = "en_core_web_sm"
+# `spacy` parses each text with the spacy model and lemmatizes its words,
+# `fast` only lowercases the words it finds with regexes
+CLEANING_MODES = ("spacy", "fast")
+# the number of cleaned texts remembered in memory
+PREPROCESS_MEMO_SIZE = 100_000
+# the total characters of the cleaned texts remembered in memory
+PREPROCESS_MEMO_MAX_CHARS = 50_000_000
+# the seconds a cleaned text is remembered in redis
+PREPROCESS_MEMO_TTL = 7 * 24 * 60 * 60
+
+# the `fast` mode counterparts of the spacy token attributes
+_URL_PATTERN = re.compile(
+    r"(?:https?://|www\.)\S+"
+    r"|\b[\w.-]+\.(?:com|org|net|io|dev|ai|app|xyz|gg|co|me)\b(?:/\S*)?",
+    re.IGNORECASE,
+)
+# words, keeping the contractions (i.e. `n't`, `'re`) as separate tokens
+_TOKEN_PATTERN = re.compile(r"\w+?(?=n['’]t\b)|n['’]t\b|['’]\w+|\w+")
+_NUMBER_PATTERN = re.compile(r"^[+-]?\d[\d,./:]*$|^\d+(?:st|nd|rd|th)$")
+_STOP_WORDS = frozenset(STOP_WORDS)
+_NUMBER_WORDS = frozenset(
+    (
+        "zero one two three four five six seven eight nine ten eleven twelve "
+        "thirteen fourteen fifteen sixteen seventeen eighteen nineteen twenty "
+        "thirty forty fifty sixty seventy eighty ninety hundred thousand million "
+        "billion trillion quadrillion first second third fourth fifth sixth "
+        "seventh eighth ninth tenth eleventh twelfth thirteenth fourteenth "
+        "fifteenth sixteenth seventeenth eighteenth nineteenth twentieth "
+        "thirtieth fortieth fiftieth sixtieth seventieth eightieth ninetieth "
+        "hundredth thousandth millionth billionth trillionth"
+    ).split()
+)
+
+
+@lru_cache(maxsize=None)
+def load_spacy_model(model_name: str = SPACY_MODEL) -> Any:
+    """
+    load a spacy model, once per process
+
+    a failed load is not remembered, `load_spacy_model.cache_clear()`
+    forgets the loaded models
+    """
+    try:
+        return spacy.load(model_name)
+    except OSError as exp:
+        raise OSError(f"Model spacy `{model_name}` is not installed!") from exp
+
+
+class CleaningMemo:
+    def __init__(
+        self,
+        max_size: int = PREPROCESS_MEMO_SIZE,
+        redis_client: redis.Redis | None = None,
+        ttl: int = PREPROCESS_MEMO_TTL,
+        key_prefix: str = "hivemind_preprocess",
+        max_chars: int = PREPROCESS_MEMO_MAX_CHARS,
+    ) -> None:
+        """
+        remember the cleaned texts by the hash of the input texts
+
+        the least recently used texts are forgotten first, once there are more
+        than `max_size` texts or `max_chars` characters. With a redis client
+        the cleaned texts are also kept in redis for `ttl` seconds, so the
+        next runs and the other processes find them too
+
+        Parameters
+        ------------
+        max_size : int
+            the number of cleaned texts to remember in memory, `0` disables it
+        redis_client : redis.Redis | None
+            the client to persist the cleaned texts with
+            default is `None`, meaning they are only kept in memory
+        ttl : int
+            the seconds a cleaned text is kept in redis
+        key_prefix : str
+            the prefix of the redis keys
+        max_chars : int
+            the total characters of the cleaned texts to remember in memory,
+            a longer text is only kept in redis
+        """
+        self.max_size = max_size
+        self.max_chars = max_chars
+        self.redis_client = redis_client
+        self.ttl = ttl
+        self.key_prefix = key_prefix
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self._texts: OrderedDict[str, str] = OrderedDict()
+        self._chars = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(text: str, namespace: str = "") -> str:
+        """
+        the memo key of an input text
+        """
+        digest = hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+        return f"{namespace}:{digest}" if namespace else digest
+
+    def get(self, key: str) -> str | None:
+        """
+        the cleaned text remembered for a key, `None` if there's none
+        """
+        with self._lock:
+            cleaned_text = self._texts.get(key)
+            if cleaned_text is not None:
+                self._texts.move_to_end(key)
+                self.hits += 1
+        if cleaned_text is not None:
+            metrics.increment("hivemind_preprocess_memo_total", result="hit")
+            return cleaned_text
+
+        if self.redis_client is not None:
+            try:
+                value = self.redis_client.get(f"{self.key_prefix}:{key}")
+            except redis.RedisError as exp:
+                logging.error(f"Failed to read the cleaned text from redis: {exp}")
+                value = None
+            if value is not None:
+                cleaned_text = value.decode() if isinstance(value, bytes) else value
+                self._remember(key, cleaned_text)
+                with self._lock:
+                    self.redis_hits += 1
+                metrics.increment("hivemind_preprocess_memo_total", result="redis_hit")
+                return cleaned_text
+
+        with self._lock:
+            self.misses += 1
+        metrics.increment("hivemind_preprocess_memo_total", result="miss")
+        return None
+
+    def put(self, key: str, cleaned_text: str) -> None:
+        """
+        remember the cleaned text of a key
+        """
+        self._remember(key, cleaned_text)
+        if self.redis_client is not None:
+            try:
+                self.redis_client.set(
+                    f"{self.key_prefix}:{key}", cleaned_text, ex=self.ttl
+                )
+            except redis.RedisError as exp:
+                logging.error(f"Failed to save the cleaned text in redis: {exp}")
+
+    def clear(self) -> None:
+        """
+        forget the texts remembered in memory and reset the stats
+        """
+        with self._lock:
+            self._texts.clear()
+            self._chars = 0
+            self.hits = self.redis_hits = self.misses = 0
+
+    def stats(self) -> dict[str, float]:
+        """
+        the memo hits (in memory and in redis), misses and hit rate
+        """
+        with self._lock:
+            lookups = self.hits + self.redis_hits + self.misses
+            return {
+                "size": len(self._texts),
+                "chars": self._chars,
+                "hits": self.hits,
+                "redis_hits": self.redis_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.redis_hits) / lookups if lookups else 0.0,
+            }
+
+    def _remember(self, key: str, cleaned_text: str) -> None:
+        if self.max_size <= 0 or len(cleaned_text) > self.max_chars:
+            return
+        with self._lock:
+            previous = self._texts.pop(key, None)
+            if previous is not None:
+                self._chars -= len(previous)
+            self._texts[key] = cleaned_text
+            self._chars += len(cleaned_text)
+            while len(self._texts) > self.max_size or self._chars > self.max_chars:
+                _, forgotten = self._texts.popitem(last=False)
+                self._chars -= len(forgotten)
+
+
+_memo: CleaningMemo | None = None
+
+
+def get_memo() -> CleaningMemo:
+    """
+    get the memo shared by the preprocessors, creating it from the env
+    variables on the first call
+    """
+    global _memo
+    if _memo is None:
+        _memo = create_memo_from_env()
+    return _memo
+
+
+def set_memo(memo: CleaningMemo | None) -> CleaningMemo | None:
+    """
+    replace the memo shared by the preprocessors
+
+    Parameters
+    ------------
+    memo : CleaningMemo | None
+        the new memo, if `None` it is created again from the env variables
+        on the next use
+
+    Returns
+    ---------
+    previous : CleaningMemo | None
+        the memo that was shared before
+    """
+    global _memo
+    previous, _memo = _memo, memo
+    return previous
+
+
+def create_memo_from_env() -> CleaningMemo:
+    """
+    create a memo of `PREPROCESS_MEMO_SIZE` texts and
+    `PREPROCESS_MEMO_MAX_CHARS` characters (env variables), persisted in redis
+    if the `PREPROCESS_MEMO_REDIS` env variable is `true`
+    """
+    load_dotenv()
+    max_size = int(os.getenv("PREPROCESS_MEMO_SIZE", PREPROCESS_MEMO_SIZE))
+    max_chars = int(os.getenv("PREPROCESS_MEMO_MAX_CHARS", PREPROCESS_MEMO_MAX_CHARS))
+    redis_client = None
+    if os.getenv("PREPROCESS_MEMO_REDIS", "false").strip().lower() == "true":
+        from tc_hivemind_backend.db.redis import RedisSingleton
+
+        redis_client = RedisSingleton.get_instance().get_client()
+    return CleaningMemo(
+        max_size=max_size, redis_client=redis_client, max_chars=max_chars
+    )
 
 
 class BasePreprocessor:
-    def __init__(self) -> None:
-        pass
+    def __init__(
+        self,
+        memo: CleaningMemo | None = None,
+        mode: str = "spacy",
+        ascii_only: bool = True,
+    ) -> None:
+        """
+        Parameters
+        ------------
+        memo : CleaningMemo | None
+            the memo of the cleaned texts
+            default is the one shared by all preprocessors (see `get_memo`)
+        mode : str
+            the cleaning mode, one of `CLEANING_MODES`
+            `spacy` (default) parses the text with the spacy model, dropping
+            the punctuation, stop words, urls and numbers and lemmatizing the
+            remaining words. `fast` drops the same kinds of words with regexes
+            and the spacy stop word list, without lemmatizing them, so it
+            gives lowercased words instead of lemmas (i.e. `tokens` for
+            `token`). it is several times faster on short messages
+        ascii_only : bool
+            if True (default), the words with non-ascii characters are dropped
+            set it to False to keep the non-english text
+        """
+        if mode not in CLEANING_MODES:
+            raise ValueError(
+                f"Unsupported cleaning mode: {mode}! "
+                f"supported ones are {list(CLEANING_MODES)}"
+            )
+        self._memo = memo
+        self.mode = mode
+        self.ascii_only = ascii_only
+        # the texts cleaned differently are remembered separately
+        self._memo_namespace = mode if ascii_only else f"{mode}_unicode"
+
+    @property
+    def memo(self) -> CleaningMemo:
+        return self._memo if self._memo is not None else get_memo()
 
     def extract_main_content(self, text: str) -> str:
         """
@@ -19,25 +304,61 @@ class BasePreprocessor:
         cleaned_text : str
 
         """
-        try:
-            nlp = spacy.load("en_core_web_sm")
-        except OSError as exp:
-            raise OSError(f"Model spacy `en_core_web_sm` is not installed!") from exp
+        memo = self.memo
+        key = memo.key(text, self._memo_namespace)
+        with metrics.timer("hivemind_preprocess", mode=self.mode):
+            cleaned_text = memo.get(key)
+            if cleaned_text is None:
+                if self.mode == "fast":
+                    cleaned_text = self._extract_main_content_fast(text)
+                else:
+                    cleaned_text = self._extract_main_content(text)
+                memo.put(key, cleaned_text)
+        metrics.increment("hivemind_preprocess_input_chars_total", len(text))
+        return cleaned_text
+
+    def _extract_main_content(self, text: str) -> str:
+        # extract the lemma for each remaining token
+        main_content_tokens = [
+            token.lemma_ for token in self._main_content_tokens(text)
+        ]
 
+        # Join the tokens to form the cleaned sentence
+        cleaned_text = " ".join(main_content_tokens)
+        return cleaned_text
+
+    def _main_content_tokens(self, text: str) -> list[Any]:
+        """
+        the spacy tokens of a text that are kept by the `spacy` mode
+        """
+        nlp = load_spacy_model()
         doc = nlp(text)
 
-        # Filter out punctuation, whitespace, and numerical values, then extract the lemma for each remaining token
-        main_content_tokens = [
-            token.lemma_
+        # Filter out punctuation, whitespace, and numerical values
+        return [
+            token
             for token in doc
             if not token.is_punct
             and not token.is_space
             and not token.is_stop
             and not token.like_url
             and not token.like_num
-            and token.is_ascii
+            and (token.is_ascii or not self.ascii_only)
         ]
 
-        # Join the tokens to form the cleaned sentence
-        cleaned_text = " ".join(main_content_tokens)
-        return cleaned_text
+    def _extract_main_content_fast(self, text: str) -> str:
+        text = _URL_PATTERN.sub(" ", text)
+        main_content_tokens = []
+        for token in _TOKEN_PATTERN.findall(text):
+            word = token.lower().replace("’", "'")
+            if (
+                word in _STOP_WORDS
+                or word in _NUMBER_WORDS
+                or _NUMBER_PATTERN.match(word)
+                or (self.ascii_only and not word.isascii())
+                or word.startswith("'")
+                or word.startswith("_")
+            ):
+                continue
+            main_content_tokens.append(word)
+        return " ".join(main_content_tokens)
@@ -0,0 +1,128 @@
+import threading
+import time
+from typing import Any, Callable, Hashable
+
+
+class TTLCache:
+    def __init__(
+        self,
+        ttl: float,
+        max_size: int = 1024,
+        timer: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """
+        a thread-safe in-memory cache whose entries expire after `ttl` seconds
+
+        Parameters
+        ------------
+        ttl : float
+            the time to live of each entry in seconds
+            a value of zero or less disables the cache
+        max_size : int
+            the maximum number of entries to keep
+            the entry closest to its expiry is evicted when the cache is full
+        timer : Callable[[], float]
+            the clock to use for expiry, default is `time.monotonic`
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self._timer = timer
+        self._entries: dict[Hashable, tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def get(self, key: Hashable) -> Any | None:
+        """
+        get a value from the cache
+
+        Returns
+        ---------
+        value : Any | None
+            the cached value, or `None` if it was not cached or has expired
+            a disabled cache always gives `None`, without counting a miss
+        """
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > self._timer():
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+            self.misses += 1
+            return None
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """
+        cache a value, `None` values are not cached
+        """
+        if not self.enabled or value is None:
+            return
+
+        with self._lock:
+            if key not in self._entries and len(self._entries) >= self.max_size:
+                self._evict()
+            self._entries[key] = (self._timer() + self.ttl, value)
+
+    def invalidate(self, predicate: Callable[[Hashable], bool] | None = None) -> int:
+        """
+        drop cached entries
+
+        Parameters
+        ------------
+        predicate : Callable[[Hashable], bool] | None
+            entries whose key the predicate returns True for are dropped
+            if `None`, the whole cache is dropped
+
+        Returns
+        ---------
+        removed : int
+            the number of dropped entries
+        """
+        with self._lock:
+            if predicate is None:
+                removed = len(self._entries)
+                self._entries.clear()
+                return removed
+
+            keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+
+    def stats(self) -> dict[str, float]:
+        """
+        the cache usage statistics
+
+        Returns
+        ---------
+        stats : dict[str, float]
+            `hits`, `misses`, `hit_rate` and `size` of the cache
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._entries),
+            }
+
+    def _evict(self) -> None:
+        now = self._timer()
+        expired = [key for key, (expires, _) in self._entries.items() if expires <= now]
+        for key in expired:
+            del self._entries[key]
+
+        if len(self._entries) >= self.max_size:
+            oldest = min(self._entries, key=lambda key: self._entries[key][0])
+            del self._entries[oldest]
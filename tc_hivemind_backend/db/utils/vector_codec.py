@@ -0,0 +1,156 @@
+import json
+import struct
+from typing import Any
+
+import numpy as np
+
+# a NUL byte can never start a JSON document, so packed values are told apart
+# from the plain JSON values written before
+PACKED_MAGIC = b"\x00HV1"
+# int8/uint8 are for the compact embedding types of cohere
+VECTOR_DTYPES = {"float32": b"f", "float16": b"e", "int8": b"b", "uint8": b"B"}
+EMBEDDING_KEY = "embedding"
+# an ingestion cache entry holds the node payloads under `nodes`, a node
+# payload (see `llama_index.core.storage.docstore.utils.doc_to_json`) holds the
+# node's dict under `__data__`
+NODES_KEY = "nodes"
+DATA_KEY = "__data__"
+_MARKER_KEY = "__vector__"
+_HEADER = struct.Struct("<4scI")
+
+
+def pack_vector(vector: list[float] | np.ndarray, dtype: str = "float32") -> bytes:
+    """
+    pack a single vector into raw little-endian bytes
+    """
+    return np.asarray(vector, dtype=_numpy_dtype(dtype)).tobytes()
+
+
+def unpack_vector(data: bytes | memoryview, dtype: str = "float32") -> np.ndarray:
+    """
+    unpack a vector packed by `pack_vector`
+
+    Note: the returned array is a read-only view over `data` (no copy is made)
+    """
+    return np.frombuffer(data, dtype=_numpy_dtype(dtype))
+
+
+def encode_value(value: Any, dtype: str = "float32") -> bytes:
+    """
+    serialize a JSON-compatible value, storing the embeddings of its nodes as
+    packed floats instead of JSON text
+
+    only the top-level `embedding` of a node dict, a node payload or the node
+    payloads of an ingestion cache entry is packed, and only if it's a list of
+    numbers. Anything else (i.e. an `embedding` key in the node metadata) is
+    kept as JSON
+
+    Parameters
+    ------------
+    value : Any
+        the value to serialize, i.e. an ingestion cache entry
+    dtype : str
+        the type to pack the vectors with, one of `VECTOR_DTYPES`
+
+    Returns
+    ---------
+    data : bytes
+        the header, the JSON body with placeholders and the packed vectors
+    """
+    vectors: list[list[float]] = []
+    body = json.dumps(_extract_vectors(value, vectors)).encode()
+
+    packed = b""
+    if vectors:
+        packed = np.concatenate(
+            [np.asarray(vector, dtype=_numpy_dtype(dtype)) for vector in vectors]
+        ).tobytes()
+
+    header = _HEADER.pack(PACKED_MAGIC, VECTOR_DTYPES[dtype], len(body))
+    return header + body + packed
+
+
+def decode_value(data: str | bytes) -> Any:
+    """
+    deserialize a value written by `encode_value` or a plain JSON value
+    """
+    if isinstance(data, str) or not data.startswith(PACKED_MAGIC):
+        return json.loads(data)
+
+    _, dtype_code, body_length = _HEADER.unpack_from(data)
+    dtype = next(name for name, code in VECTOR_DTYPES.items() if code == dtype_code)
+    body_start = _HEADER.size
+    vectors_start = body_start + body_length
+
+    body = json.loads(data[body_start:vectors_start])
+    buffer = np.frombuffer(data, dtype=_numpy_dtype(dtype), offset=vectors_start)
+    return _restore_vectors(body, buffer)
+
+
+def is_packed(data: str | bytes) -> bool:
+    return isinstance(data, bytes) and data.startswith(PACKED_MAGIC)
+
+
+def _numpy_dtype(dtype: str) -> np.dtype:
+    if dtype not in VECTOR_DTYPES:
+        raise ValueError(
+            f"Unsupported vector dtype: {dtype}! "
+            f"supported ones are {list(VECTOR_DTYPES.keys())}"
+        )
+    return np.dtype(dtype).newbyteorder("<")
+
+
+def _extract_vectors(value: Any, vectors: list[list[float]]) -> Any:
+    if isinstance(value, dict) and isinstance(value.get(NODES_KEY), list):
+        return {
+            **value,
+            NODES_KEY: [_extract_vector(node, vectors) for node in value[NODES_KEY]],
+        }
+    return _extract_vector(value, vectors)
+
+
+def _extract_vector(node: Any, vectors: list[list[float]]) -> Any:
+    if not isinstance(node, dict):
+        return node
+    if isinstance(node.get(DATA_KEY), dict):
+        return {**node, DATA_KEY: _extract_vector(node[DATA_KEY], vectors)}
+
+    embedding = node.get(EMBEDDING_KEY)
+    if not _is_vector(embedding):
+        return node
+    offset = sum(len(vector) for vector in vectors)
+    vectors.append(embedding)
+    return {**node, EMBEDDING_KEY: {_MARKER_KEY: [offset, len(embedding)]}}
+
+
+def _is_vector(value: Any) -> bool:
+    return (
+        isinstance(value, list)
+        and len(value) > 0
+        and all(
+            isinstance(item, (float, int)) and not isinstance(item, bool)
+            for item in value
+        )
+    )
+
+
+def _restore_vectors(value: Any, buffer: np.ndarray) -> Any:
+    if isinstance(value, dict) and isinstance(value.get(NODES_KEY), list):
+        return {
+            **value,
+            NODES_KEY: [_restore_vector(node, buffer) for node in value[NODES_KEY]],
+        }
+    return _restore_vector(value, buffer)
+
+
+def _restore_vector(node: Any, buffer: np.ndarray) -> Any:
+    if not isinstance(node, dict):
+        return node
+    if isinstance(node.get(DATA_KEY), dict):
+        return {**node, DATA_KEY: _restore_vector(node[DATA_KEY], buffer)}
+
+    embedding = node.get(EMBEDDING_KEY)
+    if not (isinstance(embedding, dict) and list(embedding) == [_MARKER_KEY]):
+        return node
+    offset, length = embedding[_MARKER_KEY]
+    return {**node, EMBEDDING_KEY: buffer[offset : offset + length].tolist()}
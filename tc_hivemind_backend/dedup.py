@@ -0,0 +1,346 @@
+import hashlib
+import logging
+import re
+
+import numpy as np
+import redis
+from llama_index.core.schema import BaseNode, MetadataMode
+from tc_hivemind_backend import metrics
+from tc_hivemind_backend.db.checkpoint import CHECKPOINT_TTL
+
+# the mersenne prime 2^61 - 1 and the 32 bit range of the hashes
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+def optimal_bands(threshold: float, num_perm: int) -> tuple[int, int]:
+    """
+    the number of LSH bands and rows per band for a jaccard similarity threshold
+
+    the one minimizing the sum of the probabilities of a false positive (a
+    pair under the threshold sharing a bucket) and of a false negative (a
+    pair over it sharing none), integrated over the similarities
+
+    Returns
+    ---------
+    bands : int
+        the number of bands
+    rows : int
+        the number of signature values per band
+    """
+    similarities = np.linspace(0, 1, 201)
+    step = similarities[1]
+    below = similarities < threshold
+
+    best: tuple[float, int, int] | None = None
+    for bands in range(1, num_perm + 1):
+        for rows in range(1, num_perm // bands + 1):
+            # the probability of two documents sharing at least one bucket
+            collision = 1 - (1 - similarities**rows) ** bands
+            error = collision[below].sum() * step + (1 - collision[~below]).sum() * step
+            if best is None or error < best[0]:
+                best = (error, bands, rows)
+    return best[1], best[2]  # type: ignore
+
+
+class MinHashDeduplicator:
+    def __init__(
+        self,
+        threshold: float = 0.9,
+        num_perm: int = 128,
+        shingle_size: int = 3,
+        redis_client: redis.Redis | None = None,
+        index_name: str | None = None,
+        seed: int = 1,
+        ttl: int | None = CHECKPOINT_TTL,
+    ) -> None:
+        """
+        drop the documents that are near-duplicates of another document
+
+        each document text gets a MinHash signature over its word shingles, and
+        is indexed in LSH buckets (bands of the signature). A document sharing
+        a bucket with a kept document whose estimated jaccard similarity is at
+        least `threshold` is dropped. With a redis client, the index is kept in
+        redis so the next runs also drop the duplicates of the documents kept
+        by the previous ones. Otherwise it lives as long as the instance.
+        Like the ingestion checkpoints, the redis keys expire `ttl` seconds
+        after the last run using them, each run extending the buckets of its
+        documents and the signatures.
+
+        Parameters
+        ------------
+        threshold : float
+            the jaccard similarity of the word shingles, from which two
+            documents are near-duplicates
+        num_perm : int
+            the number of hash functions of the signatures
+        shingle_size : int
+            the number of consecutive words of a shingle
+        redis_client : redis.Redis | None
+            a client returning raw bytes (see `RedisSingleton.get_binary_client`)
+            to persist the index with. default is an in-memory index
+        index_name : str | None
+            the prefix of the redis keys of the index
+            i.e. `{community_id}_{platform}_minhash`
+            required if `redis_client` is given
+        seed : int
+            the seed of the hash functions, an index should always be used
+            with the same `num_perm`, `shingle_size` and `seed`
+        ttl : int | None
+            the seconds to keep the redis keys of the index after their last
+            use, default is a week. `None` keeps them until `clear` is called
+        """
+        if not 0 < threshold <= 1:
+            raise ValueError("threshold should be in the (0, 1] range!")
+        if redis_client is not None and not index_name:
+            raise ValueError("index_name is required to persist the index in redis!")
+
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.redis_client = redis_client
+        self.index_name = index_name
+        self.ttl = ttl
+        self.bands, self.rows = optimal_bands(threshold, num_perm)
+
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, _MERSENNE_PRIME, num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _MERSENNE_PRIME, num_perm, dtype=np.uint64)
+
+        # the in-memory index, bucket key -> document ids and id -> signature
+        self._buckets: dict[str, set[str]] = {}
+        self._signatures: dict[str, np.ndarray] = {}
+
+    def signature(self, text: str) -> np.ndarray:
+        """
+        the MinHash signature of a text, `num_perm` uint32 values
+        """
+        words = _WORD_PATTERN.findall(text.lower())
+        size = min(self.shingle_size, len(words)) or 1
+        shingles = {
+            " ".join(words[idx : idx + size])
+            for idx in range(max(len(words) - size + 1, 1))
+        }
+        hashes = np.array(
+            [
+                int.from_bytes(
+                    hashlib.blake2b(shingle.encode(), digest_size=4).digest(),
+                    "little",
+                )
+                for shingle in shingles
+            ],
+            dtype=np.uint64,
+        )
+        # the universal hashes of all shingles, for each of the hash functions
+        # the uint64 products wrap around, as they do in datasketch
+        permuted = (np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=0).astype(np.uint32)
+
+    def bucket_keys(self, signature: np.ndarray) -> list[str]:
+        """
+        the LSH bucket of each band of a signature
+        """
+        return [
+            f"{band}:"
+            + hashlib.blake2b(
+                signature[band * self.rows : (band + 1) * self.rows].tobytes(),
+                digest_size=8,
+            ).hexdigest()
+            for band in range(self.bands)
+        ]
+
+    def deduplicate(self, documents: list[BaseNode]) -> list[BaseNode]:
+        """
+        drop the near-duplicates among the documents and of the indexed ones
+
+        the first document of a group of near-duplicates is kept, and indexed
+        for the next calls. A document is never a duplicate of the indexed
+        document with the same id (i.e. a changed document ingested again),
+        which is replaced in the index.
+
+        Parameters
+        ------------
+        documents : list[BaseNode]
+            the documents to deduplicate, compared by their text only
+
+        Returns
+        ---------
+        kept : list[BaseNode]
+            the documents that are not near-duplicates, in their input order
+        """
+        signatures = [
+            self.signature(doc.get_content(metadata_mode=MetadataMode.NONE))
+            for doc in documents
+        ]
+        keys = [self.bucket_keys(signature) for signature in signatures]
+
+        indexed_buckets = self._get_buckets(
+            {key for doc_keys in keys for key in doc_keys}
+        )
+        indexed_signatures = self._get_signatures(
+            {doc_id for ids in indexed_buckets.values() for doc_id in ids}
+        )
+
+        kept: list[BaseNode] = []
+        # the documents kept in this call, not indexed yet
+        buckets: dict[str, set[str]] = {}
+        kept_signatures: dict[str, np.ndarray] = {}
+        for doc, signature, doc_keys in zip(documents, signatures, keys):
+            candidates = set()
+            for key in doc_keys:
+                candidates |= indexed_buckets.get(key, set())
+                candidates |= buckets.get(key, set())
+            candidates.discard(doc.doc_id)
+
+            duplicate_of = next(
+                (
+                    candidate
+                    for candidate in candidates
+                    if self._similarity(
+                        signature,
+                        kept_signatures.get(
+                            candidate, indexed_signatures.get(candidate)
+                        ),
+                    )
+                    >= self.threshold
+                ),
+                None,
+            )
+            if duplicate_of is not None:
+                logging.debug(
+                    f"Document {doc.doc_id} is a near-duplicate of {duplicate_of}!"
+                )
+                continue
+
+            kept.append(doc)
+            kept_signatures[doc.doc_id] = signature
+            for key in doc_keys:
+                buckets.setdefault(key, set()).add(doc.doc_id)
+
+        self._index(buckets, kept_signatures)
+        self._expire({key for doc_keys in keys for key in doc_keys})
+
+        dropped = len(documents) - len(kept)
+        if dropped:
+            logging.info(f"{dropped} near-duplicate documents were dropped!")
+        metrics.increment("hivemind_dedup_documents_dropped_total", dropped)
+        return kept
+
+    def remove(self, doc_ids: list[str] | set[str]) -> None:
+        """
+        remove documents from the index, i.e. the ones deleted from the vector
+        store, so they're no longer kept as the originals of near-duplicates
+
+        Parameters
+        ------------
+        doc_ids : list[str] | set[str]
+            the ids of the documents, the ones not indexed are ignored
+        """
+        signatures = self._get_signatures(set(doc_ids))
+        if not signatures:
+            return
+
+        if self.redis_client is None:
+            for doc_id, signature in signatures.items():
+                for key in self.bucket_keys(signature):
+                    bucket = self._buckets.get(key)
+                    if bucket is None:
+                        continue
+                    bucket.discard(doc_id)
+                    if not bucket:
+                        del self._buckets[key]
+                del self._signatures[doc_id]
+            return
+
+        with self.redis_client.pipeline(transaction=False) as pipe:
+            for doc_id, signature in signatures.items():
+                for key in self.bucket_keys(signature):
+                    pipe.srem(f"{self.index_name}:bucket:{key}", doc_id)
+            pipe.hdel(f"{self.index_name}:signatures", *signatures)
+            pipe.execute()
+
+    def clear(self) -> None:
+        """
+        remove all documents from the index
+        """
+        self._buckets.clear()
+        self._signatures.clear()
+        if self.redis_client is not None:
+            keys = list(self.redis_client.scan_iter(match=f"{self.index_name}:*"))
+            if keys:
+                self.redis_client.delete(*keys)
+
+    def _expire(self, keys: set[str]) -> None:
+        # extending the ttl of the buckets of the documents and the signatures
+        if self.redis_client is None or self.ttl is None:
+            return
+        with self.redis_client.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.expire(f"{self.index_name}:bucket:{key}", self.ttl)
+            pipe.expire(f"{self.index_name}:signatures", self.ttl)
+            pipe.execute()
+
+    def _similarity(self, signature: np.ndarray, other: np.ndarray | None) -> float:
+        # the estimated jaccard similarity, the share of equal signature values
+        if other is None:
+            return 0.0
+        return float(np.mean(signature == other))
+
+    def _get_buckets(self, keys: set[str]) -> dict[str, set[str]]:
+        if self.redis_client is None:
+            return {key: self._buckets[key] for key in keys if key in self._buckets}
+
+        keys_list = list(keys)
+        with self.redis_client.pipeline(transaction=False) as pipe:
+            for key in keys_list:
+                pipe.smembers(f"{self.index_name}:bucket:{key}")
+            members = pipe.execute()
+        return {
+            key: {doc_id.decode() for doc_id in ids}
+            for key, ids in zip(keys_list, members)
+            if ids
+        }
+
+    def _get_signatures(self, doc_ids: set[str]) -> dict[str, np.ndarray]:
+        if self.redis_client is None:
+            return {
+                doc_id: self._signatures[doc_id]
+                for doc_id in doc_ids
+                if doc_id in self._signatures
+            }
+        if not doc_ids:
+            return {}
+
+        ids_list = list(doc_ids)
+        values = self.redis_client.hmget(f"{self.index_name}:signatures", ids_list)
+        return {
+            doc_id: np.frombuffer(value, dtype="<u4")
+            for doc_id, value in zip(ids_list, values)
+            if value is not None
+        }
+
+    def _index(
+        self, buckets: dict[str, set[str]], signatures: dict[str, np.ndarray]
+    ) -> None:
+        # the buckets of the previous text of documents indexed again
+        self.remove(signatures.keys())
+        if self.redis_client is None:
+            for key, doc_ids in buckets.items():
+                self._buckets.setdefault(key, set()).update(doc_ids)
+            self._signatures.update(signatures)
+            return
+        if not signatures:
+            return
+
+        with self.redis_client.pipeline(transaction=False) as pipe:
+            for key, doc_ids in buckets.items():
+                pipe.sadd(f"{self.index_name}:bucket:{key}", *doc_ids)
+            pipe.hset(
+                f"{self.index_name}:signatures",
+                mapping={
+                    doc_id: signature.astype("<u4").tobytes()
+                    for doc_id, signature in signatures.items()
+                },
+            )
+            pipe.execute()
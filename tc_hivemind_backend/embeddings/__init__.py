@@ -1,2 +1,3 @@
 # flake8: noqa
 from .cohere import CohereEmbedding
+from .adaptive_batcher import AdaptiveBatcher, EmbeddingError
@@ -0,0 +1,258 @@
+import logging
+import random
+import threading
+import time
+from typing import Callable
+
+from cohere.error import CohereAPIError, CohereError
+from tc_hivemind_backend import metrics
+
+# the maximum number of texts cohere accepts in one embed request
+COHERE_MAX_BATCH_SIZE = 96
+
+EmbedFunction = Callable[[list[str], str | None], list[list[float]]]
+
+
+class EmbeddingError(Exception):
+    def __init__(self, failed: list[int], embeddings: list[list[float] | None]) -> None:
+        """
+        raised when some texts could not be embedded, even when truncated
+
+        Parameters
+        ------------
+        failed : list[int]
+            the indices of the texts that could not be embedded
+        embeddings : list[list[float] | None]
+            the embeddings of all texts, `None` for the failed ones
+        """
+        super().__init__(f"{len(failed)} texts could not be embedded!")
+        self.failed = failed
+        self.embeddings = embeddings
+
+
+def is_retryable(exp: Exception) -> bool:
+    """
+    whether an embedding error is transient, i.e. rate limits, server errors,
+    timeouts and connection errors
+
+    Other API errors (i.e. 400 for an invalid input) are caused by the texts
+    themselves and are not retried as is.
+    """
+    if isinstance(exp, CohereAPIError):
+        status = exp.http_status
+        return status is None or status in (408, 429) or status >= 500
+    # connection errors and timeouts are raised as `CohereConnectionError`
+    # or a plain `CohereError` by the cohere client
+    return isinstance(exp, (CohereError, TimeoutError, ConnectionError))
+
+
+def is_input_error(exp: Exception) -> bool:
+    """
+    whether an embedding error is caused by the texts themselves, i.e. 400 or
+    422 for an invalid or too long input. Only those are bisected to find the
+    failing texts, any other error is raised as is
+    """
+    return isinstance(exp, CohereAPIError) and exp.http_status in (400, 422)
+
+
+class AdaptiveBatcher:
+    def __init__(
+        self,
+        initial_batch_size: int = 32,
+        min_batch_size: int = 1,
+        max_batch_size: int = COHERE_MAX_BATCH_SIZE,
+        target_latency: float = 10.0,
+        grow_step: int = 8,
+        max_retries: int = 6,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        """
+        send embedding requests in batches whose size adapts to the service
+
+        the batch size grows by `grow_step` after every request answered within
+        `target_latency` seconds, and is halved on a slow request or a
+        transient error (see `is_retryable`). Transient errors are retried
+        with a jittered exponential backoff. A batch failing for its input
+        (see `is_input_error`) is bisected until the failing texts are
+        isolated, those are retried once truncated, and an `EmbeddingError` is
+        raised if they still fail. Any other error is raised at once.
+
+        Parameters
+        ------------
+        initial_batch_size : int
+            the batch size to start with
+        min_batch_size : int
+            the smallest batch size to shrink to
+        max_batch_size : int
+            the biggest batch size to grow to
+        target_latency : float
+            the seconds a request can take while still growing the batch size
+        grow_step : int
+            the number of texts added to the batch size on a healthy request
+        max_retries : int
+            the number of retries of a transient error before raising it
+        base_delay : float
+            the seconds to wait before the first retry, doubled on each retry
+        max_delay : float
+            the maximum seconds to wait before a retry
+        sleep : Callable[[float], None]
+            the function to wait with, default is `time.sleep`
+        """
+        if not 1 <= min_batch_size <= max_batch_size:
+            raise ValueError(
+                "batch sizes should satisfy 1 <= min_batch_size <= max_batch_size!"
+            )
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.batch_size = min(max(initial_batch_size, min_batch_size), max_batch_size)
+        self.target_latency = target_latency
+        self.grow_step = grow_step
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._sleep = sleep
+        self._lock = threading.Lock()
+
+    def embed(self, texts: list[str], embed_fn: EmbedFunction) -> list[list[float]]:
+        """
+        embed the texts in adaptive batches
+
+        Parameters
+        ------------
+        texts : list[str]
+            the texts to embed
+        embed_fn : Callable[[list[str], str | None], list[list[float]]]
+            sends one embed request for the given texts and truncation mode
+
+        Returns
+        ---------
+        embeddings : list[list[float]]
+            the embeddings in the order of `texts`
+
+        Raises
+        --------
+        EmbeddingError
+            if some texts could not be embedded, after all others were
+        """
+        embeddings: list[list[float] | None] = [None] * len(texts)
+        failed: list[int] = []
+
+        start = 0
+        while start < len(texts):
+            size = self.batch_size
+            indices = list(range(start, min(start + size, len(texts))))
+            done = self._embed_batch(texts, indices, embed_fn, embeddings, failed)
+            start += done
+
+        if failed:
+            raise EmbeddingError(sorted(failed), embeddings)
+        return embeddings  # type: ignore
+
+    def _embed_batch(
+        self,
+        texts: list[str],
+        indices: list[int],
+        embed_fn: EmbedFunction,
+        embeddings: list[list[float] | None],
+        failed: list[int],
+        truncate: str | None = None,
+    ) -> int:
+        """
+        embed the texts at `indices`, bisecting on input errors
+
+        Returns
+        ---------
+        done : int
+            the number of leading `indices` that were handled, fewer than
+            all of them if the batch size shrank during the retries
+        """
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                vectors = embed_fn([texts[idx] for idx in indices], truncate)
+            except Exception as exp:
+                if is_input_error(exp):
+                    self._bisect(
+                        texts, indices, embed_fn, embeddings, failed, truncate, exp
+                    )
+                    return len(indices)
+                if not is_retryable(exp):
+                    raise
+
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+                self._shrink()
+                metrics.increment("hivemind_embedding_retries_total")
+                delay = self._backoff(attempt)
+                logging.warning(
+                    f"Embedding request failed with `{exp}`! "
+                    f"retry {attempt}/{self.max_retries} in {delay:.1f}s "
+                    f"with batch size {self.batch_size}"
+                )
+                self._sleep(delay)
+
+                # only retry as much as the shrunk batch size allows
+                if len(indices) > self.batch_size:
+                    indices = indices[: self.batch_size]
+                continue
+
+            latency = time.perf_counter() - started
+            for idx, vector in zip(indices, vectors):
+                embeddings[idx] = vector
+            if truncate is not None:
+                metrics.increment(
+                    "hivemind_embedding_truncated_texts_total", len(indices)
+                )
+            if latency > self.target_latency:
+                self._shrink()
+            else:
+                self._grow()
+            return len(indices)
+
+    def _bisect(
+        self,
+        texts: list[str],
+        indices: list[int],
+        embed_fn: EmbedFunction,
+        embeddings: list[list[float] | None],
+        failed: list[int],
+        truncate: str | None,
+        exp: Exception,
+    ) -> None:
+        if len(indices) > 1:
+            metrics.increment("hivemind_embedding_batch_splits_total")
+            middle = len(indices) // 2
+            for half in (indices[:middle], indices[middle:]):
+                done = 0
+                while done < len(half):
+                    done += self._embed_batch(
+                        texts, half[done:], embed_fn, embeddings, failed, truncate
+                    )
+            return
+
+        if truncate is None:
+            # a single text that can't be embedded as is, trying it truncated
+            self._embed_batch(texts, indices, embed_fn, embeddings, failed, "END")
+            return
+
+        logging.error(f"Text could not be embedded, even when truncated! error: {exp}")
+        metrics.increment("hivemind_embedding_failed_texts_total")
+        failed.append(indices[0])
+
+    def _backoff(self, attempt: int) -> float:
+        # full jitter, see https://aws.amazon.com/blogs/architecture/exponential-backoff-and-jitter/
+        return random.uniform(
+            0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        )
+
+    def _grow(self) -> None:
+        with self._lock:
+            self.batch_size = min(self.batch_size + self.grow_step, self.max_batch_size)
+
+    def _shrink(self) -> None:
+        with self._lock:
+            self.batch_size = max(self.batch_size // 2, self.min_batch_size)
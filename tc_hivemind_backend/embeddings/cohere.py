@@ -1,14 +1,112 @@
+import hashlib
+import logging
 import os
+import threading
+from collections import OrderedDict
+from functools import partial
+from typing import Any
 
 import cohere
+import numpy as np
 from dotenv import load_dotenv
 from llama_index.core.base.embeddings.base import BaseEmbedding
-from tc_hivemind_backend.db.utils.preprocess_text import BasePreprocessor
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.schema import BaseNode, MetadataMode
+from tc_hivemind_backend import metrics
+from tc_hivemind_backend.db.utils.preprocess_text import (
+    CLEANING_MODES,
+    BasePreprocessor,
+)
+from tc_hivemind_backend.embeddings.adaptive_batcher import (
+    COHERE_MAX_BATCH_SIZE,
+    AdaptiveBatcher,
+    EmbedFunction,
+    EmbeddingError,
+)
+
+
+# the cohere embedding types the vector stores keep as is
+# (see `tc_hivemind_backend.qdrant_vector_access.VECTOR_COMPRESSIONS`)
+EMBEDDING_TYPES = ("float", "uint8")
+# the number of embeddings remembered by text hash, to not embed a text twice
+EMBEDDING_MEMO_SIZE = 10_000
+# the total bytes of the remembered embeddings, kept as float32 arrays
+# i.e. ~8k of the 1024 dimensional `embed-multilingual-v3.0` embeddings
+EMBEDDING_MEMO_MAX_BYTES = 32 * 1024 * 1024
 
 
 class CohereEmbedding(BaseEmbedding):
-    def __init__(self):
-        super().__init__()
+    embedding_type: str = Field(
+        default="float", description="The cohere embedding type to request."
+    )
+    cleaning_mode: str = Field(
+        default="spacy", description="The `BasePreprocessor` mode to clean texts with."
+    )
+    _client: cohere.Client | None = PrivateAttr(default=None)
+    _batcher: AdaptiveBatcher = PrivateAttr()
+    _memo: OrderedDict[bytes, np.ndarray] = PrivateAttr()
+    _memo_size: int = PrivateAttr()
+    _memo_max_bytes: int = PrivateAttr()
+    _memo_bytes: int = PrivateAttr()
+    _memo_lock: threading.Lock = PrivateAttr()
+
+    def __init__(
+        self,
+        embed_batch_size: int = COHERE_MAX_BATCH_SIZE,
+        batcher: AdaptiveBatcher | None = None,
+        embedding_type: str = "float",
+        memo_size: int = EMBEDDING_MEMO_SIZE,
+        cleaning_mode: str = "spacy",
+        memo_max_bytes: int = EMBEDDING_MEMO_MAX_BYTES,
+    ):
+        """
+        the cohere `embed-multilingual-v3.0` embedding model
+
+        Parameters
+        ------------
+        embed_batch_size : int
+            the number of texts llama-index passes to one embedding call
+            each call is sent in adaptive batches (see `AdaptiveBatcher`)
+        batcher : AdaptiveBatcher | None
+            the batcher to send the requests with
+            if `None`, a default one is created for the instance
+        embedding_type : str
+            the embedding type to request, can be `float` (default) or `uint8`
+            `uint8` embeddings have one 1-byte value per dimension
+        memo_size : int
+            the number of embeddings to remember by the hash of their cleaned
+            text, so the same text is embedded once per instance (i.e. across
+            the batches of a run). the least recently used ones are forgotten
+            first. `0` disables it, identical texts of one call are still
+            embedded once
+        cleaning_mode : str
+            how the texts are cleaned before embedding them, `spacy` (default)
+            or `fast` (see `BasePreprocessor`)
+        memo_max_bytes : int
+            the total bytes of the remembered embeddings, they're kept as
+            float32 arrays. default is 32 MB
+        """
+        if embedding_type not in EMBEDDING_TYPES:
+            raise ValueError(
+                f"Unsupported embedding type: {embedding_type}! "
+                f"supported ones are {list(EMBEDDING_TYPES)}"
+            )
+        if cleaning_mode not in CLEANING_MODES:
+            raise ValueError(
+                f"Unsupported cleaning mode: {cleaning_mode}! "
+                f"supported ones are {list(CLEANING_MODES)}"
+            )
+        super().__init__(
+            embed_batch_size=embed_batch_size,
+            embedding_type=embedding_type,
+            cleaning_mode=cleaning_mode,
+        )
+        self._batcher = batcher or AdaptiveBatcher()
+        self._memo = OrderedDict()
+        self._memo_size = memo_size
+        self._memo_max_bytes = memo_max_bytes
+        self._memo_bytes = 0
+        self._memo_lock = threading.Lock()
 
     def prepare_cohere(
         self,
@@ -26,38 +124,186 @@ class CohereEmbedding(BaseEmbedding):
         load_dotenv()
         key = os.getenv("COHERE_API_KEY")
 
-        client = cohere.Client(key)
+        # retries are done by the `AdaptiveBatcher`, so rate limits are not
+        # hidden behind the client's own retries
+        client = cohere.Client(key, max_retries=0)
         return client
 
     def get_text_embedding(
         self, text: str | None = None, texts: list[str] | None = None
     ) -> list[float] | list[list[float]]:
-        co = self.prepare_cohere()
-        processor = BasePreprocessor()
+        co = self._get_client()
+        processor = BasePreprocessor(mode=self.cleaning_mode)
+        embed_fn = partial(self._embed, co)
 
         if text is not None:
             cleaned_text = self._clean_text(text, processor)
-            response = co.embed(
-                texts=[cleaned_text],
-                model="embed-multilingual-v3.0",
-                input_type="classification",
-                truncate=None,
-            )
-            # checking the output to be right
-            assert len(response.embeddings) == 1
-
-            return response.embeddings[0]
+            return self._embed_unique([cleaned_text], embed_fn)[0]
         elif texts is not None:
             cleaned_texts = [self._clean_text(text, processor) for text in texts]
+            return self._embed_unique(cleaned_texts, embed_fn)
+        else:
+            raise ValueError("Both inputs cannot be None")
+
+    def clear_memo(self) -> None:
+        """
+        forget the embeddings remembered by text hash
+        """
+        with self._memo_lock:
+            self._memo.clear()
+            self._memo_bytes = 0
+
+    def _embed_unique(
+        self, texts: list[str], embed_fn: EmbedFunction
+    ) -> list[list[float]]:
+        """
+        embed each distinct text once, giving the copies the same embedding
+
+        the texts embedded by the previous calls are taken from the memo
+        """
+        keys = [
+            hashlib.blake2b(text.encode(), digest_size=16).digest() for text in texts
+        ]
+        embeddings: dict[bytes, list[float] | np.ndarray] = {}
+        to_embed: dict[bytes, str] = {}
+        with self._memo_lock:
+            for key, text in zip(keys, texts):
+                if key in embeddings or key in to_embed:
+                    continue
+                if key in self._memo:
+                    self._memo.move_to_end(key)
+                    embeddings[key] = self._memo[key]
+                else:
+                    to_embed[key] = text
+
+        failed = False
+        if to_embed:
+            try:
+                vectors = self._batcher.embed(list(to_embed.values()), embed_fn)
+            except EmbeddingError as exp:
+                # keeping the embedded texts for the retry of the failed ones
+                vectors = exp.embeddings
+                failed = True
+            embedded = {
+                key: vector
+                for key, vector in zip(to_embed.keys(), vectors)
+                if vector is not None
+            }
+            embeddings.update(embedded)
+            self._remember(list(embedded.keys()), embedded)
+
+        metrics.increment(
+            "hivemind_embedding_deduplicated_texts_total", len(texts) - len(to_embed)
+        )
+        # a copy for each text, so the nodes don't share one list
+        results = [_as_list(embeddings.get(key)) for key in keys]
+        if failed:
+            raise EmbeddingError(
+                [idx for idx, vector in enumerate(results) if vector is None], results
+            )
+        return results  # type: ignore
+
+    def _remember(
+        self, keys: list[bytes], embeddings: dict[bytes, list[float]]
+    ) -> None:
+        if self._memo_size <= 0 or self._memo_max_bytes <= 0:
+            return
+        vectors = {key: np.asarray(embeddings[key], dtype=np.float32) for key in keys}
+        with self._memo_lock:
+            for key, vector in vectors.items():
+                previous = self._memo.pop(key, None)
+                if previous is not None:
+                    self._memo_bytes -= previous.nbytes
+                self._memo[key] = vector
+                self._memo_bytes += vector.nbytes
+            while self._memo and (
+                len(self._memo) > self._memo_size
+                or self._memo_bytes > self._memo_max_bytes
+            ):
+                _, forgotten = self._memo.popitem(last=False)
+                self._memo_bytes -= forgotten.nbytes
+
+    def __call__(self, nodes: list[BaseNode], **kwargs: Any) -> list[BaseNode]:
+        """
+        embed the nodes, dropping the ones whose text can't be embedded even
+        when truncated, instead of failing the whole batch
+
+        the dropped nodes are logged and counted by the
+        `hivemind_embedding_dropped_nodes_total` metric. Their documents are
+        ingested again once they change
+        """
+        texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
+        embedded: list[BaseNode] = []
+        dropped: list[BaseNode] = []
+        for start in range(0, len(nodes), self.embed_batch_size):
+            batch = nodes[start : start + self.embed_batch_size]
+            try:
+                embeddings = self.get_text_embedding(
+                    texts=texts[start : start + self.embed_batch_size]
+                )
+            except EmbeddingError as exp:
+                embeddings = exp.embeddings
+            for node, embedding in zip(batch, embeddings):
+                if embedding is None:
+                    dropped.append(node)
+                else:
+                    node.embedding = embedding
+                    embedded.append(node)
+
+        if dropped:
+            logging.error(
+                f"{len(dropped)} nodes could not be embedded and were dropped! "
+                f"node ids: {[node.node_id for node in dropped]}, "
+                f"document ids: {sorted({str(node.ref_doc_id) for node in dropped})}"
+            )
+            metrics.increment("hivemind_embedding_dropped_nodes_total", len(dropped))
+        return embedded
+
+    def _get_client(self) -> cohere.Client:
+        """
+        get the cohere client, created once per instance
+        """
+        if self._client is None:
+            self._client = self.prepare_cohere()
+        return self._client
+
+    def _embed(
+        self, co: cohere.Client, texts: list[str], truncate: str | None = None
+    ) -> list[list[float]]:
+        """
+        send one embed request, recording its latency, batch size and tokens
+        """
+        metrics.observe("hivemind_embedding_batch_size", len(texts))
+        kwargs = {}
+        # float embeddings are the default, `embedding_types` needs cohere>=4.42
+        if self.embedding_type != "float":
+            kwargs["embedding_types"] = [self.embedding_type]
+
+        with metrics.timer("hivemind_embedding_request"):
             response = co.embed(
-                texts=cleaned_texts,
+                texts=texts,
                 model="embed-multilingual-v3.0",
                 input_type="classification",
-                truncate=None,
+                truncate=truncate,
+                **kwargs,
             )
-            return response.embeddings
-        else:
-            raise ValueError("Both inputs cannot be None")
+
+        embeddings = response.embeddings
+        if self.embedding_type != "float":
+            embeddings = getattr(embeddings, self.embedding_type)
+
+        # checking the output to be right
+        if len(embeddings) != len(texts):
+            raise ValueError(
+                f"{len(embeddings)} embeddings were returned for {len(texts)} texts!"
+            )
+
+        billed_units = (getattr(response, "meta", None) or {}).get("billed_units", {})
+        metrics.increment("hivemind_embedding_texts_total", len(texts))
+        metrics.increment(
+            "hivemind_embedding_tokens_total", billed_units.get("input_tokens", 0)
+        )
+        return embeddings
 
     def _get_text_embeddings(self, texts: list[str]) -> list[list[float]]:
         """Get text embeddings.
@@ -97,3 +343,11 @@ class CohereEmbedding(BaseEmbedding):
         """
         cleaned_text = processor.extract_main_content(text)
         return cleaned_text
+
+
+def _as_list(vector: list[float] | np.ndarray | None) -> list[float] | None:
+    if vector is None:
+        return None
+    if isinstance(vector, np.ndarray):
+        return vector.tolist()
+    return list(vector)
@@ -3,24 +3,89 @@ from datetime import datetime
 
 from dateutil.parser import parse
 from llama_index.core import Document, MockEmbedding
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import PrivateAttr
 from llama_index.core.ingestion import (
     DocstoreStrategy,
     IngestionCache,
     IngestionPipeline,
 )
-from llama_index.core.node_parser import SemanticSplitterNodeParser
 from llama_index.core.schema import BaseNode
+from llama_index.core.storage.docstore.keyval_docstore import (
+    DEFAULT_COLLECTION_DATA_SUFFIX,
+    DEFAULT_METADATA_COLLECTION_SUFFIX,
+)
 from llama_index.storage.docstore.mongodb import MongoDocumentStore
-from tc_hivemind_backend.db.redis_kv_store import CustomRedisKVStore
+from llama_index.storage.kvstore.mongodb import MongoDBKVStore
+from llama_index.vector_stores.qdrant import QdrantVectorStore
 from qdrant_client.conversions import common_types as qdrant_types
 from qdrant_client.http import models
+from tc_hivemind_backend import metrics
+from tc_hivemind_backend.db.checkpoint import IngestionCheckpoint
 from tc_hivemind_backend.db.credentials import Credentials
-from tc_hivemind_backend.db.mongo import get_mongo_uri
+from tc_hivemind_backend.db.metered_kv_store import MeteredKVStore
+from tc_hivemind_backend.db.mongo import MongoSingleton
 from tc_hivemind_backend.db.qdrant import QdrantSingleton
 from tc_hivemind_backend.db.redis import RedisSingleton
+from tc_hivemind_backend.db.redis_kv_store import PackedEmbeddingRedisKVStore
+from tc_hivemind_backend.db.utils.delete_data import (
+    DELETION_BATCH_SIZE,
+    delete_qdrant_documents,
+)
 from tc_hivemind_backend.db.utils.model_hyperparams import load_model_hyperparams
+from tc_hivemind_backend.dedup import MinHashDeduplicator
 from tc_hivemind_backend.embeddings.cohere import CohereEmbedding
-from tc_hivemind_backend.qdrant_vector_access import QDrantVectorAccess
+from tc_hivemind_backend.jobs.lease import Lease
+from tc_hivemind_backend.node_parsers import (
+    BatchedSemanticSplitterNodeParser,
+    RoutingNodeParser,
+)
+from tc_hivemind_backend.profiling import profile_run, profile_stage
+from tc_hivemind_backend.qdrant_vector_access import (
+    VECTOR_COMPRESSIONS,
+    QDrantVectorAccess,
+    tenant_filter,
+)
+from tc_hivemind_backend.run_report import IngestionReport, record_run
+
+
+class MeteredIngestionPipeline(IngestionPipeline):
+    """
+    an `IngestionPipeline` counting the documents skipped as unchanged
+
+    the docstore saves the hashes of the documents to run before they are
+    transformed, so on a failed run (i.e. the embedding service being down)
+    they are removed again, and the next run ingests the documents again
+    instead of skipping them as unchanged
+    """
+
+    _docs_to_run: list[str] = PrivateAttr(default_factory=list)
+
+    def run(self, *args, **kwargs) -> list[BaseNode]:
+        self._docs_to_run = []
+        try:
+            return super().run(*args, **kwargs)
+        except Exception:
+            if self.docstore is not None and self._docs_to_run:
+                logging.warning(
+                    f"{len(self._docs_to_run)} documents of the failed run are "
+                    "removed from the docstore, to be ingested again!"
+                )
+                for doc_id in self._docs_to_run:
+                    self.docstore.delete_document(doc_id, raise_error=False)
+            raise
+        finally:
+            self._docs_to_run = []
+
+    def _handle_upserts(
+        self, nodes: list[BaseNode], store_doc_text: bool = True
+    ) -> list[BaseNode]:
+        nodes_to_run = super()._handle_upserts(nodes, store_doc_text=store_doc_text)
+        self._docs_to_run.extend(node.id_ for node in nodes_to_run)
+        metrics.increment(
+            "hivemind_pipeline_documents_skipped_total", len(nodes) - len(nodes_to_run)
+        )
+        return nodes_to_run
 
 
 class CustomIngestionPipeline:
@@ -31,6 +96,17 @@ class CustomIngestionPipeline:
         testing: bool = False,
         use_cache: bool = True,
         clear_cache_after_ingestion: bool = True,
+        cache_vector_dtype: str | None = None,
+        vector_compression: str = "none",
+        multi_tenant: bool = False,
+        docstore_strategy: DocstoreStrategy = DocstoreStrategy.UPSERTS,
+        deletion_batch_size: int = DELETION_BATCH_SIZE,
+        split_threshold: int | None = None,
+        near_duplicate_threshold: float | None = None,
+        cleaning_mode: str = "spacy",
+        checkpoint: bool = False,
+        checkpoint_batch_size: int = 256,
+        embed_model: BaseEmbedding | None = None,
     ):
         """
         Custom ingestion pipeline for qdrant db.
@@ -40,91 +116,413 @@ class CustomIngestionPipeline:
         community_id : str
             the community id
         collection_name : str
-            the collection name (the final collection name will be `{community_id}_{collection_name}`)
+            the collection name (the final collection name will be `{community_id}_{collection_name}`,
+            or `{collection_name}` if `multi_tenant` is True)
         testing : bool
             if True, we're using a mock embedding model
         use_cache : bool
             if True, we're using a redis cache
         clear_cache_after_ingestion : bool
             if True, we're clearing the cache after ingestion
+        cache_vector_dtype : str | None
+            the type the cached embeddings are packed with in redis
+            can be `float32`, `float16` or `uint8` (for uint8 embeddings)
+            if `None`, `uint8` is used for uint8 embeddings and `float32` otherwise
+        vector_compression : str
+            how the vectors are stored in the collection, one of
+            `qdrant_vector_access.VECTOR_COMPRESSIONS`. default is `none`
+            it only applies to collections created by this pipeline
+        multi_tenant : bool
+            if True, the data is ingested into the collection `{collection_name}`
+            shared by all communities, scoped by a `community_id` payload field
+            (see `qdrant_vector_access.create_collection`). default is False
+        docstore_strategy : DocstoreStrategy
+            `UPSERTS` (default) only adds new and changed documents
+            `UPSERTS_AND_DELETE` also treats the documents given to each run as
+            the whole current set: the documents in the docstore that are not
+            among them are deleted from the docstore and the collection
+            (see `delete_stale_documents`)
+        deletion_batch_size : int
+            the number of stale documents to delete at a time
+        split_threshold : int | None
+            the documents having at most this number of tokens are ingested as
+            one node, only the longer ones are semantically split
+            (see `RoutingNodeParser`). `0` splits all documents
+            if `None`, the `CHUNK_SIZE` env variable is used
+        near_duplicate_threshold : float | None
+            if given, the documents whose text has at least this (estimated)
+            jaccard similarity with another document of the run or of a
+            previous run are not ingested (see `MinHashDeduplicator`)
+            the index of the ingested documents is kept in redis
+            default is `None`, meaning no deduplication
+        cleaning_mode : str
+            how the texts are cleaned before embedding them, `spacy` (default)
+            or the faster `fast` (see `BasePreprocessor`)
+        checkpoint : bool
+            if True, `run_pipeline` ingests the documents in batches and keeps
+            its progress in redis (see `IngestionCheckpoint`), so a run
+            restarted after a crash re-ingests the documents of the batch that
+            was interrupted. The finished batches are skipped as unchanged
+            documents. default is False
+        checkpoint_batch_size : int
+            the number of documents per batch when checkpointing
+        embed_model : BaseEmbedding | None
+            the embedding model to use, i.e. one shared by the pipelines of a
+            long-running worker. it should return the embeddings matching the
+            `vector_compression`, `testing` and `cleaning_mode` are ignored
+            default is a new model for the pipeline
         """
+        if docstore_strategy not in (
+            DocstoreStrategy.UPSERTS,
+            DocstoreStrategy.UPSERTS_AND_DELETE,
+        ):
+            raise ValueError(f"Unsupported docstore strategy: {docstore_strategy}!")
+        self.docstore_strategy = docstore_strategy
+        self.deletion_batch_size = deletion_batch_size
+
         self.community_id = community_id
         self.qdrant_client = QdrantSingleton.get_instance().client
 
         credentials = Credentials()
-        _, self.embedding_dim = load_model_hyperparams()
+        chunk_size, self.embedding_dim = load_model_hyperparams()
+        self.split_threshold = (
+            chunk_size if split_threshold is None else split_threshold
+        )
         self.pg_creds = credentials.load_postgres()
-        self.collection_name = f"{community_id}_{collection_name}"
+        self.multi_tenant = multi_tenant
+        self.collection_name = (
+            collection_name if multi_tenant else f"{community_id}_{collection_name}"
+        )
         self.platform_name = collection_name
 
-        self.embed_model = (
-            CohereEmbedding()
-            if not testing
-            else MockEmbedding(embed_dim=self.embedding_dim)
-        )
+        if vector_compression not in VECTOR_COMPRESSIONS:
+            raise ValueError(f"Unsupported vector compression: {vector_compression}!")
+        self.vector_compression = vector_compression
+        embedding_type = VECTOR_COMPRESSIONS[vector_compression]
+        if embed_model is not None:
+            self.embed_model = embed_model
+        elif testing:
+            self.embed_model = MockEmbedding(embed_dim=self.embedding_dim)
+        else:
+            self.embed_model = CohereEmbedding(
+                embedding_type=embedding_type, cleaning_mode=cleaning_mode
+            )
         if use_cache:
-            self.redis_client = RedisSingleton.get_instance().get_client()
+            self.redis_client = RedisSingleton.get_instance().get_binary_client()
         else:
             self.redis_client = None
 
         self.clear_cache_after_ingestion = clear_cache_after_ingestion
+        if cache_vector_dtype is None:
+            cache_vector_dtype = "uint8" if embedding_type == "uint8" else "float32"
+        self.cache_vector_dtype = cache_vector_dtype
+
+        self.deduplicator: MinHashDeduplicator | None = None
+        if near_duplicate_threshold is not None:
+            self.deduplicator = MinHashDeduplicator(
+                threshold=near_duplicate_threshold,
+                redis_client=RedisSingleton.get_instance().get_binary_client(),
+                index_name=f"{community_id}_{self.platform_name}_minhash",
+            )
+
+        self.checkpoint: IngestionCheckpoint | None = None
+        if checkpoint:
+            self.checkpoint = IngestionCheckpoint(
+                community_id, self.platform_name, "qdrant"
+            )
+        self.checkpoint_batch_size = checkpoint_batch_size
 
-    def run_pipeline(self, docs: list[Document]) -> list[BaseNode]:
+        self._pipeline: IngestionPipeline | None = None
+        self.last_report: IngestionReport | None = None
+        self._vector_store: QdrantVectorStore | None = None
+        self._docstore: MongoDocumentStore | None = None
+        self._cache: IngestionCache | None = None
+
+    def run_pipeline(
+        self,
+        docs: list[Document],
+        profile: bool | None = None,
+        return_report: bool = False,
+        lease: Lease | None = None,
+    ) -> list[BaseNode] | tuple[list[BaseNode], IngestionReport]:
         """
         vectorize and ingest data into a qdrant collection
 
         Note: This will handle duplicate documents by doing an upsert operation.
+        The vector store, docstore and cache are created on the first call and
+        reused by the next calls until `close()` is called.
 
         Parameters
         ------------
         docs : list[llama_index.Document]
             list of llama-index documents
+        profile : bool | None
+            if True, the run is profiled (see `tc_hivemind_backend.profiling`)
+            if `None`, the `HIVEMIND_PROFILE` env variable decides
+        return_report : bool
+            if True, the run's `IngestionReport` is returned with the nodes
+            the report of the last run is always available as `last_report`
+        lease : Lease | None
+            the lease of the community's platform held by this worker
+            (see `tc_hivemind_backend.jobs`). if given, it's checked before
+            ingesting each batch, and a `LeaseLostError` is raised once it's
+            lost, so two workers don't write the same documents
 
         Returns
         ---------
         nodes : list[BaseNode]
             The set of transformed and loaded Nodes/Documents
             (transformation is chunking and embedding of data)
+        report : IngestionReport
+            the throughput and cost figures of the run
+            only returned if `return_report` is True
         """
         # qdrant is just collection based and doesn't have any database
         logging.info(
             f"{len(docs)} documents were extracted and are now loading into Qdrant DB!"
         )
-        vector_access = QDrantVectorAccess(collection_name=self.collection_name)
-        vector_store = vector_access.setup_qdrant_vector_store()
+        with (
+            metrics.metric_labels(
+                community_id=self.community_id, platform=self.platform_name
+            ),
+            profile_run(
+                f"{self.platform_name}_run_pipeline", self.community_id, profile=profile
+            ),
+            record_run(self.community_id, self.platform_name, len(docs)) as report,
+        ):
+            with profile_stage("setup"), metrics.timer("hivemind_pipeline_setup"):
+                pipeline = self._get_pipeline()
 
-        if self.redis_client:
-            cache = IngestionCache(
-                cache=CustomRedisKVStore.from_redis_client(self.redis_client),
-                collection=f"{self.collection_name}_ingestion_cache",
-                docstore_strategy=DocstoreStrategy.UPSERTS,
+            if self.checkpoint is not None:
+                # before the deduplication, which indexes the documents again
+                with profile_stage("recover"):
+                    self._recover_interrupted()
+
+            docs_to_run = docs
+            if self.deduplicator is not None:
+                with profile_stage("deduplicate"):
+                    docs_to_run = self.deduplicator.deduplicate(docs)
+
+            with profile_stage("ingest"), metrics.timer("hivemind_pipeline_run"):
+                nodes = self._run_batches(pipeline, docs_to_run, lease)
+            metrics.increment("hivemind_pipeline_documents_total", len(docs))
+            metrics.increment("hivemind_pipeline_nodes_total", len(nodes))
+
+            if self.docstore_strategy == DocstoreStrategy.UPSERTS_AND_DELETE:
+                with profile_stage("delete_stale"):
+                    self.delete_stale_documents({doc.doc_id for doc in docs})
+
+            # clear cache after ingestion
+            if self._cache and self.clear_cache_after_ingestion:
+                logging.info("Clearing cache after ingestion!")
+                with profile_stage("clear_cache"):
+                    self._cache.cache.delete_collection(self._cache.collection)
+
+            # everything is committed
+            if self.checkpoint is not None:
+                self.checkpoint.clear()
+
+        self.last_report = report
+        if return_report:
+            return nodes, report
+        return nodes
+
+    def _run_batches(
+        self,
+        pipeline: IngestionPipeline,
+        docs: list[Document],
+        lease: Lease | None = None,
+    ) -> list[BaseNode]:
+        """
+        run the pipeline on the documents, in checkpointed batches if enabled
+        """
+        if self.checkpoint is None:
+            if lease is not None:
+                lease.ensure()
+            return pipeline.run(documents=docs, show_progress=True)
+
+        nodes: list[BaseNode] = []
+        for start in range(0, len(docs), self.checkpoint_batch_size):
+            batch = docs[start : start + self.checkpoint_batch_size]
+            if lease is not None:
+                lease.ensure()
+            self.checkpoint.start_batch(batch)
+            nodes.extend(pipeline.run(documents=batch, show_progress=True))
+            self.checkpoint.finish_batch(batch)
+        return nodes
+
+    def _recover_interrupted(self) -> None:
+        """
+        remove the documents of a batch interrupted by a crash from the
+        docstore, the vector store and the deduplication index, so they're
+        ingested again
+
+        the docstore saves the document hashes before the nodes are embedded,
+        so without it the next runs would skip them as unchanged documents
+        """
+        interrupted = self.checkpoint.interrupted()
+        if not interrupted:
+            return
+
+        logging.warning(
+            f"COMMUNITYID: {self.community_id} {len(interrupted)} documents of "
+            "an interrupted run will be ingested again!"
+        )
+        for doc_id in interrupted:
+            self._docstore.delete_document(doc_id, raise_error=False)
+            self._vector_store.delete(doc_id)
+        if self.deduplicator is not None:
+            self.deduplicator.remove(interrupted)
+        self.checkpoint.clear_interrupted()
+        metrics.increment(
+            "hivemind_checkpoint_recovered_documents_total", len(interrupted)
+        )
+
+    def delete_stale_documents(self, current_doc_ids: set[str]) -> int:
+        """
+        delete the documents that are in the docstore but not in the current ones
+
+        the docstore ids are streamed from mongo, and the stale ones are deleted
+        from qdrant (a filter deletion on the indexed `ref_doc_id` payload field),
+        from the docstore and from the deduplication index,
+        `deletion_batch_size` documents at a time
+
+        Parameters
+        ------------
+        current_doc_ids : set[str]
+            the ids of all documents currently available on the platform
+
+        Returns
+        ---------
+        deleted : int
+            the number of stale documents deleted
+        """
+        msg = f"COMMUNITYID: {self.community_id} "
+        docstore_db = MongoSingleton.get_instance().get_client()[
+            f"docstore_{self.community_id}"
+        ]
+        data_collection = docstore_db[
+            f"{self.platform_name}{DEFAULT_COLLECTION_DATA_SUFFIX}"
+        ]
+        metadata_collection = docstore_db[
+            f"{self.platform_name}{DEFAULT_METADATA_COLLECTION_SUFFIX}"
+        ]
+        collection_exists = self.qdrant_client.collection_exists(self.collection_name)
+        deleted = 0
+
+        def delete_batch(doc_ids: list[str]) -> None:
+            nonlocal deleted
+            if collection_exists:
+                delete_qdrant_documents(
+                    self.qdrant_client,
+                    collection_name=self.collection_name,
+                    doc_ids=doc_ids,
+                    community_id=self.community_id if self.multi_tenant else None,
+                    batch_size=self.deletion_batch_size,
+                    id_field="ref_doc_id",
+                )
+            with metrics.timer(
+                "hivemind_kvstore_operation", backend="mongo", operation="delete_many"
+            ):
+                data_collection.delete_many({"_id": {"$in": doc_ids}})
+                metadata_collection.delete_many({"_id": {"$in": doc_ids}})
+            if self.deduplicator is not None:
+                self.deduplicator.remove(doc_ids)
+            deleted += len(doc_ids)
+            logging.info(f"{msg}{deleted} stale documents were deleted so far!")
+
+        # the documents hashes are saved for every document in the docstore
+        stale: list[str] = []
+        cursor = metadata_collection.find(
+            {}, projection={"_id": True}, batch_size=self.deletion_batch_size
+        )
+        for item in cursor:
+            if item["_id"] in current_doc_ids:
+                continue
+            stale.append(item["_id"])
+            if len(stale) >= self.deletion_batch_size:
+                delete_batch(stale)
+                stale = []
+        if stale:
+            delete_batch(stale)
+
+        metrics.increment("hivemind_pipeline_documents_deleted_total", deleted)
+        return deleted
+
+    def close(self) -> None:
+        """
+        release the vector store, docstore and cache of the pipeline
+
+        the database clients are shared singletons, so they are kept open
+        a later `run_pipeline` call would set everything up again
+        """
+        self._pipeline = None
+        self._vector_store = None
+        self._docstore = None
+        self._cache = None
+
+    def __enter__(self) -> "CustomIngestionPipeline":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _get_pipeline(self) -> IngestionPipeline:
+        """
+        get the llama-index ingestion pipeline, creating it on the first call
+        """
+        if self._pipeline is None:
+            vector_access = QDrantVectorAccess(
+                collection_name=self.collection_name,
+                embed_model=self.embed_model,
+                vector_compression=self.vector_compression,
+                community_id=self.community_id if self.multi_tenant else None,
             )
-        else:
-            cache = None
-
-        pipeline = IngestionPipeline(
-            transformations=[
-                SemanticSplitterNodeParser(embed_model=self.embed_model),
-                self.embed_model,
-            ],
-            docstore=MongoDocumentStore.from_uri(
-                uri=get_mongo_uri(),
-                db_name=f"docstore_{self.community_id}",
+            self._vector_store = vector_access.setup_qdrant_vector_store()
+
+            if self.redis_client:
+                self._cache = IngestionCache(
+                    cache=MeteredKVStore(
+                        PackedEmbeddingRedisKVStore.from_redis_client(
+                            self.redis_client, dtype=self.cache_vector_dtype
+                        ),
+                        backend="redis",
+                    ),
+                    collection=(
+                        f"{self.community_id}_{self.platform_name}_ingestion_cache"
+                    ),
+                    docstore_strategy=DocstoreStrategy.UPSERTS,
+                )
+
+            self._docstore = MongoDocumentStore(
+                mongo_kvstore=MeteredKVStore(
+                    MongoDBKVStore(
+                        mongo_client=MongoSingleton.get_instance().get_client(),
+                        db_name=f"docstore_{self.community_id}",
+                    ),
+                    backend="mongo",
+                ),
                 namespace=self.platform_name,
-            ),
-            vector_store=vector_store,
-            cache=cache,
-            docstore_strategy=DocstoreStrategy.UPSERTS,
-        )
-        logging.info("Pipeline created, now inserting documents into pipeline!")
+            )
 
-        nodes = pipeline.run(documents=docs, show_progress=True)
-        # clear cache after ingestion
-        if cache and self.clear_cache_after_ingestion:
-            logging.info("Clearing cache after ingestion!")
-            cache.clear()
+            self._pipeline = MeteredIngestionPipeline(
+                transformations=[
+                    RoutingNodeParser(
+                        splitter=BatchedSemanticSplitterNodeParser(
+                            embed_model=self.embed_model
+                        ),
+                        max_tokens=self.split_threshold,
+                    ),
+                    self.embed_model,
+                ],
+                docstore=self._docstore,
+                vector_store=self._vector_store,
+                cache=self._cache,
+                docstore_strategy=DocstoreStrategy.UPSERTS,
+            )
+            logging.info("Pipeline created, now inserting documents into pipeline!")
 
-        return nodes
+        return self._pipeline
 
     def _create_payload_index(
         self,
@@ -188,15 +586,25 @@ class CustomIngestionPipeline:
                 field_schema=field_schema,
             )
             if result.status.name == "COMPLETED":
-                latest_document = self.qdrant_client.scroll(
-                    collection_name=self.collection_name,
-                    limit=1,
-                    with_payload=True,
-                    order_by=models.OrderBy(
-                        key=field_name,
-                        direction=models.Direction.DESC,
-                    ),
-                )
+                with metrics.timer(
+                    "hivemind_vector_store_operation",
+                    backend="qdrant",
+                    operation="scroll",
+                ):
+                    latest_document = self.qdrant_client.scroll(
+                        collection_name=self.collection_name,
+                        scroll_filter=(
+                            tenant_filter(self.community_id)
+                            if self.multi_tenant
+                            else None
+                        ),
+                        limit=1,
+                        with_payload=True,
+                        order_by=models.OrderBy(
+                            key=field_name,
+                            direction=models.Direction.DESC,
+                        ),
+                    )
 
                 if not latest_document[0]:
                     logging.info("No documents found in the collection.")
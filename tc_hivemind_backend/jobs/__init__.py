@@ -0,0 +1,11 @@
+# flake8: noqa
+from .lease import LEASE_TTL, JobStopped, Lease, LeaseLostError, LeaseManager
+from .queue import IngestionJob, JobQueue, LocalJobQueue, RedisJobQueue
+from .runner import JobHandler, LeasedJobRunner
+from .scheduler import (
+    SCHEDULING_POLICIES,
+    IngestionScheduler,
+    SizeEstimator,
+    pending_documents_estimator,
+    staleness_estimator,
+)
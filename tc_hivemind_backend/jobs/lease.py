@@ -0,0 +1,271 @@
+import logging
+import os
+import socket
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+import redis
+from tc_hivemind_backend import metrics
+from tc_hivemind_backend.db.redis import RedisSingleton
+
+# the seconds a lease is held without being renewed
+LEASE_TTL = 60
+
+
+class LeaseLostError(RuntimeError):
+    """
+    raised when a lease expired or was taken by another worker
+    """
+
+
+class JobStopped(Exception):
+    """
+    raised when the worker holding a lease asked its work to stop, i.e. on
+    shutdown, so the job can be queued again and resumed by another worker
+    """
+
+
+class Lease:
+    def __init__(self, manager: "LeaseManager", name: str, token: str) -> None:
+        """
+        a lease held on a name, see `LeaseManager.acquire`
+        """
+        self.manager = manager
+        self.name = name
+        self.token = token
+        self._lost = threading.Event()
+        self._stop = threading.Event()
+
+    @property
+    def lost(self) -> bool:
+        """
+        whether a renewal found the lease expired or taken by another worker
+        """
+        return self._lost.is_set()
+
+    @property
+    def stop_requested(self) -> bool:
+        return self._stop.is_set()
+
+    def request_stop(self) -> None:
+        """
+        ask the work holding the lease to stop at its next `ensure()` call
+        """
+        self._stop.set()
+
+    def renew(self) -> bool:
+        return self.manager.renew(self)
+
+    def release(self) -> bool:
+        return self.manager.release(self)
+
+    def ensure(self) -> None:
+        """
+        raise a `LeaseLostError` if the lease is no longer held, or
+        `JobStopped` if a stop was requested
+
+        to call before a step whose results shouldn't be written by two
+        workers, i.e. before ingesting a batch of documents
+        """
+        if self.stop_requested:
+            raise JobStopped(f"Work holding the lease of {self.name} was stopped!")
+        if self.lost or not self.manager.is_held(self):
+            self._lost.set()
+            raise LeaseLostError(f"Lease of {self.name} is no longer held!")
+
+
+class LeaseManager:
+    def __init__(
+        self,
+        redis_client: redis.Redis | None = None,
+        ttl: float = LEASE_TTL,
+        key_prefix: str = "hivemind_lease",
+        owner: str | None = None,
+    ) -> None:
+        """
+        exclusive leases on names (i.e. `{community_id}_{platform}`) in redis
+
+        a lease is a redis key holding a random token of its holder, set only
+        if it doesn't exist and expiring after `ttl` seconds. The holder
+        renews it while working, and releases it when done. So a worker that
+        crashed doesn't block the others for more than `ttl` seconds. Renewals
+        and releases only apply if the key still holds the lease's token.
+
+        Parameters
+        ------------
+        redis_client : redis.Redis | None
+            the client to keep the leases with
+            default is the `RedisSingleton` client
+        ttl : float
+            the seconds a lease is held without being renewed
+        key_prefix : str
+            the prefix of the redis keys
+        owner : str | None
+            the name of the worker holding the leases, to identify it in the
+            tokens. default is `{hostname}:{pid}`
+        """
+        self.redis_client = redis_client or RedisSingleton.get_instance().get_client()
+        self.ttl = ttl
+        self.key_prefix = key_prefix
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+
+    def acquire(self, name: str) -> Lease | None:
+        """
+        acquire the lease on a name
+
+        Returns
+        ---------
+        lease : Lease | None
+            the acquired lease, or `None` if another worker holds it
+        """
+        token = f"{self.owner}:{uuid.uuid4().hex}"
+        acquired = self.redis_client.set(
+            self._key(name), token, nx=True, px=int(self.ttl * 1000)
+        )
+        metrics.increment(
+            "hivemind_lease_acquisitions_total",
+            result="acquired" if acquired else "held",
+        )
+        if not acquired:
+            return None
+        return Lease(self, name, token)
+
+    def renew(self, lease: Lease) -> bool:
+        """
+        extend the lease for another `ttl` seconds, if it's still held
+
+        Returns
+        ---------
+        renewed : bool
+            False if the lease expired or was taken by another worker
+        """
+        renewed = self._if_holder(
+            lease, lambda pipe, key: pipe.pexpire(key, int(self.ttl * 1000))
+        )
+        if not renewed:
+            lease._lost.set()
+        return renewed
+
+    def release(self, lease: Lease) -> bool:
+        """
+        release the lease, if it's still held
+
+        Returns
+        ---------
+        released : bool
+            False if the lease had already expired or was taken by another worker
+        """
+        return self._if_holder(lease, lambda pipe, key: pipe.delete(key))
+
+    def is_held(self, lease: Lease) -> bool:
+        """
+        whether the lease is still held
+        """
+        return _equals(self.redis_client.get(self._key(lease.name)), lease.token)
+
+    def holder(self, name: str) -> str | None:
+        """
+        the token of the lease held on a name, `None` if it's free
+        """
+        token = self.redis_client.get(self._key(name))
+        if isinstance(token, bytes):
+            return token.decode()
+        return token
+
+    def held(self, names: list[str]) -> set[str]:
+        """
+        the names among the given ones that have a lease held on them
+        """
+        if not names:
+            return set()
+        tokens = self.redis_client.mget([self._key(name) for name in names])
+        return {name for name, token in zip(names, tokens) if token is not None}
+
+    @contextmanager
+    def hold(
+        self, name: str, renew_interval: float | None = None
+    ) -> Iterator[Lease | None]:
+        """
+        hold the lease on a name for the duration of the context
+
+        the lease is renewed in a background thread, and released on exit
+
+        Parameters
+        ------------
+        name : str
+            the name to acquire the lease on
+        renew_interval : float | None
+            the seconds between renewals. default is a third of `ttl`
+
+        Yields
+        --------
+        lease : Lease | None
+            the held lease, or `None` if another worker holds it
+        """
+        lease = self.acquire(name)
+        if lease is None:
+            yield None
+            return
+
+        stop = threading.Event()
+        renewer = threading.Thread(
+            target=self._keep_alive,
+            args=(lease, stop, renew_interval or self.ttl / 3),
+            name=f"lease-{name}",
+            daemon=True,
+        )
+        renewer.start()
+        try:
+            yield lease
+        finally:
+            stop.set()
+            renewer.join()
+            if not lease.release():
+                logging.warning(f"Lease of {name} had expired before its release!")
+
+    def _keep_alive(self, lease: Lease, stop: threading.Event, interval: float) -> None:
+        while not stop.wait(interval):
+            try:
+                renewed = self.renew(lease)
+            except redis.RedisError as exp:
+                # the lease may still be held, trying again on the next interval
+                logging.error(f"Failed to renew the lease of {lease.name}: {exp}")
+                continue
+            if not renewed:
+                logging.error(f"Lease of {lease.name} was lost!")
+                metrics.increment("hivemind_lease_lost_total")
+                return
+
+    def _if_holder(
+        self, lease: Lease, command: Callable[[redis.client.Pipeline, str], None]
+    ) -> bool:
+        """
+        run a command on the lease's key, only if it still holds its token
+
+        a watched transaction, so the key can't be taken in between
+        """
+        key = self._key(lease.name)
+        with self.redis_client.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                if not _equals(pipe.get(key), lease.token):
+                    pipe.unwatch()
+                    return False
+                pipe.multi()
+                command(pipe, key)
+                pipe.execute()
+            except redis.WatchError:
+                # the key changed, so it was taken by another worker
+                return False
+        return True
+
+    def _key(self, name: str) -> str:
+        return f"{self.key_prefix}:{name}"
+
+
+def _equals(value: str | bytes | None, token: str) -> bool:
+    if isinstance(value, bytes):
+        value = value.decode()
+    return value == token
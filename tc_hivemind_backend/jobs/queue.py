@@ -0,0 +1,253 @@
+import json
+import threading
+import time
+from collections import deque
+
+import redis
+from tc_hivemind_backend import metrics
+from tc_hivemind_backend.db.redis import RedisSingleton
+
+
+class IngestionJob:
+    def __init__(
+        self,
+        community_id: str,
+        platform: str,
+        enqueued_at: float | None = None,
+        estimated_tokens: float | None = None,
+    ) -> None:
+        """
+        the ingestion of a community's platform, to be run by a worker
+
+        Parameters
+        ------------
+        community_id : str
+            the community id
+        platform : str
+            the platform name, i.e. `discord`
+        enqueued_at : float | None
+            the unix time the job is waiting since. default is now
+        estimated_tokens : float | None
+            the estimated embedding tokens of the job (see `IngestionScheduler`)
+        """
+        self.community_id = community_id
+        self.platform = platform
+        self.enqueued_at = time.time() if enqueued_at is None else enqueued_at
+        self.estimated_tokens = estimated_tokens
+
+    @property
+    def key(self) -> str:
+        """
+        the name identifying the job, `{community_id}_{platform}`
+        """
+        return f"{self.community_id}_{self.platform}"
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "community_id": self.community_id,
+                "platform": self.platform,
+                "enqueued_at": self.enqueued_at,
+                "estimated_tokens": self.estimated_tokens,
+            }
+        )
+
+    @classmethod
+    def from_json(cls, value: str | bytes) -> "IngestionJob":
+        return cls(**json.loads(value))
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, IngestionJob):
+            return NotImplemented
+        return self.key == other.key
+
+    def __hash__(self) -> int:
+        return hash(self.key)
+
+    def __repr__(self) -> str:
+        return f"IngestionJob({self.community_id!r}, {self.platform!r})"
+
+
+class RedisJobQueue:
+    def __init__(
+        self,
+        redis_client: redis.Redis | None = None,
+        name: str = "hivemind_ingestion_jobs",
+    ) -> None:
+        """
+        a first-in first-out queue of ingestion jobs in redis, shared by workers
+
+        a job is queued once, pushing a job that's already waiting is a no-op
+        once pulled, the same job can be queued again (i.e. by the next
+        scheduling) while a worker is running it, the lease of the job (see
+        `LeaseManager`) keeps two workers from running it at the same time
+
+        a pulled job is moved to a `{name}:pulled` list in the same command,
+        and removed from it along with its queued key in a transaction, so a
+        worker crashing in between leaves it there to be queued again by
+        `recover()` rather than losing it
+
+        Parameters
+        ------------
+        redis_client : redis.Redis | None
+            the client to keep the queue with
+            default is the `RedisSingleton` client
+        name : str
+            the redis key of the queue
+        """
+        self.redis_client = redis_client or RedisSingleton.get_instance().get_client()
+        self.name = name
+        self._queued_key = f"{name}:queued"
+        self._pulled_key = f"{name}:pulled"
+
+    def push(self, job: IngestionJob) -> bool:
+        """
+        add a job to the end of the queue
+
+        Returns
+        ---------
+        queued : bool
+            False if the job was already waiting in the queue
+        """
+        with self.redis_client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(self._queued_key)
+                    if pipe.sismember(self._queued_key, job.key):
+                        pipe.unwatch()
+                        return False
+                    pipe.multi()
+                    pipe.sadd(self._queued_key, job.key)
+                    pipe.rpush(self.name, job.to_json())
+                    pipe.execute()
+                    break
+                except redis.WatchError:
+                    # the queued jobs changed in between, checking again
+                    continue
+        metrics.increment("hivemind_jobs_queued_total")
+        return True
+
+    def pop(self, timeout: float = 0) -> IngestionJob | None:
+        """
+        pull the first job of the queue
+
+        Parameters
+        ------------
+        timeout : float
+            the seconds to wait for a job if the queue is empty
+            `0` returns right away
+
+        Returns
+        ---------
+        job : IngestionJob | None
+            the job, or `None` if the queue was empty
+        """
+        if timeout > 0:
+            value = self.redis_client.blmove(
+                self.name, self._pulled_key, timeout, "LEFT", "RIGHT"
+            )
+        else:
+            value = self.redis_client.lmove(
+                self.name, self._pulled_key, "LEFT", "RIGHT"
+            )
+        if value is None:
+            return None
+
+        job = IngestionJob.from_json(value)
+        with self.redis_client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(self._pulled_key)
+                    if pipe.lpos(self._pulled_key, value) is None:
+                        # queued again by `recover()` in between, its lease
+                        # keeps it from running twice at the same time
+                        pipe.unwatch()
+                        break
+                    pipe.multi()
+                    pipe.lrem(self._pulled_key, 1, value)
+                    pipe.srem(self._queued_key, job.key)
+                    pipe.execute()
+                    break
+                except redis.WatchError:
+                    # another job was pulled in between
+                    continue
+        return job
+
+    def recover(self) -> int:
+        """
+        queue again, at the front, the jobs pulled by workers that crashed
+        before removing them from the queue
+
+        a job pulled at the same time by a running worker may be queued again
+        too, it's then skipped while that worker holds its lease
+
+        Returns
+        ---------
+        recovered : int
+            the number of jobs queued again
+        """
+        recovered = 0
+        while self.redis_client.lmove(self._pulled_key, self.name, "RIGHT", "LEFT"):
+            recovered += 1
+        return recovered
+
+    def queued_keys(self) -> set[str]:
+        """
+        the keys of the jobs waiting in the queue
+        """
+        return {
+            key.decode() if isinstance(key, bytes) else key
+            for key in self.redis_client.smembers(self._queued_key)
+        }
+
+    def clear(self) -> None:
+        """
+        remove all waiting jobs
+        """
+        self.redis_client.delete(self.name, self._queued_key, self._pulled_key)
+
+    def __len__(self) -> int:
+        return self.redis_client.llen(self.name)
+
+
+class LocalJobQueue:
+    def __init__(self) -> None:
+        """
+        an in-process stand-in for `RedisJobQueue`, with the same behavior
+        for a single worker, i.e. for tests and local runs
+        """
+        self._jobs: deque[IngestionJob] = deque()
+        self._condition = threading.Condition()
+
+    def push(self, job: IngestionJob) -> bool:
+        with self._condition:
+            if job in self._jobs:
+                return False
+            self._jobs.append(job)
+            self._condition.notify()
+        metrics.increment("hivemind_jobs_queued_total")
+        return True
+
+    def pop(self, timeout: float = 0) -> IngestionJob | None:
+        with self._condition:
+            if timeout > 0:
+                self._condition.wait_for(lambda: self._jobs, timeout=timeout)
+            return self._jobs.popleft() if self._jobs else None
+
+    def recover(self) -> int:
+        # a pulled job is never left behind in the process
+        return 0
+
+    def queued_keys(self) -> set[str]:
+        with self._condition:
+            return {job.key for job in self._jobs}
+
+    def clear(self) -> None:
+        with self._condition:
+            self._jobs.clear()
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+
+JobQueue = RedisJobQueue | LocalJobQueue
@@ -0,0 +1,119 @@
+import logging
+from typing import Callable
+
+from tc_hivemind_backend import metrics
+from tc_hivemind_backend.jobs.lease import (
+    JobStopped,
+    Lease,
+    LeaseLostError,
+    LeaseManager,
+)
+from tc_hivemind_backend.jobs.queue import IngestionJob, JobQueue
+
+# runs a job while its lease is held, i.e. extracting the community's
+# documents and passing them with the lease to `CustomIngestionPipeline.run_pipeline`
+JobHandler = Callable[[IngestionJob, Lease], None]
+
+
+class LeasedJobRunner:
+    def __init__(
+        self, queue: JobQueue, leases: LeaseManager, handler: JobHandler
+    ) -> None:
+        """
+        pull jobs from a queue shared by workers, and run each one while
+        holding its lease, so two workers never ingest the same
+        `{community_id}_{platform}` at the same time
+
+        Parameters
+        ------------
+        queue : RedisJobQueue | LocalJobQueue
+            the queue to pull the jobs from
+        leases : LeaseManager
+            the manager of the job leases
+        handler : Callable[[IngestionJob, Lease], None]
+            runs a job, the lease can be checked with `lease.ensure()` between
+            steps to stop once it's lost
+        """
+        self.queue = queue
+        self.leases = leases
+        self.handler = handler
+
+    def run_once(self, timeout: float = 0) -> IngestionJob | None:
+        """
+        pull a job and run it, if its lease isn't held by another worker
+
+        a job already running on another worker is dropped and not queued
+        again, the running worker ingests the community's latest documents
+        and the next scheduling queues it again. A failing job is logged and
+        not retried, a job stopped through its lease (see `Lease.request_stop`)
+        is queued again once its lease is released, so the next worker pulling
+        it can acquire the lease
+
+        Parameters
+        ------------
+        timeout : float
+            the seconds to wait for a job if the queue is empty
+
+        Returns
+        ---------
+        job : IngestionJob | None
+            the pulled job, `None` if the queue was empty
+        """
+        job = self.queue.pop(timeout=timeout)
+        if job is None:
+            return None
+
+        msg = f"COMMUNITYID: {job.community_id} "
+        with self.leases.hold(job.key) as lease:
+            if lease is None:
+                logging.info(
+                    f"{msg}{job.platform} ingestion is running on another worker, "
+                    "skipping it!"
+                )
+                metrics.increment("hivemind_jobs_total", result="skipped")
+                return job
+
+            result = "done"
+            stopped = False
+            try:
+                with metrics.timer("hivemind_job", platform=job.platform):
+                    self.handler(job, lease)
+            except JobStopped as exp:
+                logging.warning(f"{msg}{exp} queueing it again!")
+                stopped = True
+                result = "stopped"
+            except LeaseLostError as exp:
+                logging.error(f"{msg}{job.platform} ingestion was stopped: {exp}")
+                result = "lost"
+            except Exception as exp:
+                logging.error(f"{msg}{job.platform} ingestion failed: {exp}")
+                result = "failed"
+            metrics.increment("hivemind_jobs_total", result=result)
+
+        if stopped:
+            # queued again, to be resumed from its checkpoint
+            self.queue.push(job)
+        return job
+
+    def run(self, timeout: float = 5, max_jobs: int | None = None) -> int:
+        """
+        run jobs until the queue stays empty for `timeout` seconds
+
+        Parameters
+        ------------
+        timeout : float
+            the seconds to wait for a job before stopping
+        max_jobs : int | None
+            the maximum number of jobs to pull. default is no limit
+
+        Returns
+        ---------
+        pulled : int
+            the number of pulled jobs
+        """
+        pulled = 0
+        while max_jobs is None or pulled < max_jobs:
+            if self.run_once(timeout=timeout) is None:
+                break
+            pulled += 1
+        return pulled
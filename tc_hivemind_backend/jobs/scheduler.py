@@ -0,0 +1,327 @@
+import logging
+import time
+from datetime import datetime
+from typing import Callable
+
+from tc_hivemind_backend import metrics
+from tc_hivemind_backend.db.modules_base import ModulesBase
+from tc_hivemind_backend.jobs.lease import LeaseManager
+from tc_hivemind_backend.jobs.queue import IngestionJob, RedisJobQueue
+
+SCHEDULING_POLICIES = ("fair", "shortest_first")
+# the rough embedding tokens of a document, to estimate a job by its documents
+TOKENS_PER_DOCUMENT = 500
+
+# (community_id, platform) -> the estimated embedding tokens of the documents
+# to ingest, `0` meaning there's nothing to ingest
+SizeEstimator = Callable[[str, str], float]
+
+
+def pending_documents_estimator(
+    count_pending: Callable[[str, str], int],
+    tokens_per_document: float = TOKENS_PER_DOCUMENT,
+) -> SizeEstimator:
+    """
+    estimate the jobs by the number of documents waiting to be ingested
+
+    Parameters
+    ------------
+    count_pending : Callable[[str, str], int]
+        gives the number of documents to ingest of a community's platform
+    tokens_per_document : float
+        the average embedding tokens of a document
+    """
+
+    def estimate(community_id: str, platform: str) -> float:
+        return count_pending(community_id, platform) * tokens_per_document
+
+    return estimate
+
+
+def staleness_estimator(
+    latest_date: Callable[[str, str], datetime | None],
+    tokens_per_day: float,
+    first_run_days: float = 365,
+) -> SizeEstimator:
+    """
+    estimate the jobs by the time since their latest ingested document
+
+    Parameters
+    ------------
+    latest_date : Callable[[str, str], datetime | None]
+        gives the date of the latest ingested document of a community's
+        platform, i.e. using `CustomIngestionPipeline.get_latest_document_date`
+        `None` if nothing was ingested yet
+    tokens_per_day : float
+        the embedding tokens of the documents a platform gets in a day
+    first_run_days : float
+        the days of documents assumed for a platform never ingested
+    """
+
+    def estimate(community_id: str, platform: str) -> float:
+        latest = latest_date(community_id, platform)
+        if latest is None:
+            return first_run_days * tokens_per_day
+        elapsed = datetime.now(tz=latest.tzinfo) - latest
+        return max(elapsed.total_seconds(), 0) / 86400 * tokens_per_day
+
+    return estimate
+
+
+class IngestionScheduler:
+    def __init__(
+        self,
+        queue: RedisJobQueue,
+        estimate_tokens: SizeEstimator,
+        policy: str = "fair",
+        max_jobs_per_community: int = 1,
+        token_budget: float | None = None,
+        budget_window: float = 3600,
+        max_wait: float = 6 * 3600,
+        weights: dict[str, float] | None = None,
+        leases: LeaseManager | None = None,
+        modules_base: ModulesBase | None = None,
+        key_prefix: str = "hivemind_scheduler",
+        timer: Callable[[], float] = time.time,
+    ) -> None:
+        """
+        queue the ingestion jobs of the communities having hivemind enabled,
+        so the huge communities don't starve the small ones
+
+        each scheduling estimates the embedding tokens of the jobs, orders
+        them by the `policy`, and queues them as long as the community has
+        less than `max_jobs_per_community` jobs queued or running, and the
+        jobs queued during the current `budget_window` fit the `token_budget`.
+        A job that waited `max_wait` seconds goes first and is never passed
+        over for the budget, so the biggest jobs still run eventually.
+
+        the policies are
+        - `fair`: weighted fair queuing between the communities, the jobs are
+          ordered by the tokens their community would have been given in the
+          window once they're done, divided by the community's weight
+        - `shortest_first`: the jobs with the least tokens first
+
+        Parameters
+        ------------
+        queue : RedisJobQueue
+            the queue the workers pull the jobs from
+        estimate_tokens : Callable[[str, str], float]
+            gives the embedding tokens of a community's platform job
+            see `pending_documents_estimator` and `staleness_estimator`
+        policy : str
+            the order of the jobs, `fair` (default) or `shortest_first`
+        max_jobs_per_community : int
+            the maximum jobs of a community queued or running at a time
+        token_budget : float | None
+            the maximum estimated tokens of the jobs queued in a window
+            a job larger than the budget is queued alone in its window
+            default is `None`, meaning no budget
+        budget_window : float
+            the seconds of a budget window
+        max_wait : float
+            the seconds after which a job waiting to be queued goes first
+        weights : dict[str, float] | None
+            the share of each community id for the `fair` policy, default is 1
+        leases : LeaseManager | None
+            the leases of the running jobs, default is one on the queue's client
+        modules_base : ModulesBase | None
+            gives the communities of a platform, default is a new instance
+        key_prefix : str
+            the prefix of the redis keys of the scheduler's state
+        timer : Callable[[], float]
+            the clock of the windows and waits, default is `time.time`
+        """
+        if policy not in SCHEDULING_POLICIES:
+            raise ValueError(
+                f"Unsupported scheduling policy: {policy}! "
+                f"supported ones are {list(SCHEDULING_POLICIES)}"
+            )
+        if max_jobs_per_community < 1:
+            raise ValueError("max_jobs_per_community should be a positive number!")
+
+        self.queue = queue
+        self.redis_client = queue.redis_client
+        self.estimate_tokens = estimate_tokens
+        self.policy = policy
+        self.max_jobs_per_community = max_jobs_per_community
+        self.token_budget = token_budget
+        self.budget_window = budget_window
+        self.max_wait = max_wait
+        self.weights = weights or {}
+        self.leases = leases or LeaseManager(self.redis_client)
+        self.modules_base = modules_base or ModulesBase()
+        self.key_prefix = key_prefix
+        self._timer = timer
+        self._waiting_key = f"{key_prefix}:waiting"
+
+    def schedule(self, platforms: list[str]) -> list[IngestionJob]:
+        """
+        queue the jobs of the platforms' communities that fit the caps and budget
+
+        Parameters
+        ------------
+        platforms : list[str]
+            the platforms to schedule the jobs of, i.e. `["discord", "github"]`
+
+        Returns
+        ---------
+        queued : list[IngestionJob]
+            the jobs queued, in their order
+        """
+        jobs = self.collect_jobs(platforms)
+        queued = self.dispatch(self.order(jobs))
+        logging.info(
+            f"{len(queued)} of {len(jobs)} ingestion jobs were queued! "
+            f"policy: {self.policy}"
+        )
+        return queued
+
+    def collect_jobs(self, platforms: list[str]) -> list[IngestionJob]:
+        """
+        the jobs of the platforms' communities having documents to ingest
+
+        the `enqueued_at` of a job is the first time it was found waiting
+        """
+        jobs: list[IngestionJob] = []
+        for platform in platforms:
+            for community_id in self.modules_base.get_platform_community_ids(platform):
+                try:
+                    tokens = self.estimate_tokens(community_id, platform)
+                except Exception as exp:
+                    logging.error(
+                        f"COMMUNITYID: {community_id} Failed to estimate the "
+                        f"{platform} ingestion job: {exp}"
+                    )
+                    continue
+                if tokens > 0:
+                    jobs.append(
+                        IngestionJob(community_id, platform, estimated_tokens=tokens)
+                    )
+
+        # the jobs of these platforms that are no longer waiting
+        keys = {job.key for job in jobs}
+        gone = [
+            key
+            for key in map(_decode, self.redis_client.hkeys(self._waiting_key))
+            if key not in keys
+            and any(key.endswith(f"_{platform}") for platform in platforms)
+        ]
+        now = self._timer()
+        with self.redis_client.pipeline(transaction=False) as pipe:
+            if gone:
+                pipe.hdel(self._waiting_key, *gone)
+            for job in jobs:
+                pipe.hsetnx(self._waiting_key, job.key, now)
+            pipe.execute()
+
+        if jobs:
+            waiting_since = self.redis_client.hmget(
+                self._waiting_key, [job.key for job in jobs]
+            )
+            for job, since in zip(jobs, waiting_since):
+                job.enqueued_at = float(since) if since is not None else now
+        return jobs
+
+    def order(self, jobs: list[IngestionJob]) -> list[IngestionJob]:
+        """
+        order the jobs by the policy, after the ones waiting for `max_wait`
+        """
+        now = self._timer()
+        starved = sorted(
+            [job for job in jobs if now - job.enqueued_at >= self.max_wait],
+            key=lambda job: job.enqueued_at,
+        )
+        rest = [job for job in jobs if now - job.enqueued_at < self.max_wait]
+
+        if self.policy == "shortest_first":
+            rest.sort(key=lambda job: (job.estimated_tokens, job.enqueued_at))
+            return starved + rest
+
+        # the virtual finish time of each community's jobs, starting from the
+        # tokens already given to the community in the window
+        served = self._served_tokens()
+        finish: dict[str, float] = {}
+        tagged: list[tuple[float, float, IngestionJob]] = []
+        for job in sorted(rest, key=lambda job: job.estimated_tokens):
+            weight = self.weights.get(job.community_id, 1.0)
+            start = finish.get(job.community_id, served.get(job.community_id, 0.0))
+            finish[job.community_id] = start + job.estimated_tokens / weight
+            tagged.append((finish[job.community_id], job.enqueued_at, job))
+        tagged.sort(key=lambda item: (item[0], item[1]))
+        return starved + [job for _, _, job in tagged]
+
+    def dispatch(self, jobs: list[IngestionJob]) -> list[IngestionJob]:
+        """
+        queue the ordered jobs that fit the community caps and the token budget
+        """
+        now = self._timer()
+        queued_keys = self.queue.queued_keys()
+        running_keys = self.leases.held([job.key for job in jobs])
+
+        # the jobs of each community already queued or running
+        outstanding: dict[str, int] = {}
+        for job in jobs:
+            if job.key in queued_keys or job.key in running_keys:
+                outstanding[job.community_id] = outstanding.get(job.community_id, 0) + 1
+
+        used = self._used_tokens()
+        queued: list[IngestionJob] = []
+        for job in jobs:
+            if job.key in queued_keys or job.key in running_keys:
+                result = "outstanding"
+                # it's not waiting to be queued
+                self.redis_client.hdel(self._waiting_key, job.key)
+            elif outstanding.get(job.community_id, 0) >= self.max_jobs_per_community:
+                result = "capped"
+            elif (
+                self.token_budget is not None
+                and used > 0
+                and used + job.estimated_tokens > self.token_budget
+            ):
+                result = "over_budget"
+                if now - job.enqueued_at >= self.max_wait:
+                    # keeping the rest of the budget for the starved job
+                    metrics.increment("hivemind_scheduler_jobs_total", result=result)
+                    break
+            else:
+                result = "queued"
+                self.queue.push(job)
+                self._charge(job)
+                used += job.estimated_tokens
+                outstanding[job.community_id] = outstanding.get(job.community_id, 0) + 1
+                queued.append(job)
+            metrics.increment("hivemind_scheduler_jobs_total", result=result)
+        return queued
+
+    def _window_keys(self) -> tuple[str, str]:
+        window = int(self._timer() // self.budget_window)
+        return (
+            f"{self.key_prefix}:tokens:{window}",
+            f"{self.key_prefix}:served:{window}",
+        )
+
+    def _used_tokens(self) -> float:
+        tokens_key, _ = self._window_keys()
+        return float(self.redis_client.get(tokens_key) or 0)
+
+    def _served_tokens(self) -> dict[str, float]:
+        _, served_key = self._window_keys()
+        return {
+            _decode(community_id): float(tokens)
+            for community_id, tokens in self.redis_client.hgetall(served_key).items()
+        }
+
+    def _charge(self, job: IngestionJob) -> None:
+        tokens_key, served_key = self._window_keys()
+        expiry = int(self.budget_window * 2)
+        with self.redis_client.pipeline() as pipe:
+            pipe.incrbyfloat(tokens_key, job.estimated_tokens)
+            pipe.hincrbyfloat(served_key, job.community_id, job.estimated_tokens)
+            pipe.expire(tokens_key, expiry)
+            pipe.expire(served_key, expiry)
+            pipe.hdel(self._waiting_key, job.key)
+            pipe.execute()
+
+
+def _decode(value: str | bytes) -> str:
+    return value.decode() if isinstance(value, bytes) else value
@@ -0,0 +1,271 @@
+"""
+a long-running ingestion worker, pulling the jobs queued by the
+`IngestionScheduler` and keeping its clients and models warm between them
+
+    hivemind-worker --loader my_etl.jobs:load_documents
+
+the loader is a `module:function` taking an `IngestionJob` and returning the
+llama-index documents to ingest. On SIGTERM or SIGINT, the worker stops
+pulling jobs and the running one stops once its current batch is saved, it's
+queued again to be resumed from its checkpoint. A second signal exits.
+"""
+
+import argparse
+import importlib
+import logging
+import os
+import signal
+import threading
+from collections import OrderedDict
+from typing import Any, Callable
+
+from dotenv import load_dotenv
+from llama_index.core import Document
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.utils import get_tokenizer
+from tc_hivemind_backend import metrics
+from tc_hivemind_backend.db.mongo import MongoSingleton
+from tc_hivemind_backend.db.qdrant import QdrantSingleton
+from tc_hivemind_backend.db.redis import RedisSingleton
+from tc_hivemind_backend.db.utils.preprocess_text import (
+    CLEANING_MODES,
+    load_spacy_model,
+)
+from tc_hivemind_backend.embeddings.cohere import CohereEmbedding
+from tc_hivemind_backend.ingest_qdrant import CustomIngestionPipeline
+from tc_hivemind_backend.jobs.lease import Lease, LeaseManager
+from tc_hivemind_backend.jobs.queue import IngestionJob, JobQueue, RedisJobQueue
+from tc_hivemind_backend.jobs.runner import LeasedJobRunner
+from tc_hivemind_backend.qdrant_vector_access import VECTOR_COMPRESSIONS
+
+# gives the documents to ingest of a job, i.e. extracted from its platform
+DocumentLoader = Callable[[IngestionJob], list[Document]]
+# the number of community pipelines kept set up between the jobs
+WORKER_MAX_PIPELINES = 32
+
+
+class IngestionWorker:
+    def __init__(
+        self,
+        load_documents: DocumentLoader,
+        queue: JobQueue | None = None,
+        leases: LeaseManager | None = None,
+        poll_timeout: float = 5,
+        max_pipelines: int = WORKER_MAX_PIPELINES,
+        **pipeline_kwargs: Any,
+    ) -> None:
+        """
+        run the ingestion jobs of a queue, one at a time, while holding their
+        leases (see `LeasedJobRunner`)
+
+        the embedding model is created once and shared by all pipelines, and
+        the pipeline of a community's platform is kept (with its vector store,
+        docstore and cache) for its next jobs
+
+        Parameters
+        ------------
+        load_documents : Callable[[IngestionJob], list[Document]]
+            gives the documents to ingest of a job
+        queue : RedisJobQueue | LocalJobQueue | None
+            the queue to pull the jobs from, default is a `RedisJobQueue`
+        leases : LeaseManager | None
+            the manager of the job leases, default is one on the redis client
+        poll_timeout : float
+            the seconds to wait for a job before checking for a shutdown
+        max_pipelines : int
+            the number of pipelines to keep, the least recently used one is
+            closed when there are more
+        **pipeline_kwargs : Any
+            the parameters of the `CustomIngestionPipeline`s
+            `checkpoint` is True by default, so a stopped job is resumed
+        """
+        pipeline_kwargs.setdefault("checkpoint", True)
+        self.load_documents = load_documents
+        # an empty queue is falsy
+        self.queue = queue if queue is not None else RedisJobQueue()
+        self.leases = leases if leases is not None else LeaseManager()
+        self.poll_timeout = poll_timeout
+        self.max_pipelines = max_pipelines
+        self.pipeline_kwargs = pipeline_kwargs
+        self.runner = LeasedJobRunner(self.queue, self.leases, self._run_job)
+
+        self.embed_model: BaseEmbedding | None = None
+        self._pipelines: OrderedDict[str, CustomIngestionPipeline] = OrderedDict()
+        self._stopping = threading.Event()
+        self._current: Lease | None = None
+        # reentrant, as `stop` can be called by a signal handler in the thread
+        # running a job
+        self._lock = threading.RLock()
+
+    @property
+    def stopping(self) -> bool:
+        return self._stopping.is_set()
+
+    def warm_up(self) -> None:
+        """
+        connect the database clients and load the models before the first job
+        """
+        with metrics.timer("hivemind_worker_warm_up"):
+            RedisSingleton.get_instance()
+            MongoSingleton.get_instance()
+            QdrantSingleton.get_instance()
+            get_tokenizer()
+
+            if not self.pipeline_kwargs.get("testing", False):
+                cleaning_mode = self.pipeline_kwargs.get("cleaning_mode", "spacy")
+                if cleaning_mode == "spacy":
+                    load_spacy_model()
+                compression = self.pipeline_kwargs.get("vector_compression", "none")
+                self.embed_model = CohereEmbedding(
+                    embedding_type=VECTOR_COMPRESSIONS[compression],
+                    cleaning_mode=cleaning_mode,
+                )
+        logging.info("Ingestion worker is warmed up!")
+
+    def run(self) -> int:
+        """
+        pull and run jobs until `stop()` is called, the jobs left pulled by
+        crashed workers are queued again first
+
+        Returns
+        ---------
+        pulled : int
+            the number of pulled jobs
+        """
+        pulled = 0
+        recovered = self.queue.recover()
+        if recovered:
+            logging.warning(f"{recovered} jobs of crashed workers are queued again!")
+        logging.info("Ingestion worker is waiting for jobs!")
+        try:
+            while not self.stopping:
+                if self.runner.run_once(timeout=self.poll_timeout) is not None:
+                    pulled += 1
+        finally:
+            self.close()
+        logging.info(f"Ingestion worker stopped after {pulled} jobs!")
+        return pulled
+
+    def stop(self) -> None:
+        """
+        stop pulling jobs, the running job stops once its current batch is
+        saved and is queued again
+        """
+        self._stopping.set()
+        with self._lock:
+            if self._current is not None:
+                logging.info(f"Draining the running job of {self._current.name}!")
+                self._current.request_stop()
+
+    def close(self) -> None:
+        """
+        release the pipelines kept for the next jobs
+        """
+        with self._lock:
+            for pipeline in self._pipelines.values():
+                pipeline.close()
+            self._pipelines.clear()
+
+    def get_pipeline(self, job: IngestionJob) -> CustomIngestionPipeline:
+        """
+        get the pipeline of a job's community platform, creating it if needed
+        """
+        pipeline = self._pipelines.get(job.key)
+        if pipeline is not None:
+            self._pipelines.move_to_end(job.key)
+            return pipeline
+
+        pipeline = CustomIngestionPipeline(
+            job.community_id,
+            collection_name=job.platform,
+            embed_model=self.embed_model,
+            **self.pipeline_kwargs,
+        )
+        self._pipelines[job.key] = pipeline
+        while len(self._pipelines) > self.max_pipelines:
+            _, evicted = self._pipelines.popitem(last=False)
+            evicted.close()
+        return pipeline
+
+    def _run_job(self, job: IngestionJob, lease: Lease) -> None:
+        with self._lock:
+            self._current = lease
+            if self.stopping:
+                # stopped while the job was being pulled
+                lease.request_stop()
+        try:
+            lease.ensure()
+            documents = self.load_documents(job)
+            self.get_pipeline(job).run_pipeline(documents, lease=lease)
+        finally:
+            with self._lock:
+                self._current = None
+
+
+def load_object(path: str) -> Any:
+    """
+    import an object from its `module:name` path
+    """
+    module_name, _, name = path.partition(":")
+    if not module_name or not name:
+        raise ValueError(f"Invalid path: {path}! it should be `module:name`")
+    return getattr(importlib.import_module(module_name), name)
+
+
+def install_signal_handlers(worker: IngestionWorker) -> None:
+    """
+    drain the worker on the first SIGTERM or SIGINT, exit on the second one
+    """
+
+    def handle(signum: int, frame: Any) -> None:
+        logging.warning(
+            f"Received {signal.Signals(signum).name}, draining the worker! "
+            "send it again to exit right away"
+        )
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        worker.stop()
+
+    signal.signal(signal.SIGTERM, handle)
+    signal.signal(signal.SIGINT, handle)
+
+
+def main(argv: list[str] | None = None) -> None:
+    load_dotenv()
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--loader",
+        default=os.getenv("HIVEMIND_WORKER_LOADER"),
+        help="the `module:function` giving the documents of a job",
+    )
+    parser.add_argument("--queue", default="hivemind_ingestion_jobs")
+    parser.add_argument("--poll-timeout", type=float, default=5)
+    parser.add_argument("--max-pipelines", type=int, default=WORKER_MAX_PIPELINES)
+    parser.add_argument(
+        "--vector-compression", default="none", choices=list(VECTOR_COMPRESSIONS)
+    )
+    parser.add_argument("--cleaning-mode", default="spacy", choices=CLEANING_MODES)
+    parser.add_argument("--multi-tenant", action="store_true")
+    args = parser.parse_args(argv)
+    if not args.loader:
+        parser.error("--loader or the HIVEMIND_WORKER_LOADER env variable is required")
+
+    logging.basicConfig(level=logging.INFO)
+    worker = IngestionWorker(
+        load_object(args.loader),
+        queue=RedisJobQueue(name=args.queue),
+        poll_timeout=args.poll_timeout,
+        max_pipelines=args.max_pipelines,
+        vector_compression=args.vector_compression,
+        cleaning_mode=args.cleaning_mode,
+        multi_tenant=args.multi_tenant,
+    )
+    worker.warm_up()
+    install_signal_handlers(worker)
+    worker.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,427 @@
+"""
+a lightweight metrics layer for the ingestion hot paths
+
+the metrics are sent to a pluggable sink, chosen by the `HIVEMIND_METRICS_SINK`
+env variable (`none`, `memory`, `prometheus` or `otel`) or set with `set_sink`.
+The default sink drops everything, so a disabled instrumentation costs a
+single attribute check per call.
+
+Labels given to `metric_labels` (i.e. `community_id` and `platform`) are kept
+in a context variable and added to every metric recorded within that context.
+`collect` records the metrics of a block into its own in-memory sink too,
+i.e. to build a per-run report, whichever sink is active.
+"""
+
+import logging
+import os
+from abc import ABC, abstractmethod
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator
+
+from dotenv import load_dotenv
+
+LabelsKey = tuple[tuple[str, str], ...]
+
+# `None` rather than a shared mutable dict, see `current_labels`
+_labels: ContextVar[dict[str, str] | None] = ContextVar(
+    "hivemind_metric_labels", default=None
+)
+_collector: ContextVar["InMemorySink | None"] = ContextVar(
+    "hivemind_metric_collector", default=None
+)
+
+
+class MetricsSink(ABC):
+    """
+    the interface of the metrics sinks
+    """
+
+    enabled = True
+
+    @abstractmethod
+    def increment(self, name: str, value: float, labels: dict[str, str]) -> None:
+        """
+        add `value` to the counter `name`
+        """
+
+    @abstractmethod
+    def observe(self, name: str, value: float, labels: dict[str, str]) -> None:
+        """
+        record one observation (i.e. a latency or a batch size) of `name`
+        """
+
+
+class NullSink(MetricsSink):
+    """
+    the sink used when metrics are disabled
+    """
+
+    enabled = False
+
+    def increment(self, name: str, value: float, labels: dict[str, str]) -> None:
+        pass
+
+    def observe(self, name: str, value: float, labels: dict[str, str]) -> None:
+        pass
+
+
+class InMemorySink(MetricsSink):
+    """
+    keeps the counters and a count/sum/min/max summary of the observations
+    """
+
+    def __init__(self) -> None:
+        self._counters: dict[tuple[str, LabelsKey], float] = {}
+        self._summaries: dict[tuple[str, LabelsKey], list[float]] = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, value: float, labels: dict[str, str]) -> None:
+        key = (name, _labels_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, labels: dict[str, str]) -> None:
+        key = (name, _labels_key(labels))
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary is None:
+                self._summaries[key] = [1, value, value, value]
+            else:
+                summary[0] += 1
+                summary[1] += value
+                summary[2] = min(summary[2], value)
+                summary[3] = max(summary[3], value)
+
+    def get_counter(self, name: str, **labels: str) -> float:
+        """
+        the sum of counter `name` over the series having all the given labels
+        """
+        with self._lock:
+            return sum(
+                value
+                for (series, key), value in self._counters.items()
+                if series == name and _matches(key, labels)
+            )
+
+    def get_summary(self, name: str, **labels: str) -> dict[str, float]:
+        """
+        the summary of `name` merged over the series having all the given labels
+
+        Returns
+        ---------
+        summary : dict[str, float]
+            `count`, `sum`, `min` and `max` of the observations
+            all zero if nothing was observed
+        """
+        merged = {"count": 0, "sum": 0.0, "min": 0.0, "max": 0.0}
+        with self._lock:
+            for (series, key), (count, total, low, high) in self._summaries.items():
+                if series != name or not _matches(key, labels):
+                    continue
+                if merged["count"] == 0:
+                    merged["min"], merged["max"] = low, high
+                else:
+                    merged["min"] = min(merged["min"], low)
+                    merged["max"] = max(merged["max"], high)
+                merged["count"] += count
+                merged["sum"] += total
+        return merged
+
+    def snapshot(self) -> dict[str, list[dict[str, Any]]]:
+        """
+        a JSON-serializable copy of everything recorded so far
+        """
+        with self._lock:
+            return {
+                "counters": [
+                    {"name": name, "labels": dict(key), "value": value}
+                    for (name, key), value in self._counters.items()
+                ],
+                "summaries": [
+                    {
+                        "name": name,
+                        "labels": dict(key),
+                        **dict(zip(("count", "sum", "min", "max"), summary)),
+                    }
+                    for (name, key), summary in self._summaries.items()
+                ],
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._summaries.clear()
+
+
+class PrometheusSink(InMemorySink):
+    """
+    an in-memory sink that can be rendered in the Prometheus text format,
+    i.e. to be served on a `/metrics` endpoint or written to a textfile collector
+    """
+
+    def render(self) -> str:
+        lines: list[str] = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            summaries = sorted(self._summaries.items())
+
+        typed: set[str] = set()
+        for (name, key), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{_render_labels(key)} {value}")
+
+        for (name, key), (count, total, _, _) in summaries:
+            if name not in typed:
+                lines.append(f"# TYPE {name} summary")
+                typed.add(name)
+            lines.append(f"{name}_count{_render_labels(key)} {count}")
+            lines.append(f"{name}_sum{_render_labels(key)} {total}")
+
+        return "\n".join(lines) + "\n" if lines else ""
+
+
+class OpenTelemetrySink(MetricsSink):
+    """
+    sends the counters and observations to an OpenTelemetry meter
+
+    Note: needs the `opentelemetry-api` package, the exporter is configured
+    by the application through the OpenTelemetry SDK
+    """
+
+    def __init__(self, meter_name: str = "tc_hivemind_backend") -> None:
+        try:
+            from opentelemetry import metrics
+        except ImportError as exp:
+            raise ImportError(
+                "The `opentelemetry-api` package is needed for the otel metrics sink!"
+            ) from exp
+
+        self._meter = metrics.get_meter(meter_name)
+        self._counters: dict[str, Any] = {}
+        self._histograms: dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, value: float, labels: dict[str, str]) -> None:
+        with self._lock:
+            counter = self._counters.get(name)
+            if counter is None:
+                counter = self._meter.create_counter(name)
+                self._counters[name] = counter
+        counter.add(value, attributes=labels)
+
+    def observe(self, name: str, value: float, labels: dict[str, str]) -> None:
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._meter.create_histogram(name)
+                self._histograms[name] = histogram
+        histogram.record(value, attributes=labels)
+
+
+SINKS = {
+    "none": NullSink,
+    "memory": InMemorySink,
+    "prometheus": PrometheusSink,
+    "otel": OpenTelemetrySink,
+}
+
+_sink: MetricsSink | None = None
+
+
+def get_sink() -> MetricsSink:
+    """
+    get the active sink, creating it from the env variables on the first call
+    """
+    global _sink
+    if _sink is None:
+        _sink = create_sink_from_env()
+    return _sink
+
+
+def set_sink(sink: MetricsSink | None) -> MetricsSink | None:
+    """
+    replace the active sink
+
+    Parameters
+    ------------
+    sink : MetricsSink | None
+        the new sink, if `None` it is created again from the env variables
+        on the next use
+
+    Returns
+    ---------
+    previous : MetricsSink | None
+        the sink that was active before
+    """
+    global _sink
+    previous, _sink = _sink, sink
+    return previous
+
+
+def create_sink_from_env() -> MetricsSink:
+    """
+    create the sink named by the `HIVEMIND_METRICS_SINK` env variable
+    """
+    load_dotenv()
+    name = os.getenv("HIVEMIND_METRICS_SINK", "none").strip().lower() or "none"
+    if name not in SINKS:
+        raise ValueError(
+            f"Unknown metrics sink: {name}! supported ones are {list(SINKS.keys())}"
+        )
+    if name != "none":
+        logging.info(f"Recording metrics with the `{name}` sink!")
+    return SINKS[name]()
+
+
+@contextmanager
+def metric_labels(**labels: Any) -> Iterator[None]:
+    """
+    add labels to every metric recorded within the context
+    `None` values are ignored
+    """
+    current = current_labels()
+    token = _labels.set(
+        {
+            **current,
+            **{key: str(value) for key, value in labels.items() if value is not None},
+        }
+    )
+    try:
+        yield
+    finally:
+        _labels.reset(token)
+
+
+def current_labels() -> dict[str, str]:
+    """
+    a copy of the labels of the current context
+    """
+    return dict(_labels.get() or {})
+
+
+@contextmanager
+def collect(sink: "InMemorySink | None" = None) -> Iterator["InMemorySink"]:
+    """
+    record the metrics of the block into a separate in-memory sink, in addition
+    to the active sink
+
+    Note: an outer `collect` does not see the metrics of an inner one
+
+    Yields
+    --------
+    sink : InMemorySink
+        the sink holding the metrics recorded within the block
+    """
+    sink = sink if sink is not None else InMemorySink()
+    token = _collector.set(sink)
+    try:
+        yield sink
+    finally:
+        _collector.reset(token)
+
+
+def increment(name: str, value: float = 1, **labels: str) -> None:
+    sink = _sink or get_sink()
+    collector = _collector.get()
+    if sink.enabled or collector is not None:
+        labels = {**current_labels(), **labels}
+        if sink.enabled:
+            sink.increment(name, value, labels)
+        if collector is not None:
+            collector.increment(name, value, labels)
+
+
+def observe(name: str, value: float, **labels: str) -> None:
+    sink = _sink or get_sink()
+    collector = _collector.get()
+    if sink.enabled or collector is not None:
+        labels = {**current_labels(), **labels}
+        if sink.enabled:
+            sink.observe(name, value, labels)
+        if collector is not None:
+            collector.observe(name, value, labels)
+
+
+class _Timer:
+    __slots__ = ("name", "labels", "sinks", "start")
+
+    def __init__(
+        self, name: str, labels: dict[str, str], sinks: list[MetricsSink]
+    ) -> None:
+        self.name = name
+        self.labels = labels
+        self.sinks = sinks
+
+    def __enter__(self) -> "_Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        seconds = time.perf_counter() - self.start
+        for sink in self.sinks:
+            sink.observe(f"{self.name}_seconds", seconds, self.labels)
+            if exc_type is not None:
+                sink.increment(f"{self.name}_errors_total", 1, self.labels)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullTimer":
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timer(name: str, **labels: str) -> _Timer | _NullTimer:
+    """
+    time a block of code
+
+    the duration is observed as `{name}_seconds` and a raised exception
+    increments `{name}_errors_total`
+
+    Parameters
+    ------------
+    name : str
+        the metric base name, i.e. `hivemind_embedding_request`
+    **labels : str
+        the labels added to the context labels
+    """
+    sink = _sink or get_sink()
+    collector = _collector.get()
+    if not sink.enabled and collector is None:
+        return _NULL_TIMER
+
+    sinks = [sink] if sink.enabled else []
+    if collector is not None:
+        sinks.append(collector)
+    return _Timer(name, {**current_labels(), **labels}, sinks)
+
+
+def _labels_key(labels: dict[str, str]) -> LabelsKey:
+    return tuple(sorted(labels.items()))
+
+
+def _matches(key: LabelsKey, labels: dict[str, str]) -> bool:
+    series_labels = dict(key)
+    return all(series_labels.get(name) == value for name, value in labels.items())
+
+
+def _render_labels(key: LabelsKey) -> str:
+    if not key:
+        return ""
+    rendered = ",".join(f'{name}="{_escape(value)}"' for name, value in key)
+    return "{" + rendered + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,3 @@
+# flake8: noqa
+from .routing import RoutingNodeParser
+from .semantic import BatchedSemanticSplitterNodeParser
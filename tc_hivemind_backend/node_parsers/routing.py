@@ -0,0 +1,109 @@
+from typing import Any, Callable, Sequence
+
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.node_parser import NodeParser
+from llama_index.core.node_parser.node_utils import build_nodes_from_splits
+from llama_index.core.schema import BaseNode, MetadataMode
+from llama_index.core.utils import get_tokenizer
+from tc_hivemind_backend import metrics
+
+
+class RoutingNodeParser(NodeParser):
+    """
+    send the long documents to a splitter and keep the short ones as one node
+
+    the documents whose text (with the metadata given to the embedding model)
+    has at most `max_tokens` tokens are not split, as splitting them would
+    mostly give a single node anyway, while the semantic splitter embeds
+    each of their sentence groups to find out.
+    """
+
+    splitter: NodeParser = Field(
+        description="The node parser splitting the long documents."
+    )
+    max_tokens: int = Field(
+        description=(
+            "The maximum number of tokens of a document to keep it as one node. "
+            "Set to 0 to split all documents."
+        ),
+        ge=0,
+    )
+    _tokenizer: Callable[[str], list] = PrivateAttr()
+
+    def __init__(
+        self,
+        splitter: NodeParser,
+        max_tokens: int,
+        tokenizer: Callable[[str], list] | None = None,
+        **kwargs: Any,
+    ) -> None:
+        """
+        Parameters
+        ------------
+        splitter : NodeParser
+            the node parser to split the long documents with
+            i.e. a `SemanticSplitterNodeParser`
+        max_tokens : int
+            the documents having at most this number of tokens are kept as one
+            node, the ones with more are given to the `splitter`
+            `0` gives all documents to the `splitter`
+        tokenizer : Callable[[str], list] | None
+            the tokenizer to count the tokens with
+            default is the llama-index global tokenizer
+        """
+        super().__init__(splitter=splitter, max_tokens=max_tokens, **kwargs)
+        self._tokenizer = tokenizer or get_tokenizer()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "RoutingNodeParser"
+
+    def is_short(self, document: BaseNode) -> bool:
+        """
+        whether a document is kept as one node
+        """
+        if self.max_tokens == 0:
+            return False
+        text = document.get_content(metadata_mode=MetadataMode.EMBED)
+        return len(self._tokenizer(text)) <= self.max_tokens
+
+    def _parse_nodes(
+        self,
+        nodes: Sequence[BaseNode],
+        show_progress: bool = False,
+        **kwargs: Any,
+    ) -> list[BaseNode]:
+        short: dict[int, list[BaseNode]] = {}
+        long_docs: list[BaseNode] = []
+        for idx, node in enumerate(nodes):
+            if self.is_short(node):
+                short[idx] = build_nodes_from_splits(
+                    [node.get_content()], node, id_func=self.id_func
+                )
+            else:
+                long_docs.append(node)
+
+        metrics.increment(
+            "hivemind_node_parser_documents_total", len(short), route="single"
+        )
+        metrics.increment(
+            "hivemind_node_parser_documents_total", len(long_docs), route="split"
+        )
+
+        split_nodes: dict[str, list[BaseNode]] = {}
+        if long_docs:
+            # the splitter gets all long documents at once, so it can batch them
+            parsed = self.splitter._parse_nodes(
+                long_docs, show_progress=show_progress, **kwargs
+            )
+            for node in parsed:
+                split_nodes.setdefault(node.ref_doc_id or "", []).append(node)
+
+        # keeping the input order, so the nodes of a document stay together
+        all_nodes: list[BaseNode] = []
+        for idx, node in enumerate(nodes):
+            if idx in short:
+                all_nodes.extend(short[idx])
+            else:
+                all_nodes.extend(split_nodes.pop(node.node_id, []))
+        return all_nodes
@@ -0,0 +1,147 @@
+from typing import Any, Sequence
+
+import numpy as np
+from llama_index.core.bridge.pydantic import Field
+from llama_index.core.node_parser import SemanticSplitterNodeParser
+from llama_index.core.node_parser.node_utils import build_nodes_from_splits
+from llama_index.core.schema import BaseNode
+
+
+def adjacent_cosine_distances(embeddings: np.ndarray) -> np.ndarray:
+    """
+    the cosine distance of each row of a matrix to the next row
+
+    Parameters
+    ------------
+    embeddings : np.ndarray
+        the `(n, dim)` matrix of embeddings
+
+    Returns
+    ---------
+    distances : np.ndarray
+        the `n - 1` distances, a zero vector has a similarity of 0 to any vector
+    """
+    if len(embeddings) < 2:
+        return np.zeros(0)
+    norms = np.linalg.norm(embeddings, axis=1)
+    products = np.einsum("ij,ij->i", embeddings[:-1], embeddings[1:])
+    denominators = norms[:-1] * norms[1:]
+    similarities = np.divide(
+        products,
+        denominators,
+        out=np.zeros_like(products),
+        where=denominators != 0,
+    )
+    return 1 - similarities
+
+
+def breakpoint_chunks(
+    sentences: list[str], distances: np.ndarray, percentile: float
+) -> list[str]:
+    """
+    join the sentences into chunks, breaking after the distances above the
+    given percentile of all distances
+    """
+    if len(distances) == 0:
+        return [" ".join(sentences)]
+
+    threshold = np.percentile(distances, percentile)
+    ends = np.flatnonzero(distances > threshold) + 1
+    bounds = [0, *ends.tolist()]
+    if bounds[-1] < len(sentences):
+        bounds.append(len(sentences))
+    return ["".join(sentences[start:end]) for start, end in zip(bounds, bounds[1:])]
+
+
+class BatchedSemanticSplitterNodeParser(SemanticSplitterNodeParser):
+    """
+    a `SemanticSplitterNodeParser` embedding the sentence groups of many
+    documents together and computing the breakpoints with numpy
+
+    it gives the same nodes as `SemanticSplitterNodeParser`, while the
+    embedding model gets the sentence groups of up to `max_batch_sentences`
+    sentences (of one or more documents) per call instead of one call per
+    document, and the distances of a document are computed at once on the
+    matrix of its embeddings instead of pair by pair.
+    """
+
+    max_batch_sentences: int = Field(
+        default=2048,
+        description=(
+            "The maximum number of sentence groups to embed at once, "
+            "a longer document is embedded on its own."
+        ),
+        gt=0,
+    )
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "BatchedSemanticSplitterNodeParser"
+
+    def _parse_nodes(
+        self,
+        nodes: Sequence[BaseNode],
+        show_progress: bool = False,
+        **kwargs: Any,
+    ) -> list[BaseNode]:
+        return self.build_semantic_nodes_from_documents(nodes, show_progress)
+
+    def build_semantic_nodes_from_documents(
+        self,
+        documents: Sequence[BaseNode],
+        show_progress: bool = False,
+    ) -> list[BaseNode]:
+        all_nodes: list[BaseNode] = []
+        batch: list[tuple[BaseNode, list[str], list[str]]] = []
+        batch_size = 0
+        for doc in documents:
+            sentences = self.sentence_splitter(doc.get_content())
+            groups = self._combine_sentences(sentences)
+            if batch and batch_size + len(groups) > self.max_batch_sentences:
+                all_nodes.extend(self._build_batch_nodes(batch, show_progress))
+                batch, batch_size = [], 0
+            batch.append((doc, sentences, groups))
+            batch_size += len(groups)
+
+        if batch:
+            all_nodes.extend(self._build_batch_nodes(batch, show_progress))
+        return all_nodes
+
+    def _combine_sentences(self, sentences: list[str]) -> list[str]:
+        """
+        each sentence with the `buffer_size` sentences before and after it
+        """
+        return [
+            "".join(
+                sentences[max(idx - self.buffer_size, 0) : idx + 1 + self.buffer_size]
+            )
+            for idx in range(len(sentences))
+        ]
+
+    def _build_batch_nodes(
+        self,
+        batch: list[tuple[BaseNode, list[str], list[str]]],
+        show_progress: bool,
+    ) -> list[BaseNode]:
+        texts = [group for _, _, groups in batch for group in groups]
+        embeddings = (
+            np.asarray(
+                self.embed_model.get_text_embedding_batch(
+                    texts, show_progress=show_progress
+                )
+            )
+            if texts
+            else np.zeros((0, 0))
+        )
+
+        nodes: list[BaseNode] = []
+        start = 0
+        for doc, sentences, groups in batch:
+            end = start + len(groups)
+            distances = adjacent_cosine_distances(embeddings[start:end])
+            start = end
+            chunks = breakpoint_chunks(
+                sentences, distances, self.breakpoint_percentile_threshold
+            )
+            nodes.extend(build_nodes_from_splits(chunks, doc, id_func=self.id_func))
+        return nodes
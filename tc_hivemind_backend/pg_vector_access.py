@@ -1,5 +1,6 @@
 import logging
 import time
+from typing import Any
 
 from llama_index.core import Document, MockEmbedding, Settings, StorageContext
 from llama_index.core.base.embeddings.base import BaseEmbedding
@@ -7,11 +8,24 @@ from llama_index.core.indices.vector_store import VectorStoreIndex
 from llama_index.core.node_parser import SimpleNodeParser
 from llama_index.core.node_parser.interface import MetadataAwareTextSplitter
 from llama_index.core.schema import BaseNode
-from llama_index.legacy.vector_stores import PGVectorStore
+from tc_hivemind_backend import metrics
+from tc_hivemind_backend.db.checkpoint import IngestionCheckpoint
 from tc_hivemind_backend.db.credentials import load_postgres_credentials
-from tc_hivemind_backend.db.utils.delete_data import delete_data
+from tc_hivemind_backend.db.pg_partitioned_store import (
+    DocIndexedPGVectorStore,
+    PartitionedPGVectorStore,
+)
+from tc_hivemind_backend.db.utils.delete_data import (
+    DELETION_BATCH_SIZE,
+    DeletionProgress,
+    delete_data,
+    delete_pg_documents,
+)
 from tc_hivemind_backend.db.utils.model_hyperparams import load_model_hyperparams
+from tc_hivemind_backend.dedup import MinHashDeduplicator
 from tc_hivemind_backend.embeddings import CohereEmbedding
+from tc_hivemind_backend.profiling import profile_run, profile_stage
+from tc_hivemind_backend.run_report import IngestionReport, record_run
 
 
 class PGVectorAccess:
@@ -33,10 +47,20 @@ class PGVectorAccess:
             embed_model : BaseEmbedding
                 an embedding model to use for all tasks defined in this class
                 default is `CohereEmbedding`
+            community_id : str | None
+                if given, `dbname` is a database shared by all communities and
+                the data is kept in the community's partition of the table
+                (see `PartitionedPGVectorStore`). default is `None`, meaning
+                `dbname` is the community's own database
+            vector_type : str
+                for a shared database, the vector column type of a newly
+                created table, `vector` (default) or `halfvec`
         """
         self.table_name = table_name
         self.dbname = dbname
         self.testing = testing
+        self.community_id: str | None = kwargs.get("community_id")
+        self.vector_type: str = kwargs.get("vector_type", "vector")
         self.embed_model: BaseEmbedding = kwargs.get("embed_model", CohereEmbedding())
 
         if testing:
@@ -54,7 +78,20 @@ class PGVectorAccess:
         """
         postgres_creds = load_postgres_credentials()
 
-        vector_store = PGVectorStore.from_params(
+        if self.community_id is not None:
+            return PartitionedPGVectorStore.from_params(
+                community_id=self.community_id,
+                database=self.dbname,
+                host=postgres_creds["host"],
+                password=postgres_creds["password"],
+                port=postgres_creds["port"],
+                user=postgres_creds["user"],
+                table_name=self.table_name,
+                embed_dim=embed_dim,
+                vector_type=self.vector_type,
+            )
+
+        vector_store = DocIndexedPGVectorStore.from_params(
             database=self.dbname,
             host=postgres_creds["host"],
             password=postgres_creds["password"],
@@ -95,6 +132,10 @@ class PGVectorAccess:
                 get the node_parser
                 default is None, meaning it would use the default one on
                 `llama_index.core.Setting.node_parser`
+            deduplicator : MinHashDeduplicator | None
+                if given, the near-duplicate documents are dropped before
+                parsing them, the same instance should be used across batches
+                default is None, meaning no deduplication
         """
         msg = f"COMMUNITYID: {community_id} "
 
@@ -105,23 +146,33 @@ class PGVectorAccess:
         node_parser: MetadataAwareTextSplitter = kwargs.get(
             "node_parser", Settings.node_parser
         )
+        deduplicator: MinHashDeduplicator | None = kwargs.get("deduplicator")
 
-        nodes = node_parser.get_nodes_from_documents(documents)
-
-        for idx, node in enumerate(nodes):
-            self._process_embedding(
-                node,
-                idx,
-                len(nodes),
-                msg=msg,
-                max_request_per_day=max_request_per_day,
-                max_request_per_minute=max_request_per_minute,
-                batch_info=batch_info,
-            )
+        if deduplicator is not None:
+            with profile_stage("deduplicate"):
+                documents = deduplicator.deduplicate(documents)
 
-        vector_store = self.setup_pgvector_index(embed_dim)
-        storage_context = StorageContext.from_defaults(vector_store=vector_store)
-        self._save_embedded_documents(nodes, storage_context, node_parser, msg)
+        with profile_stage("node_parsing"), metrics.timer("hivemind_node_parsing"):
+            nodes = node_parser.get_nodes_from_documents(documents)
+        metrics.increment("hivemind_pipeline_documents_total", len(documents))
+        metrics.increment("hivemind_pipeline_nodes_total", len(nodes))
+
+        with profile_stage("embedding"):
+            for idx, node in enumerate(nodes):
+                self._process_embedding(
+                    node,
+                    idx,
+                    len(nodes),
+                    msg=msg,
+                    max_request_per_day=max_request_per_day,
+                    max_request_per_minute=max_request_per_minute,
+                    batch_info=batch_info,
+                )
+
+        with profile_stage("saving"):
+            vector_store = self.setup_pgvector_index(embed_dim)
+            storage_context = StorageContext.from_defaults(vector_store=vector_store)
+            self._save_embedded_documents(nodes, storage_context, node_parser, msg)
 
     def save_documents_in_batches(
         self,
@@ -129,7 +180,7 @@ class PGVectorAccess:
         documents: list[Document],
         batch_size: int = 100,
         **kwargs,
-    ):
+    ) -> IngestionReport:
         """
         save the documents in batches in postgresql database
 
@@ -153,27 +204,165 @@ class PGVectorAccess:
                 default is set to be 1024 which is open ai embedding dimension
             max_request_per_day : int
                 the maximum request count per day
+            deduplicator : MinHashDeduplicator | None
+                drops the near-duplicate documents of all batches
+                default is None, meaning no deduplication
             deletion_query : str
                 the query to delete some documents
+            deletion_params : tuple | dict | None
+                the parameters of `deletion_query`, i.e. the community id when
+                deleting from a table shared by communities
+            deletion_doc_ids : list[str] | None
+                the ids of the documents to delete before saving, deleted in
+                batches (see `delete_documents`), and removed from the index of
+                `deduplicator`
+            deletion_filters : dict[str, Any] | None
+                the metadata of the nodes to delete before saving
+            checkpoint : bool
+                if True, the progress is kept in redis (see
+                `IngestionCheckpoint`) and cleared once all batches are saved.
+                A run restarted after a crash skips the deletions and the
+                documents that were saved, and re-saves the documents of the
+                interrupted batch after deleting their nodes. default is False
+            profile : bool | None
+                if True, the run is profiled (see `tc_hivemind_backend.profiling`)
+                if `None`, the `HIVEMIND_PROFILE` env variable decides
+
+        Returns
+        ---------
+        report : IngestionReport
+            the throughput and cost figures of the run
         """
         msg = f"COMMUNITYID: {community_id} "
         logging.info(f"{msg}Starting embedding and saving batch job")
+        profile = kwargs.pop("profile", None)
+
+        with (
+            metrics.metric_labels(community_id=community_id, platform=self.table_name),
+            profile_run(
+                f"{self.table_name}_save_documents", community_id, profile=profile
+            ),
+            record_run(community_id, self.table_name, len(documents)) as report,
+        ):
+            checkpoint: IngestionCheckpoint | None = None
+            if kwargs.pop("checkpoint", False):
+                checkpoint = IngestionCheckpoint(
+                    community_id, self.table_name, "pgvector"
+                )
 
+            if checkpoint is None or not checkpoint.stage_done("deletion"):
+                self._run_deletions(msg, **kwargs)
+                if checkpoint is not None:
+                    checkpoint.mark_stage("deletion")
+            else:
+                logging.info(f"{msg}Deletions were done before the interruption!")
+
+            if checkpoint is not None:
+                documents = self._resume_documents(documents, checkpoint, msg)
+
+            for batch_idx, current_batch in enumerate(
+                range(0, len(documents), batch_size)
+            ):
+                batch_info = (
+                    f"{msg}Batch {batch_idx + 1}/{(len(documents) // batch_size) + 1}"
+                )
+                batch = documents[current_batch : current_batch + batch_size]
+                if checkpoint is not None:
+                    checkpoint.start_batch(batch)
+                self.save_documents(
+                    community_id,
+                    batch,
+                    batch_info=batch_info,
+                    **kwargs,
+                )
+                if checkpoint is not None:
+                    checkpoint.finish_batch(batch)
+
+            # all batches are committed
+            if checkpoint is not None:
+                checkpoint.clear()
+
+        return report
+
+    def _run_deletions(self, msg: str, **kwargs) -> None:
+        """
+        run the deletions requested before saving the documents
+        """
         deletion_query = kwargs.get("deletion_query", None)
+        deletion_params = kwargs.get("deletion_params", None)
         if deletion_query:
-            self._handle_deletion(deletion_query, msg)
+            with profile_stage("deletion"):
+                self._handle_deletion(deletion_query, msg, deletion_params)
+
+        deletion_doc_ids = kwargs.get("deletion_doc_ids")
+        deletion_filters = kwargs.get("deletion_filters")
+        if deletion_doc_ids or deletion_filters:
+            with profile_stage("deletion"):
+                logging.info(f"{msg}Deleting some previous data in database!")
+                self.delete_documents(
+                    doc_ids=deletion_doc_ids, metadata_filters=deletion_filters
+                )
+            deduplicator: MinHashDeduplicator | None = kwargs.get("deduplicator")
+            if deduplicator is not None and deletion_doc_ids:
+                deduplicator.remove(deletion_doc_ids)
+
+    def _resume_documents(
+        self, documents: list[Document], checkpoint: IngestionCheckpoint, msg: str
+    ) -> list[Document]:
+        """
+        the documents left to save after an interrupted run
 
-        for batch_idx, current_batch in enumerate(range(0, len(documents), batch_size)):
-            batch_info = (
-                f"{msg}Batch {batch_idx + 1}/{(len(documents) // batch_size) + 1}"
+        the nodes of the interrupted batch may be partially saved, so they
+        are deleted to be saved again
+        """
+        interrupted = checkpoint.interrupted()
+        if interrupted:
+            logging.warning(
+                f"{msg}{len(interrupted)} documents of an interrupted batch "
+                "will be saved again!"
             )
-            self.save_documents(
-                community_id,
-                documents[current_batch : current_batch + batch_size],
-                batch_info=batch_info,
-                **kwargs,
+            self.delete_documents(doc_ids=interrupted)
+            checkpoint.clear_interrupted()
+            metrics.increment(
+                "hivemind_checkpoint_recovered_documents_total", len(interrupted)
             )
 
+        completed = checkpoint.completed(documents)
+        if completed:
+            logging.info(f"{msg}Skipping {len(completed)} already saved documents!")
+            metrics.increment(
+                "hivemind_pipeline_documents_skipped_total", len(completed)
+            )
+        return [doc for doc in documents if doc.doc_id not in completed]
+
+    def delete_documents(
+        self,
+        doc_ids: list[str] | None = None,
+        metadata_filters: dict[str, Any] | None = None,
+        batch_size: int = DELETION_BATCH_SIZE,
+        progress: DeletionProgress | None = None,
+    ) -> int:
+        """
+        delete the nodes of documents by their ids or metadata, in batches
+
+        for a database shared by communities, only the community's nodes are
+        deleted. See `delete_pg_documents` for the parameters.
+
+        Returns
+        ---------
+        deleted : int
+            the number of deleted nodes
+        """
+        return delete_pg_documents(
+            dbname=self.dbname,
+            table_name=self.table_name,
+            doc_ids=doc_ids,
+            metadata_filters=metadata_filters,
+            community_id=self.community_id,
+            batch_size=batch_size,
+            progress=progress,
+        )
+
     def load_index(self, **kwargs) -> VectorStoreIndex:
         """
         load the llama_index.VectorStoreIndex
@@ -227,7 +416,9 @@ class PGVectorAccess:
             logging.info(f"{msg}Sleeping to avoid per minute rate limits!")
             time.sleep(61)
 
-    def _delete_documents(self, deletion_query: str) -> None:
+    def _delete_documents(
+        self, deletion_query: str, params: tuple | dict | None = None
+    ) -> None:
         """
         delete documents with specific ids
 
@@ -235,8 +426,15 @@ class PGVectorAccess:
         ------------
         deletion_query : str
             the query to delete the data
+        params : tuple | dict | None
+            the parameters of the query
         """
-        delete_data(deletion_query=deletion_query, dbname=self.dbname)
+        with metrics.timer(
+            "hivemind_vector_store_operation", backend="pgvector", operation="delete"
+        ):
+            delete_data(
+                deletion_query=deletion_query, dbname=self.dbname, params=params
+            )
 
     def _save_embedded_documents(
         self,
@@ -246,14 +444,25 @@ class PGVectorAccess:
         msg: str,
     ) -> None:
         logging.info(f"{msg}Saving the embedded documents within the database!")
-        _ = VectorStoreIndex(
-            nodes,
-            node_parser=node_parser,
-            storage_context=storage_context,
-            embed_model=self.embed_model,
+        with metrics.timer(
+            "hivemind_vector_store_operation", backend="pgvector", operation="add"
+        ):
+            _ = VectorStoreIndex(
+                nodes,
+                node_parser=node_parser,
+                storage_context=storage_context,
+                embed_model=self.embed_model,
+            )
+        metrics.increment(
+            "hivemind_vector_store_points_total",
+            len(nodes),
+            backend="pgvector",
+            operation="add",
         )
 
-    def _handle_deletion(self, deletion_query: str, msg: str) -> None:
+    def _handle_deletion(
+        self, deletion_query: str, msg: str, params: tuple | dict | None = None
+    ) -> None:
         if deletion_query:
             logging.info(f"{msg}Deleting some previous data in database!")
-            self._delete_documents(deletion_query)
+            self._delete_documents(deletion_query, params)
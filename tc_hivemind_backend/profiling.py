@@ -0,0 +1,231 @@
+"""
+opt-in profiling of ingestion runs
+
+a run is profiled if `profile=True` is passed to it, or if the
+`HIVEMIND_PROFILE` env variable is set to a true value (`1`, `true`, `yes`).
+The whole run is profiled with cProfile, and each stage marked with
+`profile_stage` records the top memory allocations made within it using
+tracemalloc. The results are written to
+`{HIVEMIND_PROFILE_DIR}/{community_id}_{run name}_{timestamp}/`
+(default directory is `profiles`).
+"""
+
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Iterator
+
+from dotenv import load_dotenv
+
+DEFAULT_PROFILE_DIR = "profiles"
+TRUE_VALUES = {"1", "true", "yes", "on"}
+
+_active: ContextVar["RunProfiler | None"] = ContextVar(
+    "hivemind_run_profiler", default=None
+)
+
+
+class RunProfiler:
+    def __init__(self, output_dir: str, top_n: int = 25) -> None:
+        """
+        profile a run with cProfile and record the memory allocations per stage
+
+        Parameters
+        ------------
+        output_dir : str
+            the directory to write the profiles into, created if not available
+        top_n : int
+            the number of functions and allocation lines to report
+        """
+        self.output_dir = output_dir
+        self.top_n = top_n
+        self.stages: dict[str, dict] = {}
+        self._profile = cProfile.Profile()
+        self._started_tracemalloc = False
+        # the peak memory of the entered stages, innermost last
+        self._peaks: list[int] = []
+
+    def start(self) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        self._profile.enable()
+
+    def stop(self) -> None:
+        """
+        stop profiling and write the results into the output directory
+        """
+        self._profile.disable()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._profile.dump_stats(os.path.join(self.output_dir, "cprofile.prof"))
+
+        stream = io.StringIO()
+        stats = pstats.Stats(self._profile, stream=stream)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top_n)
+        with open(os.path.join(self.output_dir, "cprofile.txt"), "w") as file:
+            file.write(stream.getvalue())
+
+        with open(os.path.join(self.output_dir, "stages.json"), "w") as file:
+            json.dump(self.stages, file, indent=2)
+
+        with open(os.path.join(self.output_dir, "memory.txt"), "w") as file:
+            file.write(self._render_memory())
+
+        logging.info(f"Profiles were written to {self.output_dir}")
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        record the time, peak traced memory and top allocations of a stage
+        a stage entered more than once (i.e. per batch) is accumulated
+        """
+        before = self._snapshot()
+        if self._peaks:
+            self._peaks[-1] = max(self._peaks[-1], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        self._peaks.append(0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            peak = max(self._peaks.pop(), tracemalloc.get_traced_memory()[1])
+            if self._peaks:
+                self._peaks[-1] = max(self._peaks[-1], peak)
+            after = self._snapshot()
+
+            stage = self.stages.setdefault(
+                name, {"calls": 0, "seconds": 0.0, "peak_bytes": 0, "allocations": {}}
+            )
+            stage["calls"] += 1
+            stage["seconds"] += seconds
+            stage["peak_bytes"] = max(stage["peak_bytes"], peak)
+
+            allocations = stage["allocations"]
+            for diff in after.compare_to(before, "lineno"):
+                if diff.size_diff == 0:
+                    continue
+                location = str(diff.traceback[0])
+                size, count = allocations.get(location, (0, 0))
+                allocations[location] = (
+                    size + diff.size_diff,
+                    count + diff.count_diff,
+                )
+
+            # keep the stages.json small, only the biggest allocations are kept
+            stage["allocations"] = dict(
+                sorted(allocations.items(), key=lambda item: -abs(item[1][0]))[
+                    : self.top_n
+                ]
+            )
+
+    def _snapshot(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(
+            [
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+            ]
+        )
+
+    def _render_memory(self) -> str:
+        lines = []
+        for name, stage in self.stages.items():
+            lines.append(
+                f"stage: {name} | calls: {stage['calls']} | "
+                f"seconds: {stage['seconds']:.3f} | "
+                f"peak traced memory: {stage['peak_bytes'] / 2**20:.1f} MiB"
+            )
+            for location, (size, count) in stage["allocations"].items():
+                lines.append(
+                    f"  {size / 2**10:+.1f} KiB ({count:+d} blocks) {location}"
+                )
+            lines.append("")
+        return "\n".join(lines)
+
+
+def is_profiling_enabled(profile: bool | None = None) -> bool:
+    """
+    whether a run should be profiled
+
+    Parameters
+    ------------
+    profile : bool | None
+        the run's own choice, if `None` the `HIVEMIND_PROFILE` env is used
+    """
+    if profile is not None:
+        return profile
+    load_dotenv()
+    return os.getenv("HIVEMIND_PROFILE", "").strip().lower() in TRUE_VALUES
+
+
+@contextmanager
+def profile_run(
+    name: str,
+    community_id: str,
+    profile: bool | None = None,
+    output_dir: str | None = None,
+) -> Iterator[RunProfiler | None]:
+    """
+    profile a run if profiling is enabled for it
+
+    runs nested within a profiled run are profiled by the outer one
+
+    Parameters
+    ------------
+    name : str
+        the run name, i.e. `run_pipeline`
+    community_id : str
+        the community the run belongs to
+    profile : bool | None
+        enable or disable profiling for this run
+        if `None` the `HIVEMIND_PROFILE` env variable decides
+    output_dir : str | None
+        the directory to create the run's profile directory in
+        if `None` the `HIVEMIND_PROFILE_DIR` env variable or `profiles` is used
+
+    Yields
+    --------
+    profiler : RunProfiler | None
+        the active profiler, `None` if the run is not profiled
+    """
+    if _active.get() is not None or not is_profiling_enabled(profile):
+        yield _active.get()
+        return
+
+    base_dir = output_dir or os.getenv("HIVEMIND_PROFILE_DIR", DEFAULT_PROFILE_DIR)
+    run_dir = os.path.join(
+        base_dir, f"{community_id}_{name}_{datetime.now():%Y%m%d-%H%M%S-%f}"
+    )
+    profiler = RunProfiler(output_dir=run_dir)
+    token = _active.set(profiler)
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        _active.reset(token)
+        profiler.stop()
+
+
+@contextmanager
+def profile_stage(name: str) -> Iterator[None]:
+    """
+    mark a stage of the profiled run, a no-op if no run is being profiled
+    """
+    profiler = _active.get()
+    if profiler is None:
+        yield
+        return
+
+    with profiler.stage(name):
+        yield
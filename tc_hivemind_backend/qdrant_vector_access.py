@@ -1,10 +1,413 @@
+import logging
+from typing import Any
+
 from llama_index.core import MockEmbedding
 from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import PrivateAttr
 from llama_index.core.indices.vector_store import VectorStoreIndex
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.types import (
+    VectorStoreQuery,
+    VectorStoreQueryResult,
+)
 from llama_index.vector_stores.qdrant import QdrantVectorStore
+from llama_index.vector_stores.qdrant.base import DENSE_VECTOR_NAME, SPARSE_VECTOR_NAME
+from qdrant_client import AsyncQdrantClient, QdrantClient
+from qdrant_client.http import models
+from qdrant_client.http.exceptions import UnexpectedResponse
+from tc_hivemind_backend import metrics
 from tc_hivemind_backend.db.qdrant import QdrantSingleton
+from tc_hivemind_backend.db.utils.delete_data import (
+    DELETION_BATCH_SIZE,
+    DeletionProgress,
+    delete_qdrant_documents,
+)
 from tc_hivemind_backend.embeddings import CohereEmbedding
 
+OPERATION_METRIC = "hivemind_vector_store_operation"
+POINTS_METRIC = "hivemind_vector_store_points_total"
+
+# vector compression -> the cohere embedding type to request for it
+VECTOR_COMPRESSIONS = {
+    # float32 vectors, the default
+    "none": "float",
+    # float16 vectors, 2x smaller
+    "float16": "float",
+    # cohere's uint8 embeddings stored as is, 4x smaller
+    "uint8": "uint8",
+    # float32 vectors on disk, int8 quantized ones in RAM (4x), float rescoring
+    "scalar": "float",
+    # float32 vectors on disk, binary quantized ones in RAM (32x), float rescoring
+    "binary": "float",
+}
+
+
+# the payload field the points of a shared (multi-tenant) collection are split by
+TENANT_FIELD = "community_id"
+
+
+def tenant_filter(
+    community_id: str, query_filter: models.Filter | None = None
+) -> models.Filter:
+    """
+    scope a qdrant filter to the points of one community
+
+    Parameters
+    ------------
+    community_id : str
+        the community (tenant) to scope the filter to
+    query_filter : qdrant_client.http.models.Filter | None
+        the filter to scope, if `None` only the community condition is used
+    """
+    condition = models.FieldCondition(
+        key=TENANT_FIELD, match=models.MatchValue(value=community_id)
+    )
+    if query_filter is None:
+        return models.Filter(must=[condition])
+    return models.Filter(must=[condition, query_filter])
+
+
+_TENANT_INDEX_PARAMS = {
+    "field_name": TENANT_FIELD,
+    "field_schema": models.KeywordIndexParams(
+        type=models.KeywordIndexType.KEYWORD, is_tenant=True
+    ),
+}
+
+
+def create_collection(
+    client: QdrantClient,
+    collection_name: str,
+    vectors_config: models.VectorParams | dict[str, models.VectorParams],
+    quantization_config: models.QuantizationConfig | None = None,
+    multi_tenant: bool = False,
+    sparse_vectors_config: dict[str, models.SparseVectorParams] | None = None,
+) -> None:
+    """
+    create a qdrant collection
+
+    a multi-tenant collection holds the points of many communities. The
+    `community_id` payload field gets a tenant index and the HNSW graph is only
+    built per community (`payload_m`), not over the whole collection (`m=0`),
+    so a community's search never has to walk the others' points.
+
+    Parameters
+    ------------
+    client : qdrant_client.QdrantClient
+        the qdrant client
+    collection_name : str
+        the collection to create
+    vectors_config : VectorParams | dict[str, VectorParams]
+        the collection's vectors config, named ones for a hybrid collection
+    quantization_config : qdrant_client.http.models.QuantizationConfig | None
+        the quantization of the collection, `None` if not quantized
+    multi_tenant : bool
+        if True, create the collection to be shared by communities
+    sparse_vectors_config : dict[str, SparseVectorParams] | None
+        the sparse vectors of a hybrid collection
+    """
+    client.create_collection(
+        collection_name=collection_name,
+        vectors_config=vectors_config,
+        sparse_vectors_config=sparse_vectors_config,
+        quantization_config=quantization_config,
+        hnsw_config=_hnsw_config(multi_tenant),
+    )
+    if multi_tenant:
+        client.create_payload_index(
+            collection_name=collection_name, **_TENANT_INDEX_PARAMS
+        )
+
+
+async def acreate_collection(
+    aclient: AsyncQdrantClient,
+    collection_name: str,
+    vectors_config: models.VectorParams | dict[str, models.VectorParams],
+    quantization_config: models.QuantizationConfig | None = None,
+    multi_tenant: bool = False,
+    sparse_vectors_config: dict[str, models.SparseVectorParams] | None = None,
+) -> None:
+    """
+    the async version of `create_collection`
+    """
+    await aclient.create_collection(
+        collection_name=collection_name,
+        vectors_config=vectors_config,
+        sparse_vectors_config=sparse_vectors_config,
+        quantization_config=quantization_config,
+        hnsw_config=_hnsw_config(multi_tenant),
+    )
+    if multi_tenant:
+        await aclient.create_payload_index(
+            collection_name=collection_name, **_TENANT_INDEX_PARAMS
+        )
+
+
+def _hnsw_config(multi_tenant: bool) -> models.HnswConfigDiff | None:
+    if multi_tenant:
+        return models.HnswConfigDiff(m=0, payload_m=16)
+    return None
+
+
+def vector_compression_config(
+    vector_compression: str,
+) -> tuple[dict[str, Any], models.QuantizationConfig | None]:
+    """
+    get the qdrant collection config of a vector compression
+
+    Parameters
+    ------------
+    vector_compression : str
+        one of `VECTOR_COMPRESSIONS`
+
+    Returns
+    ---------
+    vector_params : dict[str, Any]
+        the extra `VectorParams` of the collection's vectors
+    quantization_config : qdrant_client.http.models.QuantizationConfig | None
+        the quantization of the collection, `None` if not quantized
+    """
+    if vector_compression not in VECTOR_COMPRESSIONS:
+        raise ValueError(
+            f"Unsupported vector compression: {vector_compression}! "
+            f"supported ones are {list(VECTOR_COMPRESSIONS.keys())}"
+        )
+
+    if vector_compression == "float16":
+        return {"datatype": models.Datatype.FLOAT16}, None
+    elif vector_compression == "uint8":
+        return {"datatype": models.Datatype.UINT8}, None
+    elif vector_compression == "scalar":
+        quantization = models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8, quantile=0.99, always_ram=True
+            )
+        )
+        return {"on_disk": True}, quantization
+    elif vector_compression == "binary":
+        quantization = models.BinaryQuantization(
+            binary=models.BinaryQuantizationConfig(always_ram=True)
+        )
+        return {"on_disk": True}, quantization
+    return {}, None
+
+
+class MeteredQdrantVectorStore(QdrantVectorStore):
+    """
+    a `QdrantVectorStore` recording the latency and point count of its upserts,
+    deletions and queries
+
+    the collection is created with the given vector params and quantization, and
+    dense queries are sent with the given search params
+
+    if a `community_id` is given, the collection is shared by communities: the
+    points are added with the community id in their payload, and the queries and
+    deletions are scoped to the community's points
+    """
+
+    _vector_params: dict[str, Any] = PrivateAttr(default_factory=dict)
+    _quantization_config: models.QuantizationConfig | None = PrivateAttr(default=None)
+    _search_params: models.SearchParams | None = PrivateAttr(default=None)
+    _community_id: str | None = PrivateAttr(default=None)
+
+    def __init__(
+        self,
+        *args: Any,
+        vector_params: dict[str, Any] | None = None,
+        quantization_config: models.QuantizationConfig | None = None,
+        search_params: models.SearchParams | None = None,
+        community_id: str | None = None,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self._vector_params = vector_params or {}
+        self._quantization_config = quantization_config
+        self._search_params = search_params
+        self._community_id = community_id
+
+    @property
+    def community_id(self) -> str | None:
+        return self._community_id
+
+    def _create_collection(self, collection_name: str, vector_size: int) -> None:
+        try:
+            create_collection(
+                self._client,
+                collection_name=collection_name,
+                **self._collection_params(vector_size),
+            )
+        except (ValueError, UnexpectedResponse) as exp:
+            _skip_existing(collection_name, exp)
+        self._collection_initialized = True
+
+    async def _acreate_collection(self, collection_name: str, vector_size: int) -> None:
+        try:
+            await acreate_collection(
+                self._aclient,
+                collection_name=collection_name,
+                **self._collection_params(vector_size),
+            )
+        except (ValueError, UnexpectedResponse) as exp:
+            _skip_existing(collection_name, exp)
+        self._collection_initialized = True
+
+    def add(self, nodes: list[BaseNode], **add_kwargs: Any) -> list[str]:
+        self._stamp_tenant(nodes)
+        with metrics.timer(OPERATION_METRIC, backend="qdrant", operation="add"):
+            ids = super().add(nodes, **add_kwargs)
+        metrics.increment(POINTS_METRIC, len(nodes), backend="qdrant", operation="add")
+        return ids
+
+    async def async_add(self, nodes: list[BaseNode], **kwargs: Any) -> list[str]:
+        self._stamp_tenant(nodes)
+        with metrics.timer(OPERATION_METRIC, backend="qdrant", operation="add"):
+            if nodes and not await self._acollection_exists(self.collection_name):
+                await self._acreate_collection(
+                    collection_name=self.collection_name,
+                    vector_size=len(nodes[0].get_embedding()),
+                )
+            points, ids = self._build_points(nodes, await self.asparse_vector_name())
+            # `AsyncQdrantClient.upload_points` isn't awaitable in every
+            # qdrant-client version the inherited `async_add` is used with
+            for start in range(0, len(points), self.batch_size):
+                await self._aclient.upsert(
+                    collection_name=self.collection_name,
+                    points=points[start : start + self.batch_size],
+                    wait=True,
+                )
+        metrics.increment(POINTS_METRIC, len(nodes), backend="qdrant", operation="add")
+        return ids
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        with metrics.timer(OPERATION_METRIC, backend="qdrant", operation="delete"):
+            if self._community_id is None:
+                return super().delete(ref_doc_id, **delete_kwargs)
+
+            self._client.delete(
+                collection_name=self.collection_name,
+                points_selector=self._doc_filter(ref_doc_id),
+            )
+
+    async def adelete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        with metrics.timer(OPERATION_METRIC, backend="qdrant", operation="delete"):
+            if self._community_id is None:
+                return await super().adelete(ref_doc_id, **delete_kwargs)
+
+            await self._aclient.delete(
+                collection_name=self.collection_name,
+                points_selector=self._doc_filter(ref_doc_id),
+            )
+
+    def _build_query_filter(self, query: VectorStoreQuery) -> models.Filter | None:
+        query_filter = super()._build_query_filter(query)
+        if self._community_id is None:
+            return query_filter
+        return tenant_filter(self._community_id, query_filter)
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        self._scope_qdrant_filters(kwargs)
+        with metrics.timer(OPERATION_METRIC, backend="qdrant", operation="query"):
+            if self._search_params is None or self.enable_hybrid:
+                return super().query(query, **kwargs)
+
+            response = self._client.search(
+                collection_name=self.collection_name,
+                query_vector=query.query_embedding,
+                limit=query.similarity_top_k,
+                query_filter=self._query_filter(query, kwargs),
+                search_params=self._search_params,
+            )
+            return self.parse_to_query_result(response)
+
+    async def aquery(
+        self, query: VectorStoreQuery, **kwargs: Any
+    ) -> VectorStoreQueryResult:
+        self._scope_qdrant_filters(kwargs)
+        with metrics.timer(OPERATION_METRIC, backend="qdrant", operation="query"):
+            if self._search_params is None or self.enable_hybrid:
+                return await super().aquery(query, **kwargs)
+
+            response = await self._aclient.search(
+                collection_name=self.collection_name,
+                query_vector=query.query_embedding,
+                limit=query.similarity_top_k,
+                query_filter=self._query_filter(query, kwargs),
+                search_params=self._search_params,
+            )
+            return self.parse_to_query_result(response)
+
+    def _collection_params(self, vector_size: int) -> dict[str, Any]:
+        """
+        the `create_collection` parameters of the store's collection
+        """
+        vector_params = models.VectorParams(
+            size=vector_size, distance=models.Distance.COSINE, **self._vector_params
+        )
+        params: dict[str, Any] = {
+            "vectors_config": vector_params,
+            "quantization_config": self._quantization_config,
+            "multi_tenant": self._community_id is not None,
+        }
+        if self.enable_hybrid:
+            # the vector names the llama-index hybrid queries use
+            params["vectors_config"] = {DENSE_VECTOR_NAME: vector_params}
+            params["sparse_vectors_config"] = {
+                SPARSE_VECTOR_NAME: models.SparseVectorParams(
+                    index=models.SparseIndexParams()
+                )
+            }
+        return params
+
+    def _stamp_tenant(self, nodes: list[BaseNode]) -> None:
+        """
+        add the community id to the payload of the nodes of a shared collection
+        """
+        if self._community_id is None:
+            return
+        for node in nodes:
+            node.metadata[TENANT_FIELD] = self._community_id
+            if TENANT_FIELD not in node.excluded_embed_metadata_keys:
+                node.excluded_embed_metadata_keys.append(TENANT_FIELD)
+            if TENANT_FIELD not in node.excluded_llm_metadata_keys:
+                node.excluded_llm_metadata_keys.append(TENANT_FIELD)
+
+    def _doc_filter(self, ref_doc_id: str) -> models.Filter:
+        """
+        the filter of a document's points, within the community's ones
+        """
+        return tenant_filter(
+            self._community_id,
+            models.Filter(
+                must=[
+                    models.FieldCondition(
+                        key="doc_id", match=models.MatchValue(value=ref_doc_id)
+                    )
+                ]
+            ),
+        )
+
+    def _scope_qdrant_filters(self, kwargs: dict[str, Any]) -> None:
+        if self._community_id is not None and kwargs.get("qdrant_filters"):
+            kwargs["qdrant_filters"] = tenant_filter(
+                self._community_id, kwargs["qdrant_filters"]
+            )
+
+    def _query_filter(
+        self, query: VectorStoreQuery, kwargs: dict[str, Any]
+    ) -> models.Filter | None:
+        query_filter = kwargs.get("qdrant_filters")
+        if query_filter is None:
+            query_filter = self._build_query_filter(query)
+        return query_filter
+
+
+def _skip_existing(collection_name: str, exp: Exception) -> None:
+    if "already exists" not in str(exp):
+        raise exp
+    logging.warning(
+        f"Collection {collection_name} already exists, skipping its creation."
+    )
+
 
 class QDrantVectorAccess:
     def __init__(self, collection_name: str, testing: bool = False, **kwargs) -> None:
@@ -21,25 +424,91 @@ class QDrantVectorAccess:
             embed_model : BaseEmbedding
                 an embedding model to use for all tasks defined in this class
                 default is `CohereEmbedding`
+            vector_compression : str
+                how the vectors are stored, one of `VECTOR_COMPRESSIONS`
+                default is `none`. it is applied when the collection is created
+                `uint8` requests cohere's uint8 embeddings
+                `scalar` and `binary` keep the float vectors on disk and search
+                over the quantized ones held in RAM
+            rescore : bool
+                for `scalar` and `binary`, re-rank the results by the float
+                vectors at query time. default is True
+            oversampling : float
+                for `scalar` and `binary`, the factor of extra candidates to
+                fetch before rescoring. default is 2.0 for `binary` and 1.0 for
+                the others
+            community_id : str | None
+                if given, `collection_name` is a collection shared by
+                communities (i.e. one per platform) and the points are added,
+                queried and deleted for this community only. default is `None`
         """
         self.collection_name = collection_name
-        self.embed_model: BaseEmbedding = kwargs.get("embed_model", CohereEmbedding())
+        self.community_id: str | None = kwargs.get("community_id")
+        self.vector_compression: str = kwargs.get("vector_compression", "none")
+        self.vector_params, self.quantization_config = vector_compression_config(
+            self.vector_compression
+        )
+        self.search_params: models.SearchParams | None = None
+        if self.quantization_config is not None:
+            default_oversampling = 2.0 if self.vector_compression == "binary" else 1.0
+            self.search_params = models.SearchParams(
+                quantization=models.QuantizationSearchParams(
+                    rescore=kwargs.get("rescore", True),
+                    oversampling=kwargs.get("oversampling", default_oversampling),
+                )
+            )
+
+        embed_model = kwargs.get("embed_model")
+        if embed_model is None:
+            embed_model = CohereEmbedding(
+                embedding_type=VECTOR_COMPRESSIONS[self.vector_compression]
+            )
+        self.embed_model: BaseEmbedding = embed_model
 
         if testing:
             self.embed_model = MockEmbedding(embed_dim=1024)
 
     def setup_qdrant_vector_store(self) -> QdrantVectorStore:
         client = QdrantSingleton.get_instance().client
-        vector_store = QdrantVectorStore(
+        vector_store = MeteredQdrantVectorStore(
             client=client,
             collection_name=self.collection_name,
+            vector_params=self.vector_params,
+            quantization_config=self.quantization_config,
+            search_params=self.search_params,
+            community_id=self.community_id,
         )
         return vector_store
 
+    def delete_documents(
+        self,
+        doc_ids: list[str] | None = None,
+        metadata_filters: dict[str, Any] | None = None,
+        batch_size: int = DELETION_BATCH_SIZE,
+        progress: DeletionProgress | None = None,
+    ) -> int:
+        """
+        delete the points of documents by their ids or metadata, in batches
+
+        for a shared collection, only the community's points are deleted.
+        See `delete_qdrant_documents` for the parameters.
+        """
+        return delete_qdrant_documents(
+            QdrantSingleton.get_instance().client,
+            collection_name=self.collection_name,
+            doc_ids=doc_ids,
+            metadata_filters=metadata_filters,
+            community_id=self.community_id,
+            batch_size=batch_size,
+            progress=progress,
+        )
+
     def load_index(self, **kwargs) -> VectorStoreIndex:
         """
         load the llama_index.VectorStoreIndex
 
+        for a shared collection, the index only retrieves the community's points
+
         Parameters
         -----------
         **kwargs :
@@ -0,0 +1,152 @@
+import json
+import logging
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+from tc_hivemind_backend import metrics
+
+# report stage -> (timer metric, labels to filter its series with)
+STAGE_METRICS: dict[str, tuple[str, dict[str, str]]] = {
+    "setup": ("hivemind_pipeline_setup_seconds", {}),
+    "pipeline": ("hivemind_pipeline_run_seconds", {}),
+    "node_parsing": ("hivemind_node_parsing_seconds", {}),
+    "preprocess": ("hivemind_preprocess_seconds", {}),
+    "embedding_requests": ("hivemind_embedding_request_seconds", {}),
+    "vector_store": ("hivemind_vector_store_operation_seconds", {}),
+    "docstore": ("hivemind_kvstore_operation_seconds", {"backend": "mongo"}),
+    "cache": ("hivemind_kvstore_operation_seconds", {"backend": "redis"}),
+}
+
+
+class IngestionReport:
+    def __init__(self, community_id: str, platform: str, documents_in: int) -> None:
+        """
+        the throughput and cost figures of one ingestion run
+
+        Parameters
+        ------------
+        community_id : str
+            the community the documents belong to
+        platform : str
+            the platform (collection or table) the documents were ingested into
+        documents_in : int
+            the number of documents given to the run
+        """
+        self.community_id = community_id
+        self.platform = platform
+        self.documents_in = documents_in
+        self.documents_skipped = 0
+        self.documents_deleted = 0
+        self.nodes = 0
+        self.embedding_requests = 0
+        self.embedding_texts = 0
+        self.embedding_tokens = 0
+        self.cache_lookups = 0
+        self.cache_hits = 0
+        self.upserted_points = 0
+        self.seconds = 0.0
+        self.stage_seconds: dict[str, float] = {}
+        self.peak_rss_bytes = 0
+
+    @property
+    def documents_processed(self) -> int:
+        return self.documents_in - self.documents_skipped
+
+    def update_from_metrics(self, sink: metrics.InMemorySink) -> None:
+        """
+        fill the report with the metrics collected during the run
+        """
+        self.documents_skipped = int(
+            sink.get_counter("hivemind_pipeline_documents_skipped_total")
+        )
+        self.documents_deleted = int(
+            sink.get_counter("hivemind_pipeline_documents_deleted_total")
+        )
+        self.nodes = int(sink.get_counter("hivemind_pipeline_nodes_total"))
+        self.embedding_requests = sink.get_summary(
+            "hivemind_embedding_request_seconds"
+        )["count"]
+        self.embedding_texts = int(sink.get_counter("hivemind_embedding_texts_total"))
+        self.embedding_tokens = int(sink.get_counter("hivemind_embedding_tokens_total"))
+        self.cache_lookups = sink.get_summary(
+            "hivemind_kvstore_operation_seconds", backend="redis", operation="get"
+        )["count"]
+        self.cache_hits = int(
+            sink.get_counter(
+                "hivemind_kvstore_keys_total", backend="redis", operation="get"
+            )
+        )
+        self.upserted_points = int(
+            sink.get_counter("hivemind_vector_store_points_total", operation="add")
+        )
+        self.stage_seconds = {
+            stage: round(sink.get_summary(name, **labels)["sum"], 4)
+            for stage, (name, labels) in STAGE_METRICS.items()
+            if sink.get_summary(name, **labels)["count"]
+        }
+
+    def to_dict(self) -> dict[str, Any]:
+        processed = self.documents_processed
+        return {
+            "community_id": self.community_id,
+            "platform": self.platform,
+            "documents_in": self.documents_in,
+            "documents_skipped": self.documents_skipped,
+            "documents_deleted": self.documents_deleted,
+            "nodes": self.nodes,
+            "embedding_requests": self.embedding_requests,
+            "embedding_texts": self.embedding_texts,
+            "embedding_tokens": self.embedding_tokens,
+            "cache_lookups": self.cache_lookups,
+            "cache_hits": self.cache_hits,
+            "upserted_points": self.upserted_points,
+            "seconds": round(self.seconds, 4),
+            "stage_seconds": self.stage_seconds,
+            "peak_rss_bytes": self.peak_rss_bytes,
+            "documents_per_second": (
+                round(processed / self.seconds, 2) if self.seconds else 0.0
+            ),
+            "tokens_per_document": (
+                round(self.embedding_tokens / processed, 2) if processed else 0.0
+            ),
+            "seconds_per_document": (
+                round(self.seconds / processed, 4) if processed else 0.0
+            ),
+        }
+
+    def __repr__(self) -> str:
+        return f"IngestionReport({self.to_dict()})"
+
+
+def peak_rss_bytes() -> int:
+    """
+    the peak resident memory of the process so far
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes while macOS reports bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+@contextmanager
+def record_run(
+    community_id: str, platform: str, documents_in: int
+) -> Iterator[IngestionReport]:
+    """
+    collect the metrics of an ingestion run into an `IngestionReport`
+
+    the report is filled when the block exits, then logged as JSON
+    """
+    report = IngestionReport(
+        community_id=community_id, platform=platform, documents_in=documents_in
+    )
+    start = time.perf_counter()
+    with metrics.collect() as sink:
+        yield report
+
+    report.seconds = time.perf_counter() - start
+    report.update_from_metrics(sink)
+    report.peak_rss_bytes = peak_rss_bytes()
+    logging.info(f"Ingestion report: {json.dumps(report.to_dict())}")
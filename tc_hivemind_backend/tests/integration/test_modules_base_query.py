@@ -10,6 +10,7 @@ class TestModulesBaseQuery(TestCase):
     def setUp(self) -> None:
         self.client = MongoSingleton.get_instance().get_client()
         self.client["Core"].drop_collection("modules")
+        ModulesBase.invalidate_cache()
 
         # Create sample modules for testing
         self.community_id1 = ObjectId("6579c364f1120850414e0dc5")
@@ -0,0 +1,169 @@
+import unittest
+
+import psycopg2
+from llama_index.core.schema import NodeRelationship, RelatedNodeInfo, TextNode
+from llama_index.core.vector_stores.types import (
+    VectorStoreQuery,
+    VectorStoreQueryMode,
+)
+from tc_hivemind_backend.db.credentials import load_postgres_credentials
+from tc_hivemind_backend.db.pg_db_utils import setup_db
+from tc_hivemind_backend.db.pg_partitioned_store import (
+    PartitionedPGVectorStore,
+    dispose_engines,
+    partition_name,
+)
+from tc_hivemind_backend.db.utils.delete_data import delete_data
+from tc_hivemind_backend.pg_vector_access import PGVectorAccess
+
+
+class TestPartitionedPGVectorStore(unittest.TestCase):
+    def setUp(self):
+        self.dbname = "hivemind_shared"
+        self.table = "discord"
+        setup_db(community_id="shared", dbname=self.dbname)
+        creds = load_postgres_credentials()
+        self.postgres_conn = psycopg2.connect(
+            dbname=self.dbname,
+            user=creds["user"],
+            password=creds["password"],
+            host=creds["host"],
+            port=creds["port"],
+        )
+        self.postgres_conn.autocommit = True
+        with self.postgres_conn.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS data_{self.table} CASCADE;")
+        dispose_engines()
+
+    def tearDown(self):
+        self.postgres_conn.close()
+        dispose_engines()
+
+    def _vector_store(self, community_id: str) -> PartitionedPGVectorStore:
+        return PGVectorAccess(
+            table_name=self.table,
+            dbname=self.dbname,
+            testing=True,
+            community_id=community_id,
+        ).setup_pgvector_index(embed_dim=3)
+
+    def _nodes(self, prefix: str) -> list[TextNode]:
+        return [
+            TextNode(
+                text=f"{prefix} text {idx}",
+                embedding=[float(idx + 1), 1.0, 0.5],
+                metadata={"date": f"2023-08-0{idx + 1}"},
+                relationships={
+                    NodeRelationship.SOURCE: RelatedNodeInfo(node_id=f"doc-{idx}")
+                },
+            )
+            for idx in range(3)
+        ]
+
+    def _query(self, vector_store: PartitionedPGVectorStore) -> list[str]:
+        result = vector_store.query(
+            VectorStoreQuery(query_embedding=[1.0, 1.0, 0.5], similarity_top_k=10)
+        )
+        return sorted(node.get_content() for node in result.nodes)
+
+    def test_partitions_created(self):
+        self._vector_store("1234").add(self._nodes("first"))
+        self._vector_store("5678").add(self._nodes("second"))
+
+        with self.postgres_conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT inhrelid::regclass::text FROM pg_inherits "
+                "WHERE inhparent = %s::regclass ORDER BY 1;",
+                (f"data_{self.table}",),
+            )
+            partitions = [row[0] for row in cursor.fetchall()]
+        self.assertEqual(
+            partitions,
+            [partition_name(self.table, "1234"), partition_name(self.table, "5678")],
+        )
+
+    def test_queries_and_deletions_are_scoped(self):
+        first = self._vector_store("1234")
+        second = self._vector_store("5678")
+        first.add(self._nodes("first"))
+        second.add(self._nodes("second"))
+
+        self.assertEqual(
+            self._query(first), ["first text 0", "first text 1", "first text 2"]
+        )
+        # both communities have a `doc-0` document
+        second.delete("doc-0")
+        self.assertEqual(self._query(second), ["second text 1", "second text 2"])
+        self.assertEqual(len(self._query(first)), 3)
+
+    def test_delete_data_and_latest_date(self):
+        self._vector_store("1234").add(self._nodes("first"))
+        self._vector_store("5678").add(self._nodes("second")[:1])
+
+        delete_data(
+            deletion_query=(
+                f"DELETE FROM data_{self.table} WHERE community_id = %s "
+                "AND (metadata_->>'date') = '2023-08-03';"
+            ),
+            dbname=self.dbname,
+            params=("1234",),
+        )
+        latest_date = setup_db(
+            community_id="1234",
+            dbname=self.dbname,
+            latest_date_query=(
+                f"SELECT MAX((metadata_->>'date')::timestamp) FROM data_{self.table} "
+                "WHERE community_id = %s;"
+            ),
+            latest_date_params=("1234",),
+        )
+        self.assertEqual(latest_date.strftime("%Y-%m-%d"), "2023-08-02")
+
+    def test_sparse_queries_are_scoped(self):
+        creds = load_postgres_credentials()
+        stores = [
+            PartitionedPGVectorStore.from_params(
+                community_id=community_id,
+                database=self.dbname,
+                table_name=self.table,
+                embed_dim=3,
+                hybrid_search=True,
+                host=creds["host"],
+                port=creds["port"],
+                user=creds["user"],
+                password=creds["password"],
+            )
+            for community_id in ("1234", "5678")
+        ]
+        stores[0].add(self._nodes("first"))
+        stores[1].add(self._nodes("second"))
+
+        result = stores[0].query(
+            VectorStoreQuery(
+                query_str="text",
+                mode=VectorStoreQueryMode.SPARSE,
+                similarity_top_k=10,
+            )
+        )
+        self.assertEqual(
+            sorted(node.get_content() for node in result.nodes),
+            ["first text 0", "first text 1", "first text 2"],
+        )
+
+    def test_sparse_query_without_hybrid_search(self):
+        vector_store = self._vector_store("1234")
+        with self.assertRaises(ValueError):
+            vector_store.query(
+                VectorStoreQuery(query_str="text", mode=VectorStoreQueryMode.SPARSE)
+            )
+
+    def test_stores_share_engine(self):
+        first = self._vector_store("1234")
+        second = self._vector_store("5678")
+        first.add(self._nodes("first"))
+        second.add(self._nodes("second"))
+        self.assertIs(first.client, second.client)
+
+    def test_invalid_community_id(self):
+        with self.assertRaises(ValueError):
+            self._vector_store("1234; DROP TABLE users")
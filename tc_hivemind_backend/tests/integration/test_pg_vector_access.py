@@ -84,6 +84,20 @@ class TestPGVectorAccess(unittest.TestCase):
 
         cursor.close()
 
+    def test_doc_id_index_created(self):
+        table = "discord"
+        dbname = "guild_1234"
+
+        self._create_and_save_doc(table, dbname)
+        cursor = self.postgres_conn.cursor()
+        cursor.execute(
+            "SELECT indexdef FROM pg_indexes WHERE indexname = %s;",
+            (f"data_{table}_doc_id_idx",),
+        )
+        (indexdef,) = cursor.fetchone()
+        self.assertIn("doc_id", indexdef)
+        cursor.close()
+
     def test_load_index(self):
         table = "discord"
         guild_id = "1234"
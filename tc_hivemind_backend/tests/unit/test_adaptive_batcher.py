@@ -0,0 +1,177 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from cohere.error import CohereAPIError, CohereConnectionError
+from llama_index.core import Document, MockEmbedding
+from llama_index.core.storage.docstore import SimpleDocumentStore
+from llama_index.core.vector_stores import SimpleVectorStore
+from tc_hivemind_backend.embeddings import (
+    AdaptiveBatcher,
+    CohereEmbedding,
+    EmbeddingError,
+)
+from tc_hivemind_backend.embeddings.adaptive_batcher import (
+    is_input_error,
+    is_retryable,
+)
+
+
+class FakeEmbedder:
+    """
+    embeds a text as `[len(text)]`, failing as configured
+    """
+
+    def __init__(self, bad_texts=(), fail_truncated=False, transient_errors=()):
+        self.bad_texts = set(bad_texts)
+        self.fail_truncated = fail_truncated
+        self.transient_errors = list(transient_errors)
+        self.calls: list[tuple[list[str], str | None]] = []
+
+    def __call__(self, texts, truncate):
+        self.calls.append((list(texts), truncate))
+        if self.transient_errors:
+            raise self.transient_errors.pop(0)
+        bad = self.bad_texts.intersection(texts)
+        if bad and (truncate is None or self.fail_truncated):
+            raise CohereAPIError("invalid input", http_status=400)
+        return [[float(len(text))] for text in texts]
+
+
+class TestAdaptiveBatcher(unittest.TestCase):
+    def setUp(self):
+        self.sleep = MagicMock()
+
+    def test_grows_while_healthy(self):
+        batcher = AdaptiveBatcher(
+            initial_batch_size=2, max_batch_size=6, grow_step=2, sleep=self.sleep
+        )
+        embedder = FakeEmbedder()
+        texts = [f"text {'x' * idx}" for idx in range(12)]
+
+        embeddings = batcher.embed(texts, embedder)
+
+        self.assertEqual(embeddings, [[float(len(text))] for text in texts])
+        self.assertEqual([len(call[0]) for call in embedder.calls], [2, 4, 6])
+        self.assertEqual(batcher.batch_size, 6)
+        self.sleep.assert_not_called()
+
+    def test_shrinks_and_retries_on_rate_limit(self):
+        batcher = AdaptiveBatcher(initial_batch_size=8, grow_step=0, sleep=self.sleep)
+        embedder = FakeEmbedder(
+            transient_errors=[
+                CohereAPIError("too many requests", http_status=429),
+                CohereConnectionError("connection reset"),
+            ]
+        )
+        texts = [str(idx) for idx in range(8)]
+
+        embeddings = batcher.embed(texts, embedder)
+
+        self.assertEqual(len(embeddings), 8)
+        self.assertEqual(self.sleep.call_count, 2)
+        self.assertEqual([len(call[0]) for call in embedder.calls], [8, 4, 2, 2, 2, 2])
+        self.assertEqual(batcher.batch_size, 2)
+
+    def test_raises_after_max_retries(self):
+        batcher = AdaptiveBatcher(max_retries=2, sleep=self.sleep)
+        embedder = FakeEmbedder(
+            transient_errors=[CohereAPIError("unavailable", http_status=503)] * 3
+        )
+
+        with self.assertRaises(CohereAPIError):
+            batcher.embed(["a", "b"], embedder)
+        self.assertEqual(self.sleep.call_count, 2)
+
+    def test_bisects_and_truncates_bad_input(self):
+        batcher = AdaptiveBatcher(initial_batch_size=8, sleep=self.sleep)
+        embedder = FakeEmbedder(bad_texts={"bad"})
+        texts = ["a", "bb", "ccc", "bad", "eeeee", "ffffff"]
+
+        embeddings = batcher.embed(texts, embedder)
+
+        self.assertEqual(embeddings, [[float(len(text))] for text in texts])
+        self.assertIn((["bad"], "END"), embedder.calls)
+        self.sleep.assert_not_called()
+
+    def test_error_for_failed_input(self):
+        batcher = AdaptiveBatcher(sleep=self.sleep)
+        embedder = FakeEmbedder(bad_texts={"bad"}, fail_truncated=True)
+
+        with self.assertRaises(EmbeddingError) as context:
+            batcher.embed(["a", "bad", "ccc"], embedder)
+        self.assertEqual(context.exception.failed, [1])
+        self.assertEqual(context.exception.embeddings, [[1.0], None, [3.0]])
+
+    def test_other_errors_not_bisected(self):
+        batcher = AdaptiveBatcher(initial_batch_size=8, sleep=self.sleep)
+        for error in [
+            CohereAPIError("invalid api token", http_status=401),
+            ValueError("1 embeddings were returned for 2 texts!"),
+        ]:
+            embedder = FakeEmbedder(transient_errors=[error])
+            with self.assertRaises(type(error)):
+                batcher.embed(["a", "b"], embedder)
+            self.assertEqual(len(embedder.calls), 1)
+
+    def test_is_input_error(self):
+        self.assertTrue(is_input_error(CohereAPIError("too long", http_status=400)))
+        self.assertTrue(is_input_error(CohereAPIError("invalid", http_status=422)))
+        self.assertFalse(is_input_error(CohereAPIError("token", http_status=401)))
+        self.assertFalse(is_input_error(ValueError("bad response")))
+
+    def test_is_retryable(self):
+        self.assertTrue(is_retryable(CohereAPIError("limit", http_status=429)))
+        self.assertTrue(is_retryable(CohereAPIError("server", http_status=502)))
+        self.assertTrue(is_retryable(CohereConnectionError("timeout")))
+        self.assertFalse(is_retryable(CohereAPIError("too long", http_status=400)))
+        self.assertFalse(is_retryable(ValueError("bad response")))
+
+
+class TestCohereEmbeddingClient(unittest.TestCase):
+    def test_client_is_created_once(self):
+        client = MagicMock()
+        client.embed.side_effect = lambda texts, **kwargs: MagicMock(
+            embeddings=[[0.1] for _ in texts], meta={}
+        )
+        embed_model = CohereEmbedding()
+        with (
+            patch.object(
+                CohereEmbedding, "prepare_cohere", return_value=client
+            ) as prepare_cohere,
+            patch.object(CohereEmbedding, "_clean_text", side_effect=lambda t, p: t),
+        ):
+            embed_model.get_text_embedding(text="first")
+            embed_model.get_text_embedding(texts=["second", "third"])
+
+        prepare_cohere.assert_called_once()
+        self.assertEqual(client.embed.call_count, 2)
+
+
+class FailingEmbedding(MockEmbedding):
+    def _get_text_embeddings(self, texts: list[str]) -> list[list[float]]:
+        raise EmbeddingError([0], [None] * len(texts))
+
+
+class TestFailedEmbeddingRun(unittest.TestCase):
+    def test_failed_documents_ingested_again(self):
+        from tc_hivemind_backend.ingest_qdrant import MeteredIngestionPipeline
+
+        docstore = SimpleDocumentStore()
+        docs = [Document(id_="doc-0", text="text")]
+        vector_store = SimpleVectorStore()
+        pipeline = MeteredIngestionPipeline(
+            transformations=[FailingEmbedding(embed_dim=2)],
+            docstore=docstore,
+            vector_store=vector_store,
+        )
+        with self.assertRaises(EmbeddingError):
+            pipeline.run(documents=docs)
+        self.assertIsNone(docstore.get_document_hash("doc-0"))
+
+        pipeline = MeteredIngestionPipeline(
+            transformations=[MockEmbedding(embed_dim=2)],
+            docstore=docstore,
+            vector_store=vector_store,
+        )
+        self.assertEqual(len(pipeline.run(documents=docs)), 1)
+        self.assertIsNotNone(docstore.get_document_hash("doc-0"))
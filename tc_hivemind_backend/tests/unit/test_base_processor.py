@@ -2,13 +2,18 @@ import unittest
 from unittest.mock import patch
 
 import spacy
-from tc_hivemind_backend.db.utils.preprocess_text import BasePreprocessor
+from tc_hivemind_backend.db.utils.preprocess_text import (
+    BasePreprocessor,
+    CleaningMemo,
+    load_spacy_model,
+)
 
 
 class TestBasePreprocessor(unittest.TestCase):
     def setUp(self):
         """Set up test fixtures before each test method."""
-        self.preprocessor = BasePreprocessor()
+        load_spacy_model.cache_clear()
+        self.preprocessor = BasePreprocessor(memo=CleaningMemo())
 
     # Tests for extract_main_content method
     @unittest.skipIf(
@@ -0,0 +1,92 @@
+import hashlib
+import unittest
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.node_parser import SemanticSplitterNodeParser
+from llama_index.core.schema import Document
+from tc_hivemind_backend.node_parsers import BatchedSemanticSplitterNodeParser
+from tc_hivemind_backend.node_parsers.semantic import adjacent_cosine_distances
+
+
+class HashEmbedding(BaseEmbedding):
+    """a deterministic embedding depending on the text"""
+
+    calls: list[int] = []
+
+    def _embed(self, text: str) -> list[float]:
+        seed = int(hashlib.md5(text.encode()).hexdigest()[:8], 16)
+        return np.random.default_rng(seed).standard_normal(8).tolist()
+
+    def _get_text_embedding(self, text: str) -> list[float]:
+        return self._embed(text)
+
+    def _get_text_embeddings(self, texts: list[str]) -> list[list[float]]:
+        self.calls.append(len(texts))
+        return [self._embed(text) for text in texts]
+
+    def _get_query_embedding(self, query: str) -> list[float]:
+        return self._embed(query)
+
+    async def _aget_query_embedding(self, query: str) -> list[float]:
+        return self._embed(query)
+
+
+def split_sentences(text: str) -> list[str]:
+    return [f"{sentence}. " for sentence in text.split(". ") if sentence]
+
+
+class TestBatchedSemanticSplitter(unittest.TestCase):
+    def setUp(self):
+        self.embed_model = HashEmbedding(embed_batch_size=1000)
+        self.embed_model.calls = []
+        self.docs = [
+            Document(
+                id_=f"doc_{idx}",
+                text=". ".join(
+                    f"sentence {num} of document {idx}" for num in range(idx * 7)
+                ),
+            )
+            for idx in range(6)
+        ]
+
+    def parser(self, **kwargs) -> BatchedSemanticSplitterNodeParser:
+        return BatchedSemanticSplitterNodeParser(
+            embed_model=self.embed_model, sentence_splitter=split_sentences, **kwargs
+        )
+
+    def test_same_nodes_as_semantic_splitter(self):
+        for buffer_size in (1, 2):
+            for percentile in (50, 80, 95):
+                expected = SemanticSplitterNodeParser(
+                    embed_model=self.embed_model,
+                    sentence_splitter=split_sentences,
+                    buffer_size=buffer_size,
+                    breakpoint_percentile_threshold=percentile,
+                ).get_nodes_from_documents(self.docs)
+                nodes = self.parser(
+                    buffer_size=buffer_size,
+                    breakpoint_percentile_threshold=percentile,
+                ).get_nodes_from_documents(self.docs)
+
+                self.assertEqual(
+                    [(node.ref_doc_id, node.text) for node in nodes],
+                    [(node.ref_doc_id, node.text) for node in expected],
+                )
+
+    def test_documents_embedded_together(self):
+        self.parser().get_nodes_from_documents(self.docs)
+        # 0 + 7 + 14 + 21 + 28 + 35 sentence groups in one call
+        self.assertEqual(self.embed_model.calls, [105])
+
+    def test_max_batch_sentences(self):
+        self.parser(max_batch_sentences=40).get_nodes_from_documents(self.docs)
+        # a document is never split across calls, even if longer than the limit
+        self.assertEqual(self.embed_model.calls, [21, 21, 28, 35])
+
+    def test_adjacent_cosine_distances(self):
+        embeddings = np.array([[1.0, 0.0], [0.0, 2.0], [0.0, 1.0], [0.0, 0.0]])
+        np.testing.assert_allclose(
+            adjacent_cosine_distances(embeddings), [1.0, 0.0, 1.0]
+        )
+        self.assertEqual(len(adjacent_cosine_distances(embeddings[:1])), 0)
@@ -0,0 +1,128 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from cohere.error import CohereAPIError
+from llama_index.core.schema import TextNode
+from tc_hivemind_backend import metrics
+from tc_hivemind_backend.embeddings import EmbeddingError
+from tc_hivemind_backend.embeddings.cohere import CohereEmbedding
+
+
+def embed_response(texts: list[str], **kwargs) -> MagicMock:
+    return MagicMock(
+        embeddings=[[float(len(text)), 1.0] for text in texts],
+        meta={},
+    )
+
+
+class TestCohereEmbeddingDedup(unittest.TestCase):
+    def setUp(self):
+        self.client = MagicMock()
+        self.client.embed.side_effect = embed_response
+        self.patches = [
+            patch.object(CohereEmbedding, "prepare_cohere", return_value=self.client),
+            patch.object(CohereEmbedding, "_clean_text", side_effect=lambda t, p: t),
+        ]
+        for item in self.patches:
+            item.start()
+
+    def tearDown(self):
+        for item in self.patches:
+            item.stop()
+
+    def sent_texts(self) -> list[list[str]]:
+        return [call.kwargs["texts"] for call in self.client.embed.call_args_list]
+
+    def test_duplicates_within_a_call(self):
+        embed_model = CohereEmbedding()
+        with metrics.collect() as sink:
+            embeddings = embed_model.get_text_embedding(
+                texts=["thanks!", "hello there", "thanks!", "thanks!"]
+            )
+
+        self.assertEqual(self.sent_texts(), [["thanks!", "hello there"]])
+        self.assertEqual(embeddings, [[7.0, 1.0], [11.0, 1.0], [7.0, 1.0], [7.0, 1.0]])
+        # the copies don't share one list
+        self.assertIsNot(embeddings[0], embeddings[2])
+        self.assertEqual(
+            sink.get_counter("hivemind_embedding_deduplicated_texts_total"), 2
+        )
+
+    def test_duplicates_across_calls(self):
+        embed_model = CohereEmbedding()
+        embed_model.get_text_embedding(texts=["thanks!", "hello there"])
+        embeddings = embed_model.get_text_embedding(texts=["thanks!", "new one"])
+
+        self.assertEqual(self.sent_texts(), [["thanks!", "hello there"], ["new one"]])
+        self.assertEqual(embeddings, [[7.0, 1.0], [7.0, 1.0]])
+
+    def test_memo_size(self):
+        embed_model = CohereEmbedding(memo_size=1)
+        embed_model.get_text_embedding(texts=["first", "second"])
+        embed_model.get_text_embedding(texts=["first", "second"])
+
+        # only the last embedded text is remembered
+        self.assertEqual(self.sent_texts(), [["first", "second"], ["first"]])
+
+    def test_memo_max_bytes(self):
+        # two float32 values per embedding, 8 bytes
+        embed_model = CohereEmbedding(memo_max_bytes=12)
+        embed_model.get_text_embedding(texts=["first", "second"])
+        embeddings = embed_model.get_text_embedding(texts=["first", "second"])
+
+        self.assertEqual(self.sent_texts(), [["first", "second"], ["first"]])
+        # remembered as float32 arrays, given back as lists
+        self.assertEqual(embeddings, [[5.0, 1.0], [6.0, 1.0]])
+        self.assertIsInstance(embeddings[1], list)
+        self.assertEqual(embed_model._memo_bytes, 8)
+
+    def test_memo_disabled(self):
+        embed_model = CohereEmbedding(memo_size=0)
+        embed_model.get_text_embedding(texts=["first", "first"])
+        embed_model.get_text_embedding(text="first")
+
+        self.assertEqual(self.sent_texts(), [["first"], ["first"]])
+
+    def test_clear_memo(self):
+        embed_model = CohereEmbedding()
+        embed_model.get_text_embedding(text="first")
+        embed_model.clear_memo()
+        embed_model.get_text_embedding(text="first")
+
+        self.assertEqual(self.sent_texts(), [["first"], ["first"]])
+
+    def test_failed_texts_not_remembered(self):
+        def embed(texts, **kwargs):
+            if "bad" in texts:
+                raise CohereAPIError("invalid input", http_status=400)
+            return embed_response(texts)
+
+        self.client.embed.side_effect = embed
+        embed_model = CohereEmbedding()
+        with self.assertRaises(EmbeddingError):
+            embed_model.get_text_embedding(texts=["first", "bad"])
+        self.client.embed.reset_mock()
+
+        # the embedded text is remembered, the failed one is sent again
+        embed_model.get_text_embedding(text="first")
+        self.assertEqual(self.sent_texts(), [])
+        with self.assertRaises(EmbeddingError):
+            embed_model.get_text_embedding(text="bad")
+        self.assertNotEqual(self.sent_texts(), [])
+
+    def test_failed_nodes_dropped(self):
+        def embed(texts, **kwargs):
+            if "bad" in texts:
+                raise CohereAPIError("invalid input", http_status=400)
+            return embed_response(texts)
+
+        self.client.embed.side_effect = embed
+        embed_model = CohereEmbedding(embed_batch_size=2)
+        nodes = [TextNode(text=text) for text in ["first", "bad", "third"]]
+        with metrics.collect() as sink:
+            embedded = embed_model(nodes)
+
+        self.assertEqual([node.text for node in embedded], ["first", "third"])
+        self.assertEqual(embedded[1].embedding, [5.0, 1.0])
+        self.assertIsNone(nodes[1].embedding)
+        self.assertEqual(sink.get_counter("hivemind_embedding_dropped_nodes_total"), 1)
@@ -0,0 +1,165 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+from tc_hivemind_backend import metrics
+from tc_hivemind_backend.db.utils.delete_data import (
+    _filter_values,
+    delete_pg_documents,
+    delete_qdrant_documents,
+)
+
+
+class TestDeletePGDocuments(unittest.TestCase):
+    def setUp(self):
+        self.cursor = MagicMock()
+        self.cursor.rowcount = 2
+        connection = MagicMock()
+        connection.cursor.return_value.__enter__.return_value = self.cursor
+        patcher = patch("tc_hivemind_backend.db.utils.delete_data.PostgresSingleton")
+        self.postgres = patcher.start()
+        self.postgres.return_value.get_connection.return_value = connection
+        self.addCleanup(patcher.stop)
+
+    def _queries(self) -> list[tuple[str, list]]:
+        return [
+            (query.as_string(MagicMock()), params)
+            for (query, params), _ in self.cursor.execute.call_args_list
+        ]
+
+    def test_nothing_to_delete(self):
+        with self.assertRaises(ValueError):
+            delete_pg_documents(dbname="db", table_name="discord")
+
+    def test_delete_ids_in_batches(self):
+        progress = MagicMock()
+        with patch("psycopg2.sql.Identifier.as_string", return_value='"data_discord"'):
+            deleted = delete_pg_documents(
+                dbname="db",
+                table_name="discord",
+                doc_ids=[f"doc-{idx}" for idx in range(5)],
+                community_id="1234",
+                batch_size=2,
+                progress=progress,
+            )
+            queries = self._queries()
+
+        self.assertEqual(deleted, 6)
+        self.assertEqual(len(queries), 3)
+        query, params = queries[0]
+        self.assertEqual(
+            query,
+            'DELETE FROM "data_discord" WHERE community_id = %s '
+            "AND (metadata_->>'doc_id') = ANY(%s)",
+        )
+        self.assertEqual(params, ["1234", ["doc-0", "doc-1"]])
+        self.assertEqual(queries[2][1], ["1234", ["doc-4"]])
+        self.assertEqual(progress.call_args_list[-1].args, (5, 5))
+        self.postgres.return_value.close_connection.assert_called_once()
+
+    def test_delete_by_metadata_until_done(self):
+        rowcounts = iter([2, 2, 1])
+        self.cursor.execute.side_effect = lambda *_: setattr(
+            self.cursor, "rowcount", next(rowcounts)
+        )
+        with patch("psycopg2.sql.Identifier.as_string", return_value='"data_discord"'):
+            deleted = delete_pg_documents(
+                dbname="db",
+                table_name="discord",
+                metadata_filters={"channel": ["general", "dev"], "thread": 12},
+                batch_size=2,
+            )
+            queries = self._queries()
+
+        self.assertEqual(deleted, 5)
+        self.assertEqual(len(queries), 3)
+        query, params = queries[0]
+        self.assertEqual(
+            query,
+            'DELETE FROM "data_discord" WHERE id IN (SELECT id FROM "data_discord" '
+            "WHERE (metadata_->>%s) = ANY(%s) AND (metadata_->>%s) = ANY(%s) "
+            "LIMIT %s)",
+        )
+        self.assertEqual(params, ["channel", ["general", "dev"], "thread", ["12"], 2])
+
+    def test_filter_values_as_json_text(self):
+        self.assertEqual(
+            _filter_values(["general", True, 12, 1.5, None]),
+            ["general", "true", "12", "1.5", "null"],
+        )
+
+
+class TestDeleteQdrantDocuments(unittest.TestCase):
+    def setUp(self):
+        self.client = QdrantClient(":memory:")
+        self.client.create_collection(
+            "discord",
+            vectors_config=models.VectorParams(size=2, distance=models.Distance.COSINE),
+        )
+        self.client.upsert(
+            "discord",
+            points=[
+                models.PointStruct(
+                    id=idx,
+                    vector=[1.0, float(idx)],
+                    payload={
+                        "doc_id": f"doc-{idx % 5}",
+                        "channel": "general" if idx % 2 else "dev",
+                        "community_id": "1234" if idx < 10 else "5678",
+                    },
+                )
+                for idx in range(20)
+            ],
+        )
+
+    def _remaining(self) -> list[int]:
+        points, _ = self.client.scroll("discord", limit=100)
+        return sorted(point.id for point in points)
+
+    def test_delete_ids_in_batches(self):
+        progress = MagicMock()
+        with (
+            patch.object(
+                self.client,
+                "create_payload_index",
+                wraps=self.client.create_payload_index,
+            ) as index_mock,
+            metrics.collect() as sink,
+        ):
+            processed = delete_qdrant_documents(
+                self.client,
+                "discord",
+                doc_ids=["doc-0", "doc-1", "doc-2"],
+                community_id="1234",
+                batch_size=2,
+                progress=progress,
+            )
+
+        self.assertEqual(processed, 3)
+        index_mock.assert_called_once_with(
+            collection_name="discord",
+            field_name="doc_id",
+            field_schema=models.PayloadSchemaType.KEYWORD,
+        )
+        self.assertEqual(
+            sink.get_counter(
+                "hivemind_vector_store_points_total",
+                backend="qdrant",
+                operation="delete",
+            ),
+            6,
+        )
+        self.assertEqual(progress.call_count, 2)
+        self.assertEqual(self._remaining(), [3, 4, 8, 9] + list(range(10, 20)))
+
+    def test_delete_by_metadata(self):
+        processed = delete_qdrant_documents(
+            self.client,
+            "discord",
+            metadata_filters={"channel": "general"},
+            batch_size=3,
+        )
+
+        self.assertEqual(processed, 10)
+        self.assertEqual(self._remaining(), list(range(0, 20, 2)))
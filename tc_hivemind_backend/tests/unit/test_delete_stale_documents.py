@@ -0,0 +1,98 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from llama_index.core.ingestion import DocstoreStrategy
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+from tc_hivemind_backend.ingest_qdrant import CustomIngestionPipeline
+
+
+class TestDeleteStaleDocuments(unittest.TestCase):
+    def setUp(self):
+        self.qdrant = QdrantClient(":memory:")
+        self.qdrant.create_collection(
+            "1234_discord",
+            vectors_config=models.VectorParams(size=2, distance=models.Distance.COSINE),
+        )
+        # 3 nodes per document
+        self.qdrant.upsert(
+            "1234_discord",
+            points=[
+                models.PointStruct(
+                    id=idx,
+                    vector=[1.0, float(idx)],
+                    payload={"ref_doc_id": f"doc-{idx // 3}"},
+                )
+                for idx in range(15)
+            ],
+        )
+
+        self.collections = {}
+        docstore_db = MagicMock()
+        docstore_db.__getitem__.side_effect = lambda name: self.collections.setdefault(
+            name, MagicMock()
+        )
+        mongo_client = MagicMock()
+        mongo_client.__getitem__.return_value = docstore_db
+
+        with (
+            patch("tc_hivemind_backend.ingest_qdrant.QdrantSingleton") as qdrant,
+            patch("tc_hivemind_backend.ingest_qdrant.RedisSingleton"),
+        ):
+            qdrant.get_instance.return_value.client = self.qdrant
+            self.pipeline = CustomIngestionPipeline(
+                "1234",
+                collection_name="discord",
+                testing=True,
+                docstore_strategy=DocstoreStrategy.UPSERTS_AND_DELETE,
+                deletion_batch_size=2,
+            )
+        patcher = patch("tc_hivemind_backend.ingest_qdrant.MongoSingleton")
+        mongo = patcher.start()
+        mongo.get_instance.return_value.get_client.return_value = mongo_client
+        self.addCleanup(patcher.stop)
+
+        self.collections["discord/metadata"] = MagicMock()
+        self.collections["discord/metadata"].find.return_value = iter(
+            [{"_id": f"doc-{idx}"} for idx in range(5)]
+        )
+
+    def test_delete_stale_documents(self):
+        deleted = self.pipeline.delete_stale_documents({"doc-1", "doc-4"})
+
+        self.assertEqual(deleted, 3)
+        points, _ = self.qdrant.scroll("1234_discord", limit=100)
+        self.assertEqual(
+            sorted(point.payload["ref_doc_id"] for point in points),
+            ["doc-1"] * 3 + ["doc-4"] * 3,
+        )
+
+        # deleted from the docstore in batches of `deletion_batch_size`
+        for name in ("discord/data", "discord/metadata"):
+            batches = [
+                call.args[0]["_id"]["$in"]
+                for call in self.collections[name].delete_many.call_args_list
+            ]
+            self.assertEqual(batches, [["doc-0", "doc-2"], ["doc-3"]])
+
+    def test_stale_documents_removed_from_dedup_index(self):
+        self.pipeline.deduplicator = MagicMock()
+        self.pipeline.delete_stale_documents({"doc-1", "doc-4"})
+
+        removed = [
+            call.args[0] for call in self.pipeline.deduplicator.remove.call_args_list
+        ]
+        self.assertEqual(removed, [["doc-0", "doc-2"], ["doc-3"]])
+
+    def test_unsupported_strategy(self):
+        with (
+            patch("tc_hivemind_backend.ingest_qdrant.QdrantSingleton"),
+            patch("tc_hivemind_backend.ingest_qdrant.RedisSingleton"),
+            self.assertRaises(ValueError),
+        ):
+            CustomIngestionPipeline(
+                "1234",
+                collection_name="discord",
+                testing=True,
+                docstore_strategy=DocstoreStrategy.DUPLICATES_ONLY,
+            )
@@ -0,0 +1,133 @@
+import unittest
+from unittest.mock import patch
+
+import spacy
+from tc_hivemind_backend.db.utils.preprocess_text import (
+    BasePreprocessor,
+    CleaningMemo,
+    load_spacy_model,
+)
+
+SAMPLE_CORPUS = [
+    "Hey everyone, the community call starts in 10 minutes!",
+    "Check this link: https://example.com for more information",
+    "I don't think we're ready to deploy the new release yet.",
+    "Can someone review my PR? It fixes the wallet connection issue #42",
+    "gm frens, who's joining the governance vote today?",
+    "The validator node crashed twice last night, logs are in the thread.",
+    "Thanks for the quick answer, that solved my problem :)",
+    "We raised 2,500 USDC for the grants program in the first round.",
+    "Please read the docs at docs.example.org before asking questions.",
+    "The bridge fees are too high right now, maybe wait for the next update.",
+    "Merged the branch into main, the testnet deployment is running.",
+    "Our roadmap for Q3 includes three new features and better onboarding.",
+    "Is the mainnet launch still scheduled for the 15th of March?",
+    "I'm getting an error when swapping tokens in the pool: insufficient funds",
+    "Welcome to the server! Please introduce yourself in #introductions.",
+    "Contributors can claim their rewards after the second epoch ends.",
+    "She said the meeting notes will be shared on GitHub tomorrow.",
+    "Let's discuss the proposal in the forum instead of the chat.",
+    "lgtm, ship it",
+    "The config file needs the new network id and the RPC endpoint.",
+]
+
+
+class TestFastCleaning(unittest.TestCase):
+    def setUp(self):
+        self.preprocessor = BasePreprocessor(memo=CleaningMemo(), mode="fast")
+
+    def test_drops_urls_numbers_stop_words(self):
+        result = self.preprocessor.extract_main_content(
+            "Check this link: https://example.com/a?b=1 and www.example.org, "
+            "we got 5 apples, 10,000 tokens and twenty-one votes on the 3rd!"
+        )
+        self.assertEqual(result, "check link got apples tokens votes")
+
+    def test_contractions(self):
+        result = self.preprocessor.extract_main_content(
+            "I don't think we're ready, it’s broken"
+        )
+        self.assertEqual(result, "think ready broken")
+
+    def test_non_ascii(self):
+        text = "Le déploiement est prêt pour demain"
+        self.assertEqual(
+            self.preprocessor.extract_main_content(text), "le est pour demain"
+        )
+
+        preprocessor = BasePreprocessor(
+            memo=CleaningMemo(), mode="fast", ascii_only=False
+        )
+        self.assertEqual(
+            preprocessor.extract_main_content(text),
+            "le déploiement est prêt pour demain",
+        )
+
+    def test_empty_string(self):
+        self.assertEqual(self.preprocessor.extract_main_content(""), "")
+
+    def test_unsupported_mode(self):
+        with self.assertRaises(ValueError):
+            BasePreprocessor(mode="regex")
+
+    def test_modes_memoized_separately(self):
+        memo = CleaningMemo()
+        BasePreprocessor(memo=memo, mode="fast").extract_main_content("the tokens")
+        with patch.object(
+            BasePreprocessor, "_extract_main_content", return_value="token"
+        ) as extract:
+            result = BasePreprocessor(memo=memo).extract_main_content("the tokens")
+
+        extract.assert_called_once()
+        self.assertEqual(result, "token")
+
+
+class TestFastCleaningEquivalence(unittest.TestCase):
+    """
+    the `fast` mode keeps the same words as the `spacy` mode, lowercased
+    instead of lemmatized
+
+    the words kept by the `spacy` mode are compared before lemmatizing them.
+    Only the tokenizer and the lexical attributes are needed for it, so a blank
+    english pipeline is used if the `en_core_web_sm` model is not installed.
+    The known differences come from the spacy tokenizer exceptions, i.e. `id`
+    is tokenized as `i` and `d` by spacy.
+    """
+
+    def setUp(self):
+        load_spacy_model.cache_clear()
+        self.spacy_preprocessor = BasePreprocessor(memo=CleaningMemo())
+        self.fast_preprocessor = BasePreprocessor(memo=CleaningMemo(), mode="fast")
+
+    def tearDown(self):
+        load_spacy_model.cache_clear()
+
+    def spacy_words(self, text: str) -> str:
+        tokens = self.spacy_preprocessor._main_content_tokens(text)
+        return " ".join(token.lower_ for token in tokens)
+
+    def test_same_words_as_spacy(self):
+        if spacy.util.is_package("en_core_web_sm"):
+            nlp = load_spacy_model()
+        else:
+            nlp = spacy.blank("en")
+
+        with patch(
+            "tc_hivemind_backend.db.utils.preprocess_text.load_spacy_model",
+            return_value=nlp,
+        ):
+            pairs = [
+                (
+                    self.spacy_words(text),
+                    self.fast_preprocessor.extract_main_content(text),
+                )
+                for text in SAMPLE_CORPUS
+            ]
+
+        same_texts = sum(expected == result for expected, result in pairs)
+        self.assertGreaterEqual(same_texts / len(pairs), 0.9)
+
+        expected_words = [word for expected, _ in pairs for word in expected.split()]
+        result_words = [word for _, result in pairs for word in result.split()]
+        common = len(set(expected_words) & set(result_words))
+        self.assertGreaterEqual(common / len(set(expected_words)), 0.95)
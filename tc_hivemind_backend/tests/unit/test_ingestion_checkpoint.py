@@ -0,0 +1,123 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from llama_index.core import Document
+from tc_hivemind_backend.db.checkpoint import IngestionCheckpoint
+from tc_hivemind_backend.ingest_qdrant import CustomIngestionPipeline
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+def make_docs(count: int) -> list[Document]:
+    return [Document(id_=f"doc-{idx}", text=f"text {idx}") for idx in range(count)]
+
+
+@unittest.skipIf(fakeredis is None, "requires fakeredis")
+class TestIngestionCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        self.checkpoint = IngestionCheckpoint(
+            "1234", "discord", "qdrant", redis_client=self.redis, ttl=60
+        )
+
+    def test_batches(self):
+        docs = make_docs(4)
+        self.checkpoint.start_batch(docs[:2])
+        self.assertEqual(sorted(self.checkpoint.interrupted()), ["doc-0", "doc-1"])
+        self.assertEqual(self.checkpoint.completed(docs), set())
+
+        self.checkpoint.finish_batch(docs[:2])
+        self.assertEqual(self.checkpoint.interrupted(), [])
+        self.assertEqual(self.checkpoint.completed(docs), {"doc-0", "doc-1"})
+        self.assertLessEqual(
+            self.redis.ttl("hivemind_checkpoint:qdrant:1234:discord:done"), 60
+        )
+
+    def test_changed_documents_not_completed(self):
+        docs = make_docs(2)
+        self.checkpoint.finish_batch(docs)
+
+        changed = [Document(id_="doc-0", text="changed"), docs[1]]
+        self.assertEqual(self.checkpoint.completed(changed), {"doc-1"})
+
+    def test_stages_and_clear(self):
+        self.assertFalse(self.checkpoint.stage_done("deletion"))
+        self.checkpoint.mark_stage("deletion")
+        self.checkpoint.start_batch(make_docs(1))
+        self.assertTrue(self.checkpoint.stage_done("deletion"))
+
+        self.checkpoint.clear()
+        self.assertFalse(self.checkpoint.stage_done("deletion"))
+        self.assertEqual(self.checkpoint.interrupted(), [])
+        self.assertEqual(self.redis.keys("hivemind_checkpoint:*"), [])
+
+    def test_backends_not_shared(self):
+        docs = make_docs(2)
+        self.checkpoint.finish_batch(docs)
+        pgvector = IngestionCheckpoint(
+            "1234", "discord", "pgvector", redis_client=self.redis
+        )
+        self.assertEqual(pgvector.completed(docs), set())
+
+
+@unittest.skipIf(fakeredis is None, "requires fakeredis")
+class TestPipelineCheckpoint(unittest.TestCase):
+    def setUp(self):
+        with (
+            patch("tc_hivemind_backend.ingest_qdrant.QdrantSingleton"),
+            patch("tc_hivemind_backend.ingest_qdrant.RedisSingleton"),
+            patch("tc_hivemind_backend.ingest_qdrant.IngestionCheckpoint"),
+        ):
+            self.pipeline = CustomIngestionPipeline(
+                "1234",
+                collection_name="discord",
+                testing=True,
+                checkpoint=True,
+                checkpoint_batch_size=2,
+            )
+        self.pipeline.checkpoint = IngestionCheckpoint(
+            "1234",
+            "discord",
+            "qdrant",
+            redis_client=fakeredis.FakeRedis(decode_responses=True),
+        )
+        self.pipeline._docstore = MagicMock()
+        self.pipeline._vector_store = MagicMock()
+        self.pipeline.deduplicator = MagicMock()
+        self.llama_pipeline = MagicMock()
+        self.llama_pipeline.run.side_effect = lambda documents, **kwargs: documents
+
+    def test_interrupted_batch_ingested_again(self):
+        docs = make_docs(5)
+        self.llama_pipeline.run.side_effect = [docs[:2], RuntimeError("crashed")]
+        with self.assertRaises(RuntimeError):
+            self.pipeline._run_batches(self.llama_pipeline, docs)
+        self.assertEqual(
+            sorted(self.pipeline.checkpoint.interrupted()), ["doc-2", "doc-3"]
+        )
+
+        self.llama_pipeline.run.side_effect = lambda documents, **kwargs: documents
+        self.pipeline._recover_interrupted()
+        nodes = self.pipeline._run_batches(self.llama_pipeline, docs)
+
+        self.assertEqual(len(nodes), 5)
+        # the docstore saved their hashes before crashing, so they're removed
+        deleted = [
+            call.args[0]
+            for call in self.pipeline._docstore.delete_document.call_args_list
+        ]
+        self.assertEqual(sorted(deleted), ["doc-2", "doc-3"])
+        self.pipeline.deduplicator.remove.assert_called_once()
+        self.assertEqual(
+            sorted(self.pipeline.deduplicator.remove.call_args.args[0]),
+            ["doc-2", "doc-3"],
+        )
+        self.assertEqual(self.pipeline.checkpoint.interrupted(), [])
+
+    def test_no_checkpoint_single_run(self):
+        self.pipeline.checkpoint = None
+        self.pipeline._run_batches(self.llama_pipeline, make_docs(5))
+        self.llama_pipeline.run.assert_called_once()
@@ -0,0 +1,174 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+
+from tc_hivemind_backend import metrics
+from tc_hivemind_backend.jobs import (
+    IngestionScheduler,
+    LeaseManager,
+    RedisJobQueue,
+    pending_documents_estimator,
+    staleness_estimator,
+)
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+class TestSizeEstimators(unittest.TestCase):
+    def test_pending_documents(self):
+        estimate = pending_documents_estimator(
+            lambda community_id, platform: 4, tokens_per_document=100
+        )
+        self.assertEqual(estimate("1", "discord"), 400)
+
+    def test_staleness(self):
+        dates = {
+            "1": datetime.now() - timedelta(days=2),
+            "2": datetime.now(tz=timezone.utc) - timedelta(hours=12),
+            "3": None,
+        }
+        estimate = staleness_estimator(
+            lambda community_id, platform: dates[community_id],
+            tokens_per_day=1000,
+            first_run_days=30,
+        )
+        self.assertAlmostEqual(estimate("1", "discord"), 2000, delta=1)
+        self.assertAlmostEqual(estimate("2", "discord"), 500, delta=1)
+        self.assertEqual(estimate("3", "discord"), 30_000)
+
+
+@unittest.skipIf(fakeredis is None, "requires fakeredis")
+class TestIngestionScheduler(unittest.TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        self.queue = RedisJobQueue(self.redis)
+        self.leases = LeaseManager(self.redis, ttl=60)
+        self.communities = {"discord": ["a", "b"], "github": ["a"]}
+        self.sizes = {
+            ("a", "discord"): 100,
+            ("a", "github"): 100,
+            ("b", "discord"): 150,
+        }
+        self.modules_base = MagicMock()
+        self.modules_base.get_platform_community_ids.side_effect = lambda platform: (
+            self.communities[platform]
+        )
+        self.now = 10_000.0
+
+    def make_scheduler(self, **kwargs) -> IngestionScheduler:
+        kwargs.setdefault("max_jobs_per_community", 2)
+        return IngestionScheduler(
+            self.queue,
+            lambda community_id, platform: self.sizes[(community_id, platform)],
+            leases=self.leases,
+            modules_base=self.modules_base,
+            timer=lambda: self.now,
+            **kwargs,
+        )
+
+    def keys(self, jobs) -> list[str]:
+        return [job.key for job in jobs]
+
+    def test_shortest_first(self):
+        scheduler = self.make_scheduler(policy="shortest_first")
+        queued = scheduler.schedule(["discord", "github"])
+
+        self.assertEqual(self.keys(queued), ["a_discord", "a_github", "b_discord"])
+        self.assertEqual(len(self.queue), 3)
+        self.assertEqual(self.queue.pop().estimated_tokens, 100)
+
+    def test_fair_between_communities(self):
+        scheduler = self.make_scheduler(policy="fair")
+        queued = scheduler.schedule(["discord", "github"])
+        # the second job of `a` comes after the first one of `b`
+        self.assertEqual(self.keys(queued), ["a_discord", "b_discord", "a_github"])
+
+    def test_fair_accounts_weights_and_served_tokens(self):
+        scheduler = self.make_scheduler(policy="fair", weights={"b": 3})
+        self.assertEqual(
+            self.keys(scheduler.order(scheduler.collect_jobs(["discord", "github"]))),
+            ["b_discord", "a_discord", "a_github"],
+        )
+
+        # `b` was already given tokens in the window
+        scheduler = self.make_scheduler(policy="fair")
+        self.redis.hset(f"hivemind_scheduler:served:{int(self.now // 3600)}", "b", 500)
+        self.assertEqual(
+            self.keys(scheduler.order(scheduler.collect_jobs(["discord", "github"]))),
+            ["a_discord", "a_github", "b_discord"],
+        )
+
+    def test_community_cap(self):
+        scheduler = self.make_scheduler(max_jobs_per_community=1)
+        self.leases.acquire("b_discord")
+
+        with metrics.collect() as sink:
+            queued = scheduler.schedule(["discord", "github"])
+        self.assertEqual(self.keys(queued), ["a_discord"])
+        self.assertEqual(
+            sink.get_counter("hivemind_scheduler_jobs_total", result="capped"), 1
+        )
+        self.assertEqual(
+            sink.get_counter("hivemind_scheduler_jobs_total", result="outstanding"), 1
+        )
+
+        # `a_discord` is still queued
+        self.assertEqual(scheduler.schedule(["discord", "github"]), [])
+        self.queue.pop()
+        self.assertEqual(self.keys(scheduler.schedule(["github"])), ["a_github"])
+
+    def test_token_budget(self):
+        scheduler = self.make_scheduler(policy="shortest_first", token_budget=200)
+        queued = scheduler.schedule(["discord", "github"])
+        self.assertEqual(self.keys(queued), ["a_discord", "a_github"])
+
+        # the budget is spent for the window
+        self.queue.clear()
+        self.assertEqual(scheduler.schedule(["discord"]), [])
+
+        # the jobs of `a` were ingested
+        self.sizes[("a", "discord")] = self.sizes[("a", "github")] = 0
+        self.now += 3600
+        self.assertEqual(self.keys(scheduler.schedule(["discord"])), ["b_discord"])
+
+    def test_job_over_budget_queued_alone(self):
+        self.sizes[("b", "discord")] = 1000
+        scheduler = self.make_scheduler(token_budget=200)
+        self.assertEqual(self.keys(scheduler.schedule(["discord"]))[0], "a_discord")
+        self.queue.clear()
+
+        self.now += 3600
+        self.communities["discord"] = ["b"]
+        self.assertEqual(self.keys(scheduler.schedule(["discord"])), ["b_discord"])
+
+    def test_starved_job_goes_first(self):
+        self.sizes[("b", "discord")] = 150
+        scheduler = self.make_scheduler(
+            policy="shortest_first", token_budget=200, max_wait=600
+        )
+        # `b` waits while the smaller jobs take the budget
+        scheduler.schedule(["discord", "github"])
+        self.queue.clear()
+
+        self.now += 3600
+        queued = scheduler.schedule(["discord", "github"])
+        self.assertEqual(self.keys(queued), ["b_discord"])
+
+    def test_nothing_to_ingest(self):
+        self.sizes[("a", "discord")] = 0
+
+        def estimate(community_id, platform):
+            if community_id == "b":
+                raise ValueError("unavailable")
+            return self.sizes[(community_id, platform)]
+
+        scheduler = self.make_scheduler()
+        scheduler.estimate_tokens = estimate
+        self.assertEqual(self.keys(scheduler.schedule(["discord"])), [])
+
+    def test_invalid_policy(self):
+        with self.assertRaises(ValueError):
+            self.make_scheduler(policy="random")
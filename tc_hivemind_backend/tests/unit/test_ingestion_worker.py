@@ -0,0 +1,165 @@
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from llama_index.core import Document
+from tc_hivemind_backend import metrics
+from tc_hivemind_backend.jobs import IngestionJob, LeaseManager, LocalJobQueue
+from tc_hivemind_backend.jobs.worker import IngestionWorker, load_object, main
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+class TestLocalJobQueue(unittest.TestCase):
+    def test_fifo_without_duplicates(self):
+        queue = LocalJobQueue()
+        self.assertTrue(queue.push(IngestionJob("1", "discord")))
+        self.assertFalse(queue.push(IngestionJob("1", "discord")))
+        self.assertTrue(queue.push(IngestionJob("2", "discord")))
+        self.assertEqual(queue.queued_keys(), {"1_discord", "2_discord"})
+
+        self.assertEqual(queue.pop().key, "1_discord")
+        self.assertEqual(queue.pop().key, "2_discord")
+        self.assertIsNone(queue.pop())
+
+    def test_pop_waits_for_push(self):
+        queue = LocalJobQueue()
+        timer = threading.Timer(0.05, queue.push, args=(IngestionJob("1", "discord"),))
+        timer.start()
+        self.assertEqual(queue.pop(timeout=5).key, "1_discord")
+        self.assertIsNone(queue.pop(timeout=0.01))
+
+
+@unittest.skipIf(fakeredis is None, "requires fakeredis")
+class TestIngestionWorker(unittest.TestCase):
+    def setUp(self):
+        self.queue = LocalJobQueue()
+        self.leases = LeaseManager(fakeredis.FakeRedis(decode_responses=True))
+        self.documents = [Document(id_="doc-0", text="text")]
+        self.load_documents = MagicMock(return_value=self.documents)
+
+        patcher = patch("tc_hivemind_backend.jobs.worker.CustomIngestionPipeline")
+        self.pipeline_class = patcher.start()
+        self.pipeline_class.side_effect = lambda *args, **kwargs: MagicMock()
+        self.addCleanup(patcher.stop)
+
+        self.worker = IngestionWorker(
+            self.load_documents,
+            queue=self.queue,
+            leases=self.leases,
+            poll_timeout=0.01,
+            max_pipelines=1,
+            testing=True,
+        )
+
+    def run_worker(self, jobs: int) -> None:
+        for _ in range(jobs):
+            self.worker.runner.run_once()
+
+    def test_runs_jobs_reusing_pipelines(self):
+        self.queue.push(IngestionJob("1", "discord"))
+        self.run_worker(1)
+        pipeline = self.worker.get_pipeline(IngestionJob("1", "discord"))
+        self.queue.push(IngestionJob("1", "discord"))
+        self.run_worker(1)
+
+        self.assertEqual(self.pipeline_class.call_count, 1)
+        self.assertEqual(
+            self.pipeline_class.call_args.kwargs,
+            {
+                "collection_name": "discord",
+                "embed_model": None,
+                "checkpoint": True,
+                "testing": True,
+            },
+        )
+        self.assertEqual(pipeline.run_pipeline.call_count, 2)
+        documents = pipeline.run_pipeline.call_args.args[0]
+        self.assertEqual(documents, self.documents)
+        self.assertIsNotNone(pipeline.run_pipeline.call_args.kwargs["lease"])
+
+    def test_least_recently_used_pipeline_closed(self):
+        first = self.worker.get_pipeline(IngestionJob("1", "discord"))
+        self.worker.get_pipeline(IngestionJob("2", "discord"))
+        first.close.assert_called_once()
+
+        self.worker.close()
+        self.assertEqual(self.worker._pipelines, {})
+
+    def test_stop_drains_running_job(self):
+        self.queue.push(IngestionJob("1", "discord"))
+        self.queue.push(IngestionJob("2", "discord"))
+
+        def run_pipeline(documents, lease):
+            # the first batch is saved, then a shutdown is requested
+            self.worker.stop()
+            lease.ensure()
+
+        pipeline = MagicMock()
+        pipeline.run_pipeline.side_effect = run_pipeline
+        self.pipeline_class.side_effect = None
+        self.pipeline_class.return_value = pipeline
+
+        with metrics.collect() as sink:
+            pulled = self.worker.run()
+
+        self.assertEqual(pulled, 1)
+        self.assertEqual(sink.get_counter("hivemind_jobs_total", result="stopped"), 1)
+        # queued again behind the waiting job, and its lease is released
+        self.assertEqual(
+            [self.queue.pop().key, self.queue.pop().key], ["2_discord", "1_discord"]
+        )
+        self.assertIsNone(self.leases.holder("1_discord"))
+        pipeline.close.assert_called_once()
+
+    def test_stop_from_another_thread(self):
+        thread = threading.Thread(target=self.worker.run)
+        thread.start()
+        time.sleep(0.05)
+        self.worker.stop()
+        thread.join(timeout=5)
+        self.assertFalse(thread.is_alive())
+
+    @patch("tc_hivemind_backend.jobs.worker.CohereEmbedding")
+    @patch("tc_hivemind_backend.jobs.worker.load_spacy_model")
+    @patch("tc_hivemind_backend.jobs.worker.QdrantSingleton")
+    @patch("tc_hivemind_backend.jobs.worker.MongoSingleton")
+    @patch("tc_hivemind_backend.jobs.worker.RedisSingleton")
+    def test_warm_up(self, redis, mongo, qdrant, load_spacy_model, cohere):
+        self.worker.warm_up()
+        for singleton in (redis, mongo, qdrant):
+            singleton.get_instance.assert_called_once()
+        # the mock embedding is created by the pipelines
+        cohere.assert_not_called()
+        self.assertIsNone(self.worker.embed_model)
+
+        worker = IngestionWorker(
+            self.load_documents,
+            queue=self.queue,
+            leases=self.leases,
+            vector_compression="uint8",
+            cleaning_mode="fast",
+        )
+        worker.warm_up()
+        cohere.assert_called_once_with(embedding_type="uint8", cleaning_mode="fast")
+        load_spacy_model.assert_not_called()
+
+        worker = IngestionWorker(self.load_documents, self.queue, self.leases)
+        worker.warm_up()
+        load_spacy_model.assert_called_once()
+
+
+class TestWorkerEntryPoint(unittest.TestCase):
+    def test_load_object(self):
+        self.assertIs(load_object("threading:Thread"), threading.Thread)
+        with self.assertRaises(ValueError):
+            load_object("threading")
+
+    @patch.dict("os.environ", {"HIVEMIND_WORKER_LOADER": ""})
+    def test_loader_required(self):
+        with self.assertRaises(SystemExit):
+            main([])
@@ -0,0 +1,227 @@
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from llama_index.core import Document
+from tc_hivemind_backend import metrics
+from tc_hivemind_backend.db.checkpoint import IngestionCheckpoint
+from tc_hivemind_backend.ingest_qdrant import CustomIngestionPipeline
+from tc_hivemind_backend.jobs import (
+    IngestionJob,
+    JobStopped,
+    LeasedJobRunner,
+    LeaseLostError,
+    LeaseManager,
+    RedisJobQueue,
+)
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+@unittest.skipIf(fakeredis is None, "requires fakeredis")
+class TestLeaseManager(unittest.TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        self.worker_a = LeaseManager(self.redis, ttl=10, owner="a")
+        self.worker_b = LeaseManager(self.redis, ttl=10, owner="b")
+
+    def test_exclusive_until_released(self):
+        lease = self.worker_a.acquire("1234_discord")
+        self.assertIsNotNone(lease)
+        self.assertIsNone(self.worker_b.acquire("1234_discord"))
+        self.assertIsNotNone(self.worker_b.acquire("1234_telegram"))
+        self.assertTrue(self.worker_a.holder("1234_discord").startswith("a:"))
+
+        self.assertTrue(lease.release())
+        self.assertIsNone(self.worker_a.holder("1234_discord"))
+        self.assertIsNotNone(self.worker_b.acquire("1234_discord"))
+
+    def test_expired_lease_taken_over(self):
+        lease = self.worker_a.acquire("1234_discord")
+        # the lease expired, and another worker acquired it
+        self.redis.delete("hivemind_lease:1234_discord")
+        other = self.worker_b.acquire("1234_discord")
+
+        self.assertFalse(lease.renew())
+        self.assertTrue(lease.lost)
+        self.assertFalse(lease.release())
+        with self.assertRaises(LeaseLostError):
+            lease.ensure()
+        # the other worker's lease is kept
+        self.assertEqual(self.worker_b.holder("1234_discord"), other.token)
+        other.ensure()
+
+    def test_renew_extends_ttl(self):
+        lease = self.worker_a.acquire("1234_discord")
+        self.redis.pexpire("hivemind_lease:1234_discord", 100)
+        self.assertTrue(lease.renew())
+        self.assertGreater(self.redis.pttl("hivemind_lease:1234_discord"), 9000)
+
+    def test_hold_renews_and_releases(self):
+        manager = LeaseManager(self.redis, ttl=0.3, owner="a")
+        with manager.hold("1234_discord", renew_interval=0.05) as lease:
+            # held for longer than the ttl thanks to the renewals
+            time.sleep(0.5)
+            lease.ensure()
+            with self.worker_b.hold("1234_discord") as other:
+                self.assertIsNone(other)
+        self.assertIsNone(manager.holder("1234_discord"))
+
+
+@unittest.skipIf(fakeredis is None, "requires fakeredis")
+class TestRedisJobQueue(unittest.TestCase):
+    def setUp(self):
+        self.queue = RedisJobQueue(fakeredis.FakeRedis(decode_responses=True))
+
+    def test_fifo_without_duplicates(self):
+        self.assertTrue(self.queue.push(IngestionJob("1", "discord")))
+        self.assertTrue(self.queue.push(IngestionJob("2", "discord")))
+        self.assertFalse(self.queue.push(IngestionJob("1", "discord")))
+        self.assertEqual(len(self.queue), 2)
+
+        job = self.queue.pop()
+        self.assertEqual(job, IngestionJob("1", "discord"))
+        # queued again once pulled
+        self.assertTrue(self.queue.push(IngestionJob("1", "discord")))
+        self.assertEqual(self.queue.pop(timeout=1).community_id, "2")
+        self.assertEqual(self.queue.pop().community_id, "1")
+        self.assertIsNone(self.queue.pop())
+
+    def test_recover_crashed_pull(self):
+        self.queue.push(IngestionJob("1", "discord"))
+        self.queue.push(IngestionJob("2", "discord"))
+        # a worker crashing after moving the job, before removing its key
+        redis_client = self.queue.redis_client
+        redis_client.lmove("hivemind_ingestion_jobs", "hivemind_ingestion_jobs:pulled")
+        self.assertFalse(self.queue.push(IngestionJob("1", "discord")))
+
+        self.assertEqual(self.queue.recover(), 1)
+        self.assertEqual(self.queue.pop().community_id, "1")
+        self.assertEqual(self.queue.queued_keys(), {"2_discord"})
+        self.assertEqual(redis_client.llen("hivemind_ingestion_jobs:pulled"), 0)
+        self.assertEqual(self.queue.recover(), 0)
+
+    def test_job_serialization(self):
+        job = IngestionJob("1234", "discord", enqueued_at=10.0)
+        restored = IngestionJob.from_json(job.to_json())
+        self.assertEqual(restored.key, "1234_discord")
+        self.assertEqual(restored.enqueued_at, 10.0)
+
+
+@unittest.skipIf(fakeredis is None, "requires fakeredis")
+class TestLeasedJobRunner(unittest.TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        self.queue = RedisJobQueue(self.redis)
+        self.leases = LeaseManager(self.redis, ttl=10, owner="a")
+        self.handler = MagicMock()
+        self.runner = LeasedJobRunner(self.queue, self.leases, self.handler)
+
+    def test_runs_jobs_holding_their_lease(self):
+        def handler(job, lease):
+            self.assertIsNotNone(self.leases.holder(job.key))
+            lease.ensure()
+
+        self.runner.handler = MagicMock(side_effect=handler)
+        self.queue.push(IngestionJob("1", "discord"))
+        self.queue.push(IngestionJob("2", "discord"))
+
+        with metrics.collect() as sink:
+            self.assertEqual(self.runner.run(timeout=0), 2)
+        self.assertEqual(self.runner.handler.call_count, 2)
+        self.assertEqual(sink.get_counter("hivemind_jobs_total", result="done"), 2)
+        self.assertIsNone(self.leases.holder("1_discord"))
+
+    def test_job_leased_elsewhere_skipped(self):
+        other = LeaseManager(self.redis, ttl=10, owner="b")
+        other.acquire("1_discord")
+        self.queue.push(IngestionJob("1", "discord"))
+
+        with metrics.collect() as sink:
+            job = self.runner.run_once()
+        self.assertEqual(job.key, "1_discord")
+        self.handler.assert_not_called()
+        self.assertEqual(sink.get_counter("hivemind_jobs_total", result="skipped"), 1)
+
+    def test_stopped_job_pulled_by_another_runner(self):
+        other_handler = MagicMock()
+        other = LeasedJobRunner(
+            RedisJobQueue(self.redis),
+            LeaseManager(self.redis, ttl=10, owner="b"),
+            other_handler,
+        )
+        self.handler.side_effect = JobStopped("1_discord was drained,")
+        push = self.queue.push
+
+        def push_and_pull(job):
+            # an idle worker pulls the job as soon as it's queued again
+            pushed = push(job)
+            other.run_once()
+            return pushed
+
+        self.queue.push(IngestionJob("1", "discord"))
+        with (
+            patch.object(self.queue, "push", side_effect=push_and_pull),
+            metrics.collect() as sink,
+        ):
+            self.runner.run_once()
+
+        self.assertEqual(sink.get_counter("hivemind_jobs_total", result="stopped"), 1)
+        # resumed by the other worker, not skipped for the lease being held
+        other_handler.assert_called_once()
+        self.assertEqual(sink.get_counter("hivemind_jobs_total", result="done"), 1)
+        self.assertEqual(sink.get_counter("hivemind_jobs_total", result="skipped"), 0)
+
+    def test_failed_job_releases_lease(self):
+        self.handler.side_effect = RuntimeError("boom")
+        self.queue.push(IngestionJob("1", "discord"))
+
+        with metrics.collect() as sink:
+            self.runner.run_once()
+        self.assertEqual(sink.get_counter("hivemind_jobs_total", result="failed"), 1)
+        self.assertIsNone(self.leases.holder("1_discord"))
+
+    def test_empty_queue(self):
+        self.assertIsNone(self.runner.run_once())
+        self.assertEqual(self.runner.run(timeout=0), 0)
+
+
+@unittest.skipIf(fakeredis is None, "requires fakeredis")
+class TestPipelineLease(unittest.TestCase):
+    def setUp(self):
+        with (
+            patch("tc_hivemind_backend.ingest_qdrant.QdrantSingleton"),
+            patch("tc_hivemind_backend.ingest_qdrant.RedisSingleton"),
+            patch("tc_hivemind_backend.ingest_qdrant.IngestionCheckpoint"),
+        ):
+            self.pipeline = CustomIngestionPipeline(
+                "1234",
+                collection_name="discord",
+                testing=True,
+                checkpoint=True,
+                checkpoint_batch_size=2,
+            )
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        self.pipeline.checkpoint = IngestionCheckpoint(
+            "1234", "discord", "qdrant", redis_client=self.redis
+        )
+        self.lease = LeaseManager(self.redis, ttl=10).acquire("1234_discord")
+
+    def test_stops_once_lease_lost(self):
+        docs = [Document(id_=f"doc-{idx}", text=f"text {idx}") for idx in range(5)]
+
+        def run(documents, **kwargs):
+            # another worker took over the lease during the first batch
+            self.redis.set("hivemind_lease:1234_discord", "other")
+            return documents
+
+        llama_pipeline = MagicMock()
+        llama_pipeline.run.side_effect = run
+        with self.assertRaises(LeaseLostError):
+            self.pipeline._run_batches(llama_pipeline, docs, lease=self.lease)
+
+        llama_pipeline.run.assert_called_once()
+        self.assertEqual(self.pipeline.checkpoint.interrupted(), [])
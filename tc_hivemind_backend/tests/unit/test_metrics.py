@@ -0,0 +1,161 @@
+import copy
+import unittest
+from unittest.mock import MagicMock, patch
+
+from llama_index.core.storage.kvstore import SimpleKVStore
+from tc_hivemind_backend import metrics
+from tc_hivemind_backend.db.metered_kv_store import MeteredKVStore
+from tc_hivemind_backend.embeddings.cohere import CohereEmbedding
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.sink = metrics.InMemorySink()
+        self.previous = metrics.set_sink(self.sink)
+
+    def tearDown(self):
+        metrics.set_sink(self.previous)
+
+    def test_disabled_sink_returns_null_timer(self):
+        metrics.set_sink(metrics.NullSink())
+        with metrics.timer("hivemind_test") as timer:
+            pass
+        self.assertIs(timer, metrics._NULL_TIMER)
+        metrics.increment("hivemind_test_total")
+        self.assertEqual(self.sink.snapshot(), {"counters": [], "summaries": []})
+
+    def test_sink_interface(self):
+        class CounterSink(metrics.MetricsSink):
+            def increment(self, name, value, labels):
+                pass
+
+        with self.assertRaises(TypeError):
+            CounterSink()
+
+    def test_context_labels(self):
+        with metrics.metric_labels(community_id="1234", platform="discord"):
+            metrics.increment("hivemind_test_total", 2, operation="put")
+            with metrics.metric_labels(platform="github"):
+                metrics.increment("hivemind_test_total", 3, operation="put")
+        metrics.increment("hivemind_test_total", 4)
+
+        self.assertEqual(self.sink.get_counter("hivemind_test_total"), 9)
+        self.assertEqual(
+            self.sink.get_counter("hivemind_test_total", community_id="1234"), 5
+        )
+        self.assertEqual(
+            self.sink.get_counter("hivemind_test_total", platform="discord"), 2
+        )
+        self.assertEqual(metrics.current_labels(), {})
+
+    def test_current_labels_is_a_copy(self):
+        metrics.current_labels()["community_id"] = "1234"
+        self.assertEqual(metrics.current_labels(), {})
+
+    def test_timer(self):
+        with metrics.timer("hivemind_test", operation="add"):
+            pass
+        with self.assertRaises(ValueError):
+            with metrics.timer("hivemind_test", operation="add"):
+                raise ValueError("failed")
+
+        summary = self.sink.get_summary("hivemind_test_seconds", operation="add")
+        self.assertEqual(summary["count"], 2)
+        self.assertGreaterEqual(summary["max"], summary["min"])
+        self.assertEqual(self.sink.get_counter("hivemind_test_errors_total"), 1)
+
+    def test_observe_summary(self):
+        for value in [3, 1, 2]:
+            metrics.observe("hivemind_test_batch_size", value)
+
+        self.assertEqual(
+            self.sink.get_summary("hivemind_test_batch_size"),
+            {"count": 3, "sum": 6, "min": 1, "max": 3},
+        )
+
+    def test_prometheus_render(self):
+        sink = metrics.PrometheusSink()
+        metrics.set_sink(sink)
+        with metrics.metric_labels(community_id="1234", platform='say "hi"'):
+            metrics.increment("hivemind_test_total", 2)
+            metrics.observe("hivemind_test_seconds", 0.5)
+
+        self.assertEqual(
+            sink.render(),
+            "# TYPE hivemind_test_total counter\n"
+            'hivemind_test_total{community_id="1234",platform="say \\"hi\\""} 2\n'
+            "# TYPE hivemind_test_seconds summary\n"
+            'hivemind_test_seconds_count{community_id="1234",platform="say \\"hi\\""} 1\n'
+            'hivemind_test_seconds_sum{community_id="1234",platform="say \\"hi\\""} 0.5\n',
+        )
+
+    @patch.dict("os.environ", {"HIVEMIND_METRICS_SINK": "prometheus"})
+    def test_sink_from_env(self):
+        self.assertIsInstance(metrics.create_sink_from_env(), metrics.PrometheusSink)
+
+    @patch.dict("os.environ", {"HIVEMIND_METRICS_SINK": "unknown"})
+    def test_unknown_sink_from_env(self):
+        with self.assertRaises(ValueError):
+            metrics.create_sink_from_env()
+
+    def test_metered_kv_store(self):
+        kvstore = MeteredKVStore(SimpleKVStore(), backend="mongo")
+        kvstore.put_all([("a", {"v": 1}), ("b", {"v": 2})], collection="docs")
+        self.assertEqual(kvstore.get("a", collection="docs"), {"v": 1})
+        self.assertIsNone(kvstore.get("c", collection="docs"))
+        self.assertTrue(kvstore.delete("b", collection="docs"))
+        # attributes that are not metered are forwarded to the wrapped store
+        self.assertIn("docs", kvstore.to_dict())
+
+        self.assertEqual(
+            self.sink.get_counter("hivemind_kvstore_keys_total", operation="put_all"),
+            2,
+        )
+        self.assertEqual(
+            self.sink.get_counter("hivemind_kvstore_keys_total", operation="get"), 1
+        )
+        self.assertEqual(
+            self.sink.get_summary(
+                "hivemind_kvstore_operation_seconds", backend="mongo", operation="get"
+            )["count"],
+            2,
+        )
+
+        # `_kvstore` isn't set on a copy being built
+        self.assertEqual(copy.deepcopy(kvstore).get("a", collection="docs"), {"v": 1})
+
+    def test_cohere_embedding_metrics(self):
+        client = MagicMock()
+        client.embed.return_value = MagicMock(
+            embeddings=[[0.1], [0.2]],
+            meta={"billed_units": {"input_tokens": 7}},
+        )
+        embed_model = CohereEmbedding()
+        with (
+            patch.object(CohereEmbedding, "prepare_cohere", return_value=client),
+            patch.object(CohereEmbedding, "_clean_text", side_effect=lambda t, p: t),
+        ):
+            embed_model.get_text_embedding(texts=["first", "second"])
+
+        self.assertEqual(
+            self.sink.get_summary("hivemind_embedding_batch_size")["sum"], 2
+        )
+        self.assertEqual(self.sink.get_counter("hivemind_embedding_tokens_total"), 7)
+        self.assertEqual(
+            self.sink.get_summary("hivemind_embedding_request_seconds")["count"], 1
+        )
+
+    def test_collect(self):
+        metrics.set_sink(metrics.NullSink())
+        with metrics.collect() as collected:
+            metrics.increment("hivemind_test_total")
+            with metrics.timer("hivemind_test"):
+                pass
+            with metrics.collect() as inner:
+                metrics.increment("hivemind_test_total")
+        metrics.increment("hivemind_test_total")
+
+        self.assertEqual(collected.get_counter("hivemind_test_total"), 1)
+        self.assertEqual(inner.get_counter("hivemind_test_total"), 1)
+        self.assertEqual(collected.get_summary("hivemind_test_seconds")["count"], 1)
+        self.assertEqual(self.sink.get_counter("hivemind_test_total"), 0)
@@ -0,0 +1,132 @@
+import unittest
+
+import numpy as np
+from llama_index.core.schema import Document
+from tc_hivemind_backend import metrics
+from tc_hivemind_backend.dedup import MinHashDeduplicator, optimal_bands
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+ANNOUNCEMENT = (
+    "Hello everyone! The community call is happening this Thursday at 4pm UTC "
+    "in the main voice channel. We will go over the roadmap for the next "
+    "quarter, the new contributor guidelines and the grants program. "
+    "Bring your questions and see you there!"
+)
+
+
+class TestMinHashDeduplicator(unittest.TestCase):
+    def setUp(self):
+        self.deduplicator = MinHashDeduplicator(threshold=0.7)
+
+    def test_optimal_bands(self):
+        bands, rows = optimal_bands(0.7, 128)
+        self.assertLessEqual(bands * rows, 128)
+        # the collision probability crosses one half around the threshold
+        self.assertAlmostEqual((1 / bands) ** (1 / rows), 0.7, delta=0.1)
+
+    def test_signature_similarity(self):
+        signature = self.deduplicator.signature(ANNOUNCEMENT)
+        self.assertEqual(signature.shape, (128,))
+        self.assertEqual(signature.dtype, np.uint32)
+
+        # case and punctuation are ignored
+        same = self.deduplicator.signature(ANNOUNCEMENT.upper().replace("!", "."))
+        np.testing.assert_array_equal(signature, same)
+
+        other = self.deduplicator.signature("a totally different message here")
+        self.assertLess(np.mean(signature == other), 0.2)
+
+    def test_deduplicate_within_documents(self):
+        docs = [
+            Document(id_="1", text=ANNOUNCEMENT),
+            Document(id_="2", text="thanks for the update, see you there"),
+            Document(id_="3", text=ANNOUNCEMENT.replace("4pm", "5pm")),
+            Document(id_="4", text=ANNOUNCEMENT),
+        ]
+        with metrics.collect() as sink:
+            kept = self.deduplicator.deduplicate(docs)
+
+        self.assertEqual([doc.doc_id for doc in kept], ["1", "2"])
+        self.assertEqual(sink.get_counter("hivemind_dedup_documents_dropped_total"), 2)
+
+    def test_deduplicate_across_calls(self):
+        self.deduplicator.deduplicate([Document(id_="1", text=ANNOUNCEMENT)])
+
+        kept = self.deduplicator.deduplicate(
+            [
+                Document(id_="2", text=ANNOUNCEMENT + " Cheers"),
+                # the same document again is not its own duplicate
+                Document(id_="1", text=ANNOUNCEMENT),
+            ]
+        )
+        self.assertEqual([doc.doc_id for doc in kept], ["1"])
+
+    def test_remove(self):
+        self.deduplicator.deduplicate([Document(id_="1", text=ANNOUNCEMENT)])
+        self.deduplicator.remove(["1", "unknown"])
+
+        kept = self.deduplicator.deduplicate([Document(id_="2", text=ANNOUNCEMENT)])
+        self.assertEqual(len(kept), 1)
+        self.assertEqual(set(self.deduplicator._signatures), {"2"})
+
+    def test_changed_document_replaced_in_index(self):
+        self.deduplicator.deduplicate([Document(id_="1", text=ANNOUNCEMENT)])
+        self.deduplicator.deduplicate(
+            [Document(id_="1", text="a totally different message here")]
+        )
+
+        # the previous text of the document is no longer indexed
+        kept = self.deduplicator.deduplicate([Document(id_="2", text=ANNOUNCEMENT)])
+        self.assertEqual(len(kept), 1)
+
+    def test_clear(self):
+        self.deduplicator.deduplicate([Document(id_="1", text=ANNOUNCEMENT)])
+        self.deduplicator.clear()
+
+        kept = self.deduplicator.deduplicate([Document(id_="2", text=ANNOUNCEMENT)])
+        self.assertEqual(len(kept), 1)
+
+    def test_invalid_parameters(self):
+        with self.assertRaises(ValueError):
+            MinHashDeduplicator(threshold=0)
+        with self.assertRaises(ValueError):
+            MinHashDeduplicator(redis_client=object())
+
+    @unittest.skipIf(fakeredis is None, "requires fakeredis")
+    def test_persisted_index(self):
+        client = fakeredis.FakeRedis()
+        first = MinHashDeduplicator(
+            threshold=0.7, redis_client=client, index_name="1234_discord_minhash"
+        )
+        first.deduplicate([Document(id_="1", text=ANNOUNCEMENT)])
+
+        # a new instance, as in a later run
+        second = MinHashDeduplicator(
+            threshold=0.7, redis_client=client, index_name="1234_discord_minhash"
+        )
+        kept = second.deduplicate(
+            [
+                Document(id_="2", text=ANNOUNCEMENT.replace("4pm", "5pm")),
+                Document(id_="3", text="a totally different message here"),
+            ]
+        )
+        self.assertEqual([doc.doc_id for doc in kept], ["3"])
+
+        second.remove(["1"])
+        kept = second.deduplicate([Document(id_="4", text=ANNOUNCEMENT)])
+        self.assertEqual([doc.doc_id for doc in kept], ["4"])
+        # the buckets only hold the ids of the indexed documents
+        members = set()
+        for key in client.keys("1234_discord_minhash:bucket:*"):
+            members |= client.smembers(key)
+        self.assertEqual(members, {b"3", b"4"})
+        # expiring a week after their last use, like the checkpoints
+        for key in client.keys("1234_discord_minhash:*"):
+            self.assertGreater(client.ttl(key), 6 * 24 * 60 * 60)
+
+        second.clear()
+        self.assertEqual(client.keys("1234_discord_minhash:*"), [])
@@ -0,0 +1,83 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from bson import ObjectId
+from tc_hivemind_backend.db.modules_base import ModulesBase
+from tc_hivemind_backend.db.utils.ttl_cache import TTLCache
+
+
+class TestModulesBaseCache(unittest.TestCase):
+    def setUp(self) -> None:
+        ModulesBase._cache = TTLCache(ttl=60)
+        self.community_id = ObjectId("6579c364f1120850414e0dc5")
+
+        self.client = MagicMock()
+        self.collection = self.client["Core"].get_collection.return_value
+        self.collection.find.return_value = [{"community": self.community_id}]
+
+        patcher = patch("tc_hivemind_backend.db.modules_base.MongoSingleton")
+        mock_singleton = patcher.start()
+        mock_singleton.get_instance.return_value.get_client.return_value = self.client
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self) -> None:
+        ModulesBase._cache = None
+
+    def test_repeated_query_hits_cache(self):
+        modules_base = ModulesBase()
+        first = modules_base.query(platform="discord", projection={"community": 1})
+        second = ModulesBase().query(platform="discord", projection={"community": 1})
+
+        self.assertEqual(first, second)
+        self.assertEqual(self.collection.find.call_count, 1)
+        self.assertEqual(ModulesBase.cache_stats()["hits"], 1)
+
+    def test_cache_keyed_on_projection(self):
+        modules_base = ModulesBase()
+        modules_base.query(platform="discord", projection={"community": 1})
+        modules_base.query(platform="discord", projection={"metadata": 1})
+        modules_base.query(platform="github", projection={"community": 1})
+
+        self.assertEqual(self.collection.find.call_count, 3)
+
+    def test_nested_projection_cached(self):
+        projection = {"options": {"platforms": {"$slice": 1}}, "community": 1}
+        ModulesBase().query(platform="discord", projection=projection)
+        ModulesBase().query(platform="discord", projection=dict(projection))
+
+        self.assertEqual(self.collection.find.call_count, 1)
+
+    def test_returned_docs_are_copies(self):
+        modules_base = ModulesBase()
+        docs = modules_base.query(platform="discord")
+        docs[0]["community"] = "changed"
+
+        cached_docs = modules_base.query(platform="discord")
+        self.assertEqual(cached_docs[0]["community"], self.community_id)
+
+    def test_bypass_cache(self):
+        modules_base = ModulesBase()
+        modules_base.query(platform="discord")
+        modules_base.query(platform="discord", use_cache=False)
+
+        self.assertEqual(self.collection.find.call_count, 2)
+
+    def test_invalidate_platform(self):
+        modules_base = ModulesBase()
+        modules_base.query(platform="discord")
+        modules_base.query(platform="github")
+
+        ModulesBase.invalidate_cache(platform="discord")
+        modules_base.query(platform="discord")
+        modules_base.query(platform="github")
+
+        self.assertEqual(self.collection.find.call_count, 3)
+
+    def test_get_platform_community_ids_cached(self):
+        modules_base = ModulesBase()
+        ids = modules_base.get_platform_community_ids("discord")
+        ids_again = modules_base.get_platform_community_ids("discord")
+
+        self.assertEqual(ids, [str(self.community_id)])
+        self.assertEqual(ids, ids_again)
+        self.assertEqual(self.collection.find.call_count, 1)
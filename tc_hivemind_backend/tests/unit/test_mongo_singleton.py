@@ -1,9 +1,14 @@
 import logging
+import os
 import unittest
 from unittest.mock import MagicMock, patch
 
 # Import the modules to test
-from tc_hivemind_backend.db.mongo import MongoSingleton, get_mongo_uri
+from tc_hivemind_backend.db.mongo import (
+    MongoSingleton,
+    get_mongo_client_options,
+    get_mongo_uri,
+)
 
 
 class TestMongoSingleton(unittest.TestCase):
@@ -106,3 +111,84 @@ class TestMongoSingleton(unittest.TestCase):
             client = singleton.get_client()
 
             self.assertIs(client, mock_instance)
+
+    def test_client_created_with_options(self):
+        """Test the MongoClient receives the tuning options"""
+        with (
+            patch("tc_hivemind_backend.db.mongo.MongoClient") as mock_client,
+            patch(
+                "tc_hivemind_backend.db.mongo.get_mongo_client_options"
+            ) as mock_options,
+        ):
+            mock_options.return_value = {"maxPoolSize": 10}
+            MongoSingleton.get_instance()
+
+            _, kwargs = mock_client.call_args
+            self.assertEqual(kwargs, {"maxPoolSize": 10})
+
+
+class TestMongoClientOptions(unittest.TestCase):
+    def setUp(self):
+        self.env_names = [
+            "MONGODB_MAX_POOL_SIZE",
+            "MONGODB_MIN_POOL_SIZE",
+            "MONGODB_COMPRESSORS",
+            "MONGODB_SERVER_SELECTION_TIMEOUT_MS",
+            "MONGODB_CONNECT_TIMEOUT_MS",
+            "MONGODB_SOCKET_TIMEOUT_MS",
+            "MONGODB_MAX_IDLE_TIME_MS",
+        ]
+        self.old_envs = {name: os.environ.pop(name, None) for name in self.env_names}
+
+    def tearDown(self):
+        for name, value in self.old_envs.items():
+            os.environ.pop(name, None)
+            if value is not None:
+                os.environ[name] = value
+
+    def test_default_options(self):
+        with patch(
+            "tc_hivemind_backend.db.mongo._available_compressors", return_value=[]
+        ):
+            options = get_mongo_client_options()
+
+        self.assertEqual(options["maxPoolSize"], 100)
+        self.assertEqual(options["minPoolSize"], 0)
+        self.assertEqual(options["serverSelectionTimeoutMS"], 10000)
+        self.assertEqual(options["connectTimeoutMS"], 10000)
+        self.assertNotIn("socketTimeoutMS", options)
+        self.assertNotIn("compressors", options)
+
+    def test_options_from_env(self):
+        os.environ["MONGODB_MAX_POOL_SIZE"] = "50"
+        os.environ["MONGODB_MIN_POOL_SIZE"] = "5"
+        os.environ["MONGODB_COMPRESSORS"] = "zstd,snappy"
+        os.environ["MONGODB_SOCKET_TIMEOUT_MS"] = "30000"
+        os.environ["MONGODB_MAX_IDLE_TIME_MS"] = "60000"
+
+        options = get_mongo_client_options()
+
+        self.assertEqual(options["maxPoolSize"], 50)
+        self.assertEqual(options["minPoolSize"], 5)
+        self.assertEqual(options["compressors"], "zstd,snappy")
+        self.assertEqual(options["socketTimeoutMS"], 30000)
+        self.assertEqual(options["maxIdleTimeMS"], 60000)
+
+    def test_installed_compressors_used_by_default(self):
+        with patch(
+            "tc_hivemind_backend.db.mongo._available_compressors",
+            return_value=["zstd"],
+        ):
+            options = get_mongo_client_options()
+
+        self.assertEqual(options["compressors"], "zstd")
+
+    def test_compression_disabled_with_empty_env(self):
+        os.environ["MONGODB_COMPRESSORS"] = ""
+        with patch(
+            "tc_hivemind_backend.db.mongo._available_compressors",
+            return_value=["zstd"],
+        ):
+            options = get_mongo_client_options()
+
+        self.assertNotIn("compressors", options)
@@ -0,0 +1,123 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+import redis
+from tc_hivemind_backend import metrics
+from tc_hivemind_backend.db.utils.preprocess_text import (
+    BasePreprocessor,
+    CleaningMemo,
+    get_memo,
+    set_memo,
+)
+
+
+class TestCleaningMemo(unittest.TestCase):
+    def test_get_put(self):
+        memo = CleaningMemo()
+        key = memo.key("Hello there!")
+        self.assertIsNone(memo.get(key))
+
+        memo.put(key, "hello")
+        self.assertEqual(memo.get(key), "hello")
+        self.assertEqual(
+            memo.stats(),
+            {
+                "size": 1,
+                "chars": 5,
+                "hits": 1,
+                "redis_hits": 0,
+                "misses": 1,
+                "hit_rate": 0.5,
+            },
+        )
+
+    def test_key(self):
+        self.assertEqual(CleaningMemo.key("text"), CleaningMemo.key("text"))
+        self.assertNotEqual(CleaningMemo.key("text"), CleaningMemo.key("text "))
+        self.assertTrue(CleaningMemo.key("text", "fast").startswith("fast:"))
+
+    def test_least_recently_used_forgotten(self):
+        memo = CleaningMemo(max_size=2)
+        memo.put("a", "1")
+        memo.put("b", "2")
+        memo.get("a")
+        memo.put("c", "3")
+
+        self.assertEqual(memo.get("a"), "1")
+        self.assertIsNone(memo.get("b"))
+        self.assertEqual(memo.stats()["size"], 2)
+
+    def test_bounded_by_characters(self):
+        memo = CleaningMemo(max_chars=10)
+        memo.put("a", "1234")
+        memo.put("b", "5678")
+        memo.put("a", "12")
+        memo.put("c", "abcde")
+        # too long to be kept in memory
+        memo.put("d", "a" * 11)
+
+        self.assertIsNone(memo.get("b"))
+        self.assertIsNone(memo.get("d"))
+        self.assertEqual(memo.get("a"), "12")
+        self.assertEqual(memo.get("c"), "abcde")
+        self.assertEqual(memo.stats()["chars"], 7)
+
+    def test_disabled(self):
+        memo = CleaningMemo(max_size=0)
+        memo.put("a", "1")
+        self.assertIsNone(memo.get("a"))
+
+    def test_redis_persistence(self):
+        redis_client = MagicMock()
+        memo = CleaningMemo(redis_client=redis_client, ttl=60)
+        memo.put("a", "1")
+        redis_client.set.assert_called_once_with("hivemind_preprocess:a", "1", ex=60)
+
+        # a new memo, as in another process
+        redis_client.get.return_value = b"1"
+        other = CleaningMemo(redis_client=redis_client)
+        self.assertEqual(other.get("a"), "1")
+        self.assertEqual(other.get("a"), "1")
+        redis_client.get.assert_called_once_with("hivemind_preprocess:a")
+        self.assertEqual(other.stats()["redis_hits"], 1)
+        self.assertEqual(other.stats()["hits"], 1)
+
+    def test_redis_errors_ignored(self):
+        redis_client = MagicMock()
+        redis_client.get.side_effect = redis.ConnectionError("down")
+        redis_client.set.side_effect = redis.ConnectionError("down")
+        memo = CleaningMemo(redis_client=redis_client)
+
+        self.assertIsNone(memo.get("a"))
+        memo.put("a", "1")
+        self.assertEqual(memo.get("a"), "1")
+
+
+class TestBasePreprocessorMemo(unittest.TestCase):
+    def test_cleaned_once(self):
+        preprocessor = BasePreprocessor(memo=CleaningMemo())
+        with (
+            patch.object(
+                BasePreprocessor, "_extract_main_content", return_value="hello"
+            ) as extract,
+            metrics.collect() as sink,
+        ):
+            for _ in range(3):
+                self.assertEqual(
+                    preprocessor.extract_main_content("Hello there!"), "hello"
+                )
+
+        extract.assert_called_once_with("Hello there!")
+        self.assertEqual(
+            sink.get_counter("hivemind_preprocess_memo_total", result="hit"), 2
+        )
+        self.assertEqual(preprocessor.memo.stats()["hit_rate"], 2 / 3)
+
+    def test_shared_memo(self):
+        memo = CleaningMemo()
+        previous = set_memo(memo)
+        try:
+            self.assertIs(get_memo(), memo)
+            self.assertIs(BasePreprocessor().memo, memo)
+        finally:
+            set_memo(previous)
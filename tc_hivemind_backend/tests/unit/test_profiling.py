@@ -0,0 +1,73 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from tc_hivemind_backend.profiling import (
+    is_profiling_enabled,
+    profile_run,
+    profile_stage,
+)
+
+
+class TestProfiling(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.output_dir = self.temp_dir.name
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    @patch.dict(os.environ, {"HIVEMIND_PROFILE": ""})
+    def test_disabled_by_default(self):
+        with profile_run("run", "1234", output_dir=self.output_dir) as profiler:
+            with profile_stage("stage"):
+                pass
+
+        self.assertIsNone(profiler)
+        self.assertEqual(os.listdir(self.output_dir), [])
+
+    @patch.dict(os.environ, {"HIVEMIND_PROFILE": "true"})
+    def test_enabled_by_env(self):
+        self.assertTrue(is_profiling_enabled())
+        self.assertFalse(is_profiling_enabled(profile=False))
+
+    def test_profile_run(self):
+        with profile_run(
+            "run_pipeline", "1234", profile=True, output_dir=self.output_dir
+        ):
+            for _ in range(2):
+                with profile_stage("embedding"):
+                    _ = [list(range(100)) for _ in range(1000)]
+            with profile_stage("saving"):
+                pass
+
+        run_dirs = os.listdir(self.output_dir)
+        self.assertEqual(len(run_dirs), 1)
+        self.assertTrue(run_dirs[0].startswith("1234_run_pipeline_"))
+
+        run_dir = os.path.join(self.output_dir, run_dirs[0])
+        self.assertEqual(
+            sorted(os.listdir(run_dir)),
+            ["cprofile.prof", "cprofile.txt", "memory.txt", "stages.json"],
+        )
+        with open(os.path.join(run_dir, "stages.json")) as file:
+            stages = json.load(file)
+
+        self.assertEqual(stages["embedding"]["calls"], 2)
+        self.assertEqual(stages["saving"]["calls"], 1)
+        self.assertGreater(stages["embedding"]["peak_bytes"], 0)
+
+    def test_nested_runs_use_outer_profiler(self):
+        with profile_run(
+            "outer", "1234", profile=True, output_dir=self.output_dir
+        ) as outer:
+            with profile_run(
+                "inner", "1234", profile=True, output_dir=self.output_dir
+            ) as inner:
+                with profile_stage("stage"):
+                    pass
+
+        self.assertIs(inner, outer)
+        self.assertEqual(len(os.listdir(self.output_dir)), 1)
@@ -0,0 +1,223 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+from llama_index.core.schema import NodeRelationship, RelatedNodeInfo, TextNode
+from llama_index.core.vector_stores.types import VectorStoreQuery
+from qdrant_client import AsyncQdrantClient, QdrantClient
+from qdrant_client.http import models
+from tc_hivemind_backend.db.qdrant_migration import migrate_to_shared_collection
+from tc_hivemind_backend.qdrant_vector_access import (
+    MeteredQdrantVectorStore,
+    QDrantVectorAccess,
+)
+
+
+class TestQdrantMultiTenant(unittest.TestCase):
+    def setUp(self):
+        self.client = QdrantClient(":memory:")
+
+    def _setup_vector_store(
+        self, collection_name: str, community_id: str | None
+    ) -> MeteredQdrantVectorStore:
+        vector_access = QDrantVectorAccess(
+            collection_name=collection_name, testing=True, community_id=community_id
+        )
+        with patch(
+            "tc_hivemind_backend.qdrant_vector_access.QdrantSingleton"
+        ) as qdrant:
+            qdrant.get_instance.return_value.client = self.client
+            return vector_access.setup_qdrant_vector_store()
+
+    def _nodes(self, prefix: str) -> list[TextNode]:
+        return [
+            TextNode(
+                text=f"{prefix} text {idx}",
+                embedding=[float(idx + 1), 1.0, 0.5],
+                metadata={"channel": "general"},
+                relationships={
+                    NodeRelationship.SOURCE: RelatedNodeInfo(node_id=f"doc-{idx}")
+                },
+            )
+            for idx in range(3)
+        ]
+
+    def _query(self, vector_store: MeteredQdrantVectorStore) -> list[str]:
+        result = vector_store.query(
+            VectorStoreQuery(query_embedding=[1.0, 1.0, 0.5], similarity_top_k=10)
+        )
+        return sorted(node.get_content() for node in result.nodes)
+
+    def test_shared_collection_created_for_tenants(self):
+        vector_store = self._setup_vector_store("discord", community_id="1234")
+        with (
+            patch.object(
+                self.client, "create_collection", wraps=self.client.create_collection
+            ) as create_mock,
+            patch.object(
+                self.client,
+                "create_payload_index",
+                wraps=self.client.create_payload_index,
+            ) as index_mock,
+        ):
+            vector_store.add(self._nodes("first"))
+
+        hnsw_config = create_mock.call_args.kwargs["hnsw_config"]
+        self.assertEqual(hnsw_config.m, 0)
+        self.assertEqual(hnsw_config.payload_m, 16)
+        self.assertEqual(index_mock.call_args.kwargs["field_name"], "community_id")
+        self.assertTrue(index_mock.call_args.kwargs["field_schema"].is_tenant)
+
+    def test_queries_and_deletions_are_scoped(self):
+        first = self._setup_vector_store("discord", community_id="1234")
+        second = self._setup_vector_store("discord", community_id="5678")
+        first_nodes = self._nodes("first")
+        first.add(first_nodes)
+        second.add(self._nodes("second"))
+
+        self.assertEqual(
+            self._query(first), ["first text 0", "first text 1", "first text 2"]
+        )
+        self.assertEqual(
+            self._query(second), ["second text 0", "second text 1", "second text 2"]
+        )
+        # the tenant field is not embedded or shown to the llm
+        self.assertNotIn("community_id", first_nodes[0].get_content("embed"))
+
+        # both communities have a `doc-0` document
+        second.delete("doc-0")
+        self.assertEqual(
+            self._query(first), ["first text 0", "first text 1", "first text 2"]
+        )
+        self.assertEqual(self._query(second), ["second text 1", "second text 2"])
+
+    def test_async_queries_and_deletions_are_scoped(self):
+        aclient = AsyncQdrantClient(":memory:")
+        first = MeteredQdrantVectorStore(
+            collection_name="discord", aclient=aclient, community_id="1234"
+        )
+        second = MeteredQdrantVectorStore(
+            collection_name="discord", aclient=aclient, community_id="5678"
+        )
+
+        async def query(vector_store: MeteredQdrantVectorStore, **kwargs) -> list:
+            result = await vector_store.aquery(
+                VectorStoreQuery(query_embedding=[1.0, 1.0, 0.5], similarity_top_k=10),
+                **kwargs,
+            )
+            return sorted(node.get_content() for node in result.nodes)
+
+        async def run() -> None:
+            with (
+                patch.object(
+                    aclient, "create_collection", wraps=aclient.create_collection
+                ) as create_mock,
+                patch.object(
+                    aclient, "create_payload_index", wraps=aclient.create_payload_index
+                ) as index_mock,
+            ):
+                await first.async_add(self._nodes("first"))
+            await second.async_add(self._nodes("second"))
+
+            self.assertEqual(create_mock.call_args.kwargs["hnsw_config"].m, 0)
+            self.assertTrue(index_mock.call_args.kwargs["field_schema"].is_tenant)
+
+            self.assertEqual(
+                await query(first), ["first text 0", "first text 1", "first text 2"]
+            )
+            channel_filter = models.Filter(
+                must=[
+                    models.FieldCondition(
+                        key="channel", match=models.MatchValue(value="general")
+                    )
+                ]
+            )
+            self.assertEqual(
+                await query(second, qdrant_filters=channel_filter),
+                ["second text 0", "second text 1", "second text 2"],
+            )
+
+            await second.adelete("doc-0")
+            self.assertEqual(
+                await query(first), ["first text 0", "first text 1", "first text 2"]
+            )
+            self.assertEqual(await query(second), ["second text 1", "second text 2"])
+
+        asyncio.run(run())
+
+    def test_hybrid_shared_collection_created_for_tenants(self):
+        vector_store = MeteredQdrantVectorStore(
+            collection_name="discord",
+            client=self.client,
+            community_id="1234",
+            enable_hybrid=True,
+            sparse_doc_fn=lambda texts: ([[0]] * len(texts), [[1.0]] * len(texts)),
+            sparse_query_fn=lambda texts: ([[0]] * len(texts), [[1.0]] * len(texts)),
+        )
+        with (
+            patch.object(
+                self.client, "create_collection", wraps=self.client.create_collection
+            ) as create_mock,
+            patch.object(
+                self.client,
+                "create_payload_index",
+                wraps=self.client.create_payload_index,
+            ) as index_mock,
+        ):
+            vector_store._create_collection("discord", vector_size=3)
+
+        config = self.client.get_collection("discord").config
+        self.assertIn("text-dense", config.params.vectors)
+        self.assertIn("text-sparse-new", config.params.sparse_vectors)
+        self.assertEqual(create_mock.call_args.kwargs["hnsw_config"].m, 0)
+        self.assertTrue(index_mock.call_args.kwargs["field_schema"].is_tenant)
+
+    def test_index_filtered_by_community(self):
+        vector_access = QDrantVectorAccess(
+            collection_name="discord", testing=True, community_id="1234"
+        )
+        with patch(
+            "tc_hivemind_backend.qdrant_vector_access.QdrantSingleton"
+        ) as qdrant:
+            qdrant.get_instance.return_value.client = self.client
+            index = vector_access.load_index()
+
+        query = VectorStoreQuery(query_embedding=[1.0], similarity_top_k=1)
+        query_filter = index.vector_store._build_query_filter(query)
+        self.assertEqual(query_filter.must[0].key, "community_id")
+        self.assertEqual(query_filter.must[0].match.value, "1234")
+
+    def test_migrate_to_shared_collection(self):
+        source = self._setup_vector_store("1234_discord", community_id=None)
+        source.add(self._nodes("first"))
+
+        migrated = migrate_to_shared_collection(
+            "1234", "discord", batch_size=2, delete_source=True, client=self.client
+        )
+
+        self.assertEqual(migrated, 3)
+        self.assertFalse(self.client.collection_exists("1234_discord"))
+        shared = self._setup_vector_store("discord", community_id="1234")
+        self.assertEqual(
+            self._query(shared), ["first text 0", "first text 1", "first text 2"]
+        )
+        other = self._setup_vector_store("discord", community_id="5678")
+        self.assertEqual(self._query(other), [])
+
+    def test_migrate_missing_collection(self):
+        self.assertEqual(
+            migrate_to_shared_collection("1234", "discord", client=self.client), 0
+        )
+        self.assertFalse(self.client.collection_exists("discord"))
+
+    def test_migrate_named_vectors_not_supported(self):
+        self.client.create_collection(
+            "1234_discord",
+            vectors_config={
+                "text-dense": models.VectorParams(
+                    size=3, distance=models.Distance.COSINE
+                )
+            },
+        )
+        with self.assertRaises(ValueError):
+            migrate_to_shared_collection("1234", "discord", client=self.client)
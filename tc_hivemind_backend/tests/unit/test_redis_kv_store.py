@@ -0,0 +1,133 @@
+import json
+import unittest
+from unittest.mock import MagicMock, patch
+
+from llama_index.core.ingestion import IngestionCache
+from llama_index.core.schema import TextNode
+from tc_hivemind_backend.db.redis_kv_store import (
+    CustomRedisKVStore,
+    PackedEmbeddingRedisKVStore,
+    dumps,
+    loads,
+)
+
+
+class TestRedisKVStoreCodec(unittest.TestCase):
+    def test_roundtrip(self):
+        value = {"nodes": [{"text": "hello", "embedding": [0.1, 0.2]}]}
+        self.assertEqual(loads(dumps(value)), value)
+
+    def test_reads_json_written_values(self):
+        value = {"doc_hash": "abc", "nested": {"a": 1}}
+        self.assertEqual(loads(json.dumps(value)), value)
+
+    def test_reads_bytes_values(self):
+        self.assertEqual(loads(b'{"a": 1}'), {"a": 1})
+
+
+class TestCustomRedisKVStore(unittest.TestCase):
+    def setUp(self):
+        self.redis_client = MagicMock()
+        self.pipe = MagicMock()
+        self.redis_client.pipeline.return_value.__enter__.return_value = self.pipe
+        self.store = CustomRedisKVStore.from_redis_client(self.redis_client)
+
+    def test_get_all_small_collection_uses_hgetall(self):
+        self.redis_client.hlen.return_value = 2
+        self.redis_client.hgetall.return_value = {
+            "key1": json.dumps({"a": 1}),
+            b"key2": b'{"b": 2}',
+        }
+
+        result = self.store.get_all("collection")
+
+        self.assertEqual(result, {"key1": {"a": 1}, "key2": {"b": 2}})
+        self.redis_client.hscan_iter.assert_not_called()
+
+    @patch("tc_hivemind_backend.db.redis_kv_store.BULK_GET_THRESHOLD", 1)
+    def test_get_all_big_collection_scans_in_chunks(self):
+        self.redis_client.hlen.return_value = 2
+        self.redis_client.hscan_iter.return_value = iter(
+            [("key1", '{"a": 1}'), ("key2", '{"b": 2}')]
+        )
+
+        result = self.store.get_all("collection")
+
+        self.assertEqual(result, {"key1": {"a": 1}, "key2": {"b": 2}})
+        self.redis_client.hgetall.assert_not_called()
+        _, kwargs = self.redis_client.hscan_iter.call_args
+        self.assertGreater(kwargs["count"], 10)
+
+    def test_put_all_batches_into_hset_mappings(self):
+        kv_pairs = [(f"key{idx}", {"idx": idx}) for idx in range(5)]
+
+        self.store.put_all(kv_pairs, collection="collection", batch_size=2)
+
+        self.assertEqual(self.pipe.hset.call_count, 3)
+        self.pipe.execute.assert_called_once()
+        mappings = [call.kwargs["mapping"] for call in self.pipe.hset.call_args_list]
+        self.assertEqual([len(mapping) for mapping in mappings], [2, 2, 1])
+        self.assertEqual(loads(mappings[2]["key4"]), {"idx": 4})
+
+    @patch("tc_hivemind_backend.db.redis_kv_store.SCAN_CHUNK_SIZE", 3)
+    def test_put_all_sends_pipeline_in_chunks(self):
+        kv_pairs = [(f"key{idx}", {"idx": idx}) for idx in range(7)]
+
+        self.store.put_all(kv_pairs, collection="collection", batch_size=1)
+
+        self.assertEqual(self.pipe.hset.call_count, 7)
+        self.assertEqual(self.pipe.execute.call_count, 3)
+
+    def test_get_many_skips_missing_keys(self):
+        self.pipe.execute.return_value = [['{"a": 1}', None], ['{"c": 3}']]
+
+        result = self.store.get_many(["a", "b", "c"], "collection", batch_size=2)
+
+        self.assertEqual(result, {"a": {"a": 1}, "c": {"c": 3}})
+        self.assertEqual(self.pipe.hmget.call_count, 2)
+
+    def test_delete_all(self):
+        self.pipe.execute.return_value = [2, 1]
+
+        deleted = self.store.delete_all(["a", "b", "c"], "collection", batch_size=2)
+
+        self.assertEqual(deleted, 3)
+        self.pipe.hdel.assert_any_call("collection", "a", "b")
+        self.pipe.hdel.assert_any_call("collection", "c")
+
+    def test_delete_collection(self):
+        self.redis_client.unlink.return_value = 1
+        self.assertTrue(self.store.delete_collection("collection"))
+        self.redis_client.unlink.assert_called_once_with("collection")
+
+
+class TestPackedEmbeddingRedisKVStore(unittest.TestCase):
+    def setUp(self):
+        self.hash: dict = {}
+        self.redis_client = MagicMock()
+        self.redis_client.hset.side_effect = lambda name, key, value: (
+            self.hash.__setitem__(key, value)
+        )
+        self.redis_client.hget.side_effect = lambda name, key: self.hash.get(key)
+        self.store = PackedEmbeddingRedisKVStore.from_redis_client(
+            self.redis_client, dtype="float32"
+        )
+
+    def test_ingestion_cache_roundtrip(self):
+        nodes = [
+            TextNode(id_="node-1", text="hello", embedding=[0.5, -0.25, 1.0]),
+            TextNode(id_="node-2", text="world", embedding=None),
+        ]
+        cache = IngestionCache(cache=self.store, collection="collection")
+
+        cache.put("key", nodes)
+        cached_nodes = cache.get("key")
+
+        self.assertIsInstance(self.hash["key"], bytes)
+        self.assertEqual([node.id_ for node in cached_nodes], ["node-1", "node-2"])
+        self.assertEqual(cached_nodes[0].embedding, [0.5, -0.25, 1.0])
+        self.assertIsNone(cached_nodes[1].embedding)
+
+    def test_reads_json_entries(self):
+        self.hash["key"] = b'{"doc_hash": "abc"}'
+        self.assertEqual(self.store.get("key"), {"doc_hash": "abc"})
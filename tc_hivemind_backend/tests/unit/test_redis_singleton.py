@@ -37,6 +37,30 @@ class TestRedisSingleton(unittest.TestCase):
 
         self.assertEqual(instance.get_client(), mock_redis.return_value)
 
+    @patch("tc_hivemind_backend.db.redis.Credentials")
+    @patch("redis.Redis")
+    def test_binary_client(self, mock_redis, mock_credentials):
+        mock_credentials_instance = MagicMock()
+        mock_credentials_instance.load_redis.return_value = {
+            "host": "test_host",
+            "port": "6379",
+            "password": "test_password",
+        }
+        mock_credentials.return_value = mock_credentials_instance
+
+        instance = RedisSingleton.get_instance()
+        binary_client = instance.get_binary_client()
+
+        mock_redis.assert_called_with(
+            host="test_host",
+            port=6379,
+            password="test_password",
+            decode_responses=False,
+        )
+        self.assertEqual(mock_redis.call_count, 2)
+        self.assertIs(instance.get_binary_client(), binary_client)
+        self.assertEqual(mock_redis.call_count, 2)
+
     @patch("tc_hivemind_backend.db.redis.Credentials")
     @patch("redis.Redis")
     @patch("logging.info")
@@ -0,0 +1,86 @@
+import unittest
+
+from llama_index.core.ingestion.pipeline import get_transformation_hash
+from llama_index.core.node_parser import SentenceSplitter
+from llama_index.core.schema import Document
+from tc_hivemind_backend import metrics
+from tc_hivemind_backend.node_parsers import RoutingNodeParser
+
+
+class TestRoutingNodeParser(unittest.TestCase):
+    def setUp(self):
+        self.splitter = SentenceSplitter(chunk_size=20, chunk_overlap=0)
+        self.parser = RoutingNodeParser(
+            splitter=self.splitter,
+            max_tokens=20,
+            tokenizer=str.split,
+        )
+
+    def docs(self) -> list[Document]:
+        long_text = ". ".join(f"sentence number {idx} is here" for idx in range(10))
+        return [
+            Document(id_="short_1", text="a short message"),
+            Document(id_="long", text=long_text),
+            Document(id_="short_2", text="another short message"),
+        ]
+
+    def test_short_documents_are_one_node(self):
+        with metrics.collect() as sink:
+            nodes = self.parser.get_nodes_from_documents(self.docs())
+
+        ref_doc_ids = [node.ref_doc_id for node in nodes]
+        self.assertEqual(ref_doc_ids[0], "short_1")
+        self.assertEqual(ref_doc_ids[-1], "short_2")
+        self.assertEqual(nodes[0].text, "a short message")
+        # the long document is split, its nodes kept together between the others
+        self.assertGreater(ref_doc_ids.count("long"), 1)
+        self.assertEqual(set(ref_doc_ids[1:-1]), {"long"})
+
+        self.assertEqual(
+            sink.get_counter("hivemind_node_parser_documents_total", route="single"), 2
+        )
+        self.assertEqual(
+            sink.get_counter("hivemind_node_parser_documents_total", route="split"), 1
+        )
+
+    def test_long_documents_are_split_at_once(self):
+        calls = []
+        parse_nodes = self.splitter._parse_nodes
+
+        def record(nodes, *args, **kwargs):
+            calls.append([node.node_id for node in nodes])
+            return parse_nodes(nodes, *args, **kwargs)
+
+        object.__setattr__(self.splitter, "_parse_nodes", record)
+        docs = self.docs() + [Document(id_="long_2", text=self.docs()[1].text)]
+        self.parser.get_nodes_from_documents(docs)
+
+        self.assertEqual(calls, [["long", "long_2"]])
+
+    def test_zero_threshold_splits_all(self):
+        parser = RoutingNodeParser(splitter=self.splitter, max_tokens=0)
+        self.assertFalse(parser.is_short(Document(text="hi")))
+
+    def test_metadata_counts_as_tokens(self):
+        doc = Document(text="a short message", metadata={"title": "word " * 30})
+        self.assertFalse(self.parser.is_short(doc))
+
+        doc.excluded_embed_metadata_keys = ["title"]
+        self.assertTrue(self.parser.is_short(doc))
+
+    def test_relationships(self):
+        nodes = self.parser.get_nodes_from_documents(self.docs())
+        long_nodes = [node for node in nodes if node.ref_doc_id == "long"]
+
+        self.assertIsNone(nodes[0].prev_node)
+        self.assertEqual(long_nodes[1].prev_node.node_id, long_nodes[0].node_id)
+
+    def test_transformation_hash(self):
+        docs = self.docs()
+        other = RoutingNodeParser(
+            splitter=self.splitter, max_tokens=10, tokenizer=str.split
+        )
+        self.assertNotEqual(
+            get_transformation_hash(docs, self.parser),
+            get_transformation_hash(docs, other),
+        )
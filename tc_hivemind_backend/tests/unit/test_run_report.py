@@ -0,0 +1,72 @@
+import unittest
+
+from tc_hivemind_backend import metrics
+from tc_hivemind_backend.run_report import IngestionReport, record_run
+
+
+class TestIngestionReport(unittest.TestCase):
+    def setUp(self):
+        # the report is collected even if the metrics sink is disabled
+        self.previous = metrics.set_sink(metrics.NullSink())
+
+    def tearDown(self):
+        metrics.set_sink(self.previous)
+
+    def test_record_run(self):
+        with metrics.metric_labels(community_id="1234"):
+            with record_run("1234", "discord", documents_in=10) as report:
+                metrics.increment("hivemind_pipeline_documents_skipped_total", 4)
+                metrics.increment("hivemind_pipeline_nodes_total", 12)
+                for _ in range(3):
+                    with metrics.timer("hivemind_embedding_request"):
+                        pass
+                metrics.increment("hivemind_embedding_texts_total", 12)
+                metrics.increment("hivemind_embedding_tokens_total", 300)
+                with metrics.timer(
+                    "hivemind_kvstore_operation", backend="redis", operation="get"
+                ):
+                    pass
+                metrics.increment(
+                    "hivemind_kvstore_keys_total", 1, backend="redis", operation="get"
+                )
+                metrics.increment(
+                    "hivemind_vector_store_points_total",
+                    12,
+                    backend="qdrant",
+                    operation="add",
+                )
+
+            # metrics recorded after the run are not part of its report
+            metrics.increment("hivemind_pipeline_nodes_total", 5)
+
+        result = report.to_dict()
+        self.assertEqual(result["documents_in"], 10)
+        self.assertEqual(result["documents_skipped"], 4)
+        self.assertEqual(result["nodes"], 12)
+        self.assertEqual(result["embedding_requests"], 3)
+        self.assertEqual(result["embedding_texts"], 12)
+        self.assertEqual(result["embedding_tokens"], 300)
+        self.assertEqual(result["tokens_per_document"], 50)
+        self.assertEqual(result["cache_lookups"], 1)
+        self.assertEqual(result["cache_hits"], 1)
+        self.assertEqual(result["upserted_points"], 12)
+        self.assertEqual(
+            set(result["stage_seconds"].keys()), {"embedding_requests", "cache"}
+        )
+        self.assertGreater(report.seconds, 0)
+        self.assertGreater(result["peak_rss_bytes"], 0)
+
+    def test_empty_report(self):
+        report = IngestionReport("1234", "discord", documents_in=0)
+        result = report.to_dict()
+
+        self.assertEqual(result["documents_per_second"], 0.0)
+        self.assertEqual(result["tokens_per_document"], 0.0)
+        self.assertEqual(result["stage_seconds"], {})
+
+    def test_failed_run_is_not_reported(self):
+        with self.assertRaises(ValueError):
+            with record_run("1234", "discord", documents_in=1) as report:
+                raise ValueError("failed")
+
+        self.assertEqual(report.seconds, 0.0)
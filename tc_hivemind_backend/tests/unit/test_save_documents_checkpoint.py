@@ -0,0 +1,68 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from llama_index.core import Document
+from tc_hivemind_backend.pg_vector_access import PGVectorAccess
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+def make_docs(count: int) -> list[Document]:
+    return [Document(id_=f"doc-{idx}", text=f"text {idx}") for idx in range(count)]
+
+
+@unittest.skipIf(fakeredis is None, "requires fakeredis")
+class TestSaveDocumentsCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        patcher = patch("tc_hivemind_backend.db.checkpoint.RedisSingleton")
+        redis_singleton = patcher.start()
+        redis_singleton.get_instance.return_value.get_client.return_value = self.redis
+        self.addCleanup(patcher.stop)
+
+        self.pg_vector = PGVectorAccess(
+            table_name="discord", dbname="community_1234", testing=True
+        )
+        self.saved: list[list[str]] = []
+        self.failing_batch: int | None = None
+
+        def save_documents(community_id, documents, **kwargs):
+            if len(self.saved) == self.failing_batch:
+                self.failing_batch = None
+                raise RuntimeError("crashed")
+            self.saved.append([doc.doc_id for doc in documents])
+
+        self.pg_vector.save_documents = save_documents
+        self.pg_vector.delete_documents = MagicMock()
+        self.pg_vector._handle_deletion = MagicMock()
+
+    def test_resume(self):
+        docs = make_docs(5)
+        self.failing_batch = 1
+        with self.assertRaises(RuntimeError):
+            self.pg_vector.save_documents_in_batches(
+                "1234",
+                docs,
+                batch_size=2,
+                checkpoint=True,
+                deletion_query="DELETE ...",
+            )
+        self.assertEqual(self.saved, [["doc-0", "doc-1"]])
+
+        self.pg_vector.save_documents_in_batches(
+            "1234", docs, batch_size=2, checkpoint=True, deletion_query="DELETE ..."
+        )
+
+        # the deletion ran once, and the saved batch was skipped
+        self.pg_vector._handle_deletion.assert_called_once()
+        self.pg_vector.delete_documents.assert_called_once_with(
+            doc_ids=["doc-2", "doc-3"]
+        )
+        self.assertEqual(
+            self.saved, [["doc-0", "doc-1"], ["doc-2", "doc-3"], ["doc-4"]]
+        )
+        # cleared after the final batch
+        self.assertEqual(self.redis.keys("hivemind_checkpoint:*"), [])
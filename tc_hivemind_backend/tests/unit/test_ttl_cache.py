@@ -0,0 +1,76 @@
+import unittest
+
+from tc_hivemind_backend.db.utils.ttl_cache import TTLCache
+
+
+class FakeTimer:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestTTLCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.timer = FakeTimer()
+        self.cache = TTLCache(ttl=10, max_size=2, timer=self.timer)
+
+    def test_get_missing_key(self):
+        self.assertIsNone(self.cache.get("key"))
+        self.assertEqual(self.cache.stats()["misses"], 1)
+
+    def test_get_before_expiry(self):
+        self.cache.set("key", [1, 2])
+        self.timer.now = 9.9
+        self.assertEqual(self.cache.get("key"), [1, 2])
+
+    def test_get_after_expiry(self):
+        self.cache.set("key", [1, 2])
+        self.timer.now = 10
+        self.assertIsNone(self.cache.get("key"))
+        self.assertEqual(self.cache.stats()["size"], 0)
+
+    def test_disabled_cache(self):
+        cache = TTLCache(ttl=0, timer=self.timer)
+        cache.set("key", [1])
+        self.assertIsNone(cache.get("key"))
+        self.assertEqual(cache.stats()["misses"], 0)
+
+    def test_evicts_oldest_when_full(self):
+        self.cache.set("a", 1)
+        self.timer.now = 1
+        self.cache.set("b", 2)
+        self.cache.set("c", 3)
+
+        self.assertIsNone(self.cache.get("a"))
+        self.assertEqual(self.cache.get("b"), 2)
+        self.assertEqual(self.cache.get("c"), 3)
+
+    def test_invalidate_with_predicate(self):
+        self.cache.set(("discord", ()), 1)
+        self.cache.set(("github", ()), 2)
+
+        removed = self.cache.invalidate(lambda key: key[0] == "discord")
+
+        self.assertEqual(removed, 1)
+        self.assertIsNone(self.cache.get(("discord", ())))
+        self.assertEqual(self.cache.get(("github", ())), 2)
+
+    def test_invalidate_all(self):
+        self.cache.set("a", 1)
+        self.cache.set("b", 2)
+        self.assertEqual(self.cache.invalidate(), 2)
+        self.assertEqual(self.cache.stats()["size"], 0)
+
+    def test_hit_rate(self):
+        self.cache.set("a", 1)
+        self.cache.get("a")
+        self.cache.get("a")
+        self.cache.get("b")
+        self.cache.get("a")
+
+        stats = self.cache.stats()
+        self.assertEqual(stats["hits"], 3)
+        self.assertEqual(stats["misses"], 1)
+        self.assertAlmostEqual(stats["hit_rate"], 0.75)
@@ -0,0 +1,110 @@
+import json
+import unittest
+
+import numpy as np
+from tc_hivemind_backend.db.utils.vector_codec import (
+    _HEADER,
+    decode_value,
+    encode_value,
+    is_packed,
+    pack_vector,
+    unpack_vector,
+)
+
+
+class TestVectorCodec(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.embeddings = rng.standard_normal((3, 1024)).astype(np.float32)
+        self.value = {
+            "nodes": [
+                {
+                    "__data__": {
+                        "id_": f"node-{idx}",
+                        "text": "some text",
+                        "embedding": self.embeddings[idx].tolist(),
+                        "metadata": {"channel": "general"},
+                    },
+                    "__type__": "1",
+                }
+                for idx in range(3)
+            ]
+        }
+
+    def test_roundtrip_float32(self):
+        data = encode_value(self.value, dtype="float32")
+
+        self.assertTrue(is_packed(data))
+        self.assertEqual(decode_value(data), self.value)
+
+    def test_roundtrip_float16(self):
+        decoded = decode_value(encode_value(self.value, dtype="float16"))
+
+        for idx, node in enumerate(decoded["nodes"]):
+            np.testing.assert_allclose(
+                node["__data__"]["embedding"], self.embeddings[idx], atol=1e-2
+            )
+            self.assertEqual(node["__data__"]["text"], "some text")
+
+    def test_packed_is_smaller_than_json(self):
+        json_size = len(json.dumps(self.value))
+        self.assertLess(len(encode_value(self.value, "float32")) * 3, json_size)
+        self.assertLess(len(encode_value(self.value, "float16")) * 6, json_size)
+
+    def test_none_and_empty_embeddings_kept(self):
+        value = {"a": {"embedding": None}, "b": {"embedding": []}}
+        self.assertEqual(decode_value(encode_value(value)), value)
+
+    def test_only_node_embeddings_packed(self):
+        value = {
+            "nodes": [
+                {
+                    "__data__": {
+                        "embedding": [0.5, 1.5],
+                        "metadata": {"embedding": [1.0, 2.0], "scores": [0.1]},
+                    },
+                    "__type__": "1",
+                },
+                {"__data__": {"embedding": ["a", "b"]}, "__type__": "1"},
+            ],
+            "other": {"embedding": [3.0]},
+        }
+        data = encode_value(value)
+
+        _, _, body_length = _HEADER.unpack_from(data)
+        body = json.loads(data[_HEADER.size : _HEADER.size + body_length])
+        node = body["nodes"][0]["__data__"]
+        self.assertEqual(node["embedding"], {"__vector__": [0, 2]})
+        self.assertEqual(node["metadata"], value["nodes"][0]["__data__"]["metadata"])
+        self.assertEqual(body["nodes"][1], value["nodes"][1])
+        self.assertEqual(body["other"], value["other"])
+        # only the first node's embedding is packed, 2 float32 values
+        self.assertEqual(len(data) - _HEADER.size - body_length, 8)
+        self.assertEqual(decode_value(data), value)
+
+    def test_decode_plain_json(self):
+        self.assertEqual(decode_value('{"a": [1, 2]}'), {"a": [1, 2]})
+        self.assertEqual(decode_value(b'{"a": [1, 2]}'), {"a": [1, 2]})
+        self.assertFalse(is_packed(b'{"a": 1}'))
+
+    def test_pack_single_vector(self):
+        data = pack_vector(self.embeddings[0], dtype="float32")
+        vector = unpack_vector(data, dtype="float32")
+
+        self.assertEqual(len(data), 1024 * 4)
+        np.testing.assert_array_equal(vector, self.embeddings[0])
+
+    def test_unsupported_dtype(self):
+        with self.assertRaises(ValueError):
+            encode_value(self.value, dtype="int4")
+
+    def test_roundtrip_uint8(self):
+        value = {"embedding": [0, 127, 255, 3]}
+        data = encode_value(value, dtype="uint8")
+
+        self.assertEqual(decode_value(data), value)
+        self.assertEqual(len(pack_vector(value["embedding"], dtype="uint8")), 4)
+
+    def test_roundtrip_int8(self):
+        value = {"embedding": [-128, -1, 0, 127]}
+        self.assertEqual(decode_value(encode_value(value, dtype="int8")), value)
@@ -0,0 +1,116 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from llama_index.core.schema import TextNode
+from llama_index.core.vector_stores.types import VectorStoreQuery
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+from tc_hivemind_backend.embeddings.cohere import CohereEmbedding
+from tc_hivemind_backend.qdrant_vector_access import (
+    MeteredQdrantVectorStore,
+    QDrantVectorAccess,
+)
+
+
+class TestCohereEmbeddingTypes(unittest.TestCase):
+    def test_unsupported_embedding_type(self):
+        for embedding_type in ["int4", "binary"]:
+            with self.assertRaises(ValueError):
+                CohereEmbedding(embedding_type=embedding_type)
+
+    def test_compact_embedding_type_requested(self):
+        client = MagicMock()
+        client.embed.return_value = MagicMock(
+            embeddings=MagicMock(uint8=[[0, 255], [12, 128]]), meta={}
+        )
+        embed_model = CohereEmbedding(embedding_type="uint8")
+        with (
+            patch.object(CohereEmbedding, "prepare_cohere", return_value=client),
+            patch.object(CohereEmbedding, "_clean_text", side_effect=lambda t, p: t),
+        ):
+            embeddings = embed_model.get_text_embedding(texts=["first", "second"])
+
+        self.assertEqual(embeddings, [[0, 255], [12, 128]])
+        self.assertEqual(client.embed.call_args.kwargs["embedding_types"], ["uint8"])
+
+    def test_float_embedding_type_not_sent(self):
+        client = MagicMock()
+        client.embed.return_value = MagicMock(embeddings=[[0.1, 0.2]], meta={})
+        with (
+            patch.object(CohereEmbedding, "prepare_cohere", return_value=client),
+            patch.object(CohereEmbedding, "_clean_text", side_effect=lambda t, p: t),
+        ):
+            embeddings = CohereEmbedding().get_text_embedding(texts=["first"])
+
+        self.assertEqual(embeddings, [[0.1, 0.2]])
+        self.assertNotIn("embedding_types", client.embed.call_args.kwargs)
+
+
+class TestQdrantVectorCompression(unittest.TestCase):
+    def setUp(self):
+        self.client = QdrantClient(":memory:")
+        self.nodes = [
+            TextNode(text=f"text {idx}", embedding=[float(idx + 1), 1.0, 0.5, 0.0])
+            for idx in range(4)
+        ]
+
+    def _setup_vector_store(self, **kwargs) -> MeteredQdrantVectorStore:
+        vector_access = QDrantVectorAccess(
+            collection_name="sample_collection", testing=True, **kwargs
+        )
+        with patch(
+            "tc_hivemind_backend.qdrant_vector_access.QdrantSingleton"
+        ) as qdrant:
+            qdrant.get_instance.return_value.client = self.client
+            return vector_access.setup_qdrant_vector_store()
+
+    def test_unsupported_compression(self):
+        with self.assertRaises(ValueError):
+            QDrantVectorAccess(collection_name="sample", vector_compression="int4")
+
+    def test_uint8_collection(self):
+        vector_store = self._setup_vector_store(vector_compression="uint8")
+        vector_store.add(self.nodes)
+
+        params = self.client.get_collection("sample_collection").config.params
+        self.assertEqual(params.vectors.datatype, models.Datatype.UINT8)
+        self.assertEqual(params.vectors.size, 4)
+
+    def test_binary_collection_rescored_query(self):
+        vector_store = self._setup_vector_store(
+            vector_compression="binary", oversampling=3.0
+        )
+        # the local client doesn't keep the quantization config
+        with patch.object(
+            self.client, "create_collection", wraps=self.client.create_collection
+        ) as create_mock:
+            vector_store.add(self.nodes)
+
+        create_kwargs = create_mock.call_args.kwargs
+        self.assertIsInstance(
+            create_kwargs["quantization_config"], models.BinaryQuantization
+        )
+        self.assertTrue(create_kwargs["vectors_config"].on_disk)
+
+        with patch.object(
+            self.client, "search", wraps=self.client.search
+        ) as search_mock:
+            result = vector_store.query(
+                VectorStoreQuery(
+                    query_embedding=[4.0, 1.0, 0.5, 0.0], similarity_top_k=2
+                )
+            )
+
+        search_params = search_mock.call_args.kwargs["search_params"]
+        self.assertTrue(search_params.quantization.rescore)
+        self.assertEqual(search_params.quantization.oversampling, 3.0)
+        self.assertEqual(len(result.nodes), 2)
+        self.assertEqual(result.nodes[0].get_content(), "text 3")
+
+    def test_default_collection_not_compressed(self):
+        vector_store = self._setup_vector_store()
+        vector_store.add(self.nodes)
+
+        config = self.client.get_collection("sample_collection").config
+        self.assertIsNone(config.quantization_config)
+        self.assertEqual(config.params.vectors.datatype, None)